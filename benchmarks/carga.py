@@ -0,0 +1,474 @@
+"""Teste de carga reproduzível de todos os routers do router_center.
+
+Popula um banco próprio (apagado e recriado a cada execução) e dispara as operações de cada
+router com concorrência e proporção de escritas configuráveis. Sem --url a aplicação roda no
+próprio processo, via ASGI e sem rede; com --url o alvo é um servidor já em execução, que deve
+apontar para o mesmo banco. O resultado vai para um JSON comparável entre commits.
+
+Uso: python -m benchmarks.carga executar [--mongo-uri mongodb://localhost:27017] [--banco tp3_carga]
+         [--usuarios 2000] [--veiculos 500] [--pagamentos 5000] [--manutencoes 2000] [--contratos 5000]
+         [--concorrencia 32] [--requisicoes 5000] [--escritas 0.1] [--semente 42] [--saida arquivo.json]
+     python -m benchmarks.carga comparar base.json atual.json [--tolerancia 0.2]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from random import Random
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from bson import ObjectId
+
+LEITURA = "leitura"
+ESCRITA = "escrita"
+
+PERCENTIS = (50, 95, 99)
+
+MARCAS = ["Fiat", "Volkswagen", "Ford", "Chevrolet", "Hyundai", "Toyota", "Renault", "Honda"]
+MODELOS = ["Uno", "Gol", "Ka", "Onix", "HB20", "Corolla", "Sandero", "Civic"]
+FORMAS_PAGAMENTO = ["Crédito", "Débito", "Boleto", "PIX"]
+TIPOS_MANUTENCAO = ["Revisão", "Troca de óleo", "Pneus", "Freios", "Suspensão", "Alinhamento"]
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabriela", "Heitor", "Isabela", "João"]
+
+# Vencimentos e contratos espalhados por um ano fixo: as consultas por mês sempre encontram dados
+INICIO_DADOS = datetime(2024, 1, 1)
+MESES = [f"2024-{mes:02d}" for mes in range(1, 13)]
+
+COLECOES = ["usuarios", "veiculos", "pagamentos", "manutencoes", "veiculo_manutencoes", "contratos"]
+
+
+@dataclass
+class Dados:
+    """Documentos semeados que as operações usam para montar caminhos e corpos."""
+    usuarios: List[dict] = field(default_factory=list)
+    veiculos: List[dict] = field(default_factory=list)
+    pagamentos: List[dict] = field(default_factory=list)
+    manutencoes: List[dict] = field(default_factory=list)
+    veiculo_manutencoes: List[dict] = field(default_factory=list)
+    contratos: List[dict] = field(default_factory=list)
+
+
+Requisicao = Tuple[str, str, Optional[dict], Optional[Any]]
+
+
+@dataclass
+class Operacao:
+    nome: str
+    router: str
+    tipo: str
+    peso: float
+    requisicao: Callable[[Dados, Random], Requisicao]
+
+
+def _id(documentos: List[dict], rng: Random) -> str:
+    return str(rng.choice(documentos)["_id"])
+
+
+def _data(rng: Random, dias: int = 365) -> datetime:
+    return INICIO_DADOS + timedelta(days=rng.randrange(dias), minutes=rng.randrange(24 * 60))
+
+
+# Sufixo único das escritas (e-mail, CPF e placa têm índice único)
+_sequencia = itertools.count()
+
+
+def _novo_usuario(rng: Random) -> dict:
+    n = next(_sequencia)
+    return {"nome": f"{rng.choice(NOMES)} Carga {n}", "email": f"carga{n}-{rng.getrandbits(32)}@email.com",
+            "celular": f"119{n:08d}", "cpf": f"carga-{n}-{rng.getrandbits(32)}"}
+
+
+def _novo_contrato(dados: Dados, rng: Random) -> dict:
+    inicio = _data(rng)
+    return {
+        "usuario_id": _id(dados.usuarios, rng), "veiculo_id": _id(dados.veiculos, rng),
+        "pagamento_id": _id(dados.pagamentos, rng),
+        "data_inicio": inicio.isoformat(), "data_fim": (inicio + timedelta(days=rng.randint(1, 30))).isoformat(),
+    }
+
+
+def _atualizar_usuario(dados: Dados, rng: Random) -> Requisicao:
+    usuario = rng.choice(dados.usuarios)
+    corpo = {"nome": usuario["nome"], "email": usuario["email"], "celular": f"119{rng.randrange(10 ** 8):08d}", "cpf": usuario["cpf"]}
+    return "PUT", f"/api/usuarios/{usuario['_id']}", None, corpo
+
+
+def _atualizar_pagamento(dados: Dados, rng: Random) -> Requisicao:
+    pagamento = rng.choice(dados.pagamentos)
+    corpo = {"valor": pagamento["valor"], "forma_pagamento": pagamento["forma_pagamento"],
+             "vencimento": pagamento["vencimento"].isoformat(), "pago": rng.random() < 0.5}
+    return "PUT", f"/api/pagamentos/{pagamento['_id']}", None, corpo
+
+
+def _atualizar_contrato(dados: Dados, rng: Random) -> Requisicao:
+    return "PUT", f"/api/contratos/{_id(dados.contratos, rng)}", None, _novo_contrato(dados, rng)
+
+
+def _atualizar_veiculo(dados: Dados, rng: Random) -> Requisicao:
+    veiculo = rng.choice(dados.veiculos)
+    return "PUT", f"/api/veiculos/{veiculo['_id']}", None, {"ano": rng.randint(2010, 2024)}
+
+
+def _veiculos_disponiveis(dados: Dados, rng: Random) -> Requisicao:
+    inicio = _data(rng)
+    parametros = {"inicio": inicio.isoformat(), "fim": (inicio + timedelta(days=rng.randint(1, 14))).isoformat(), "limit": 20}
+    if rng.random() < 0.5:
+        parametros["marca"] = rng.choice(MARCAS)
+    return "GET", "/api/veiculos/disponiveis", parametros, None
+
+
+OPERACOES: List[Operacao] = [
+    # usuarios
+    Operacao("usuarios.listar", "usuarios", LEITURA, 4, lambda d, r: ("GET", "/api/usuarios/", {"limit": 20}, None)),
+    Operacao("usuarios.por_id", "usuarios", LEITURA, 6, lambda d, r: ("GET", f"/api/usuarios/{_id(d.usuarios, r)}", None, None)),
+    Operacao("usuarios.buscar_nome", "usuarios", LEITURA, 2, lambda d, r: ("GET", f"/api/usuarios/buscar/{r.choice(NOMES)}", None, None)),
+    Operacao("usuarios.autocomplete", "usuarios", LEITURA, 3, lambda d, r: (
+        "GET", "/api/usuarios/autocomplete", {"prefixo": r.choice(NOMES)[:r.randint(1, 4)], "limit": 10}, None)),
+    Operacao("usuarios.total", "usuarios", LEITURA, 1, lambda d, r: ("GET", "/api/usuarios/estatisticas/total", None, None)),
+    Operacao("usuarios.criar", "usuarios", ESCRITA, 2, lambda d, r: ("POST", "/api/usuarios/", None, _novo_usuario(r))),
+    Operacao("usuarios.atualizar", "usuarios", ESCRITA, 1, _atualizar_usuario),
+    # contratos
+    Operacao("contratos.listar", "contratos", LEITURA, 4, lambda d, r: ("GET", "/api/contratos/", {"limit": 20}, None)),
+    Operacao("contratos.por_id_expandido", "contratos", LEITURA, 6, lambda d, r: (
+        "GET", f"/api/contratos/{_id(d.contratos, r)}", {"expand": "usuario,veiculo,pagamento"}, None)),
+    Operacao("contratos.por_usuario", "contratos", LEITURA, 3, lambda d, r: ("GET", f"/api/contratos/by-user/{_id(d.usuarios, r)}", None, None)),
+    Operacao("contratos.buscar", "contratos", LEITURA, 2, lambda d, r: (
+        "GET", "/api/contratos/search", {"nome_usuario": r.choice(NOMES), "limit": 20, "total": "none"}, None)),
+    Operacao("contratos.por_meses", "contratos", LEITURA, 2, lambda d, r: (
+        "GET", "/api/contratos/by-payment-months", {"months": r.sample(MESES, r.randint(1, 3))}, None)),
+    Operacao("contratos.por_marca", "contratos", LEITURA, 1, lambda d, r: ("GET", f"/api/contratos/by-vehicle/{r.choice(MARCAS)}", None, None)),
+    Operacao("contratos.total", "contratos", LEITURA, 1, lambda d, r: ("GET", "/api/contratos/count", None, None)),
+    Operacao("contratos.criar", "contratos", ESCRITA, 2, lambda d, r: ("POST", "/api/contratos/", None, _novo_contrato(d, r))),
+    Operacao("contratos.atualizar", "contratos", ESCRITA, 1, _atualizar_contrato),
+    # pagamentos
+    Operacao("pagamentos.listar", "pagamentos", LEITURA, 3, lambda d, r: ("GET", "/api/pagamentos/", {"limit": 20, "pago": False}, None)),
+    Operacao("pagamentos.por_id", "pagamentos", LEITURA, 4, lambda d, r: ("GET", f"/api/pagamentos/{_id(d.pagamentos, r)}", None, None)),
+    Operacao("pagamentos.pendentes_usuario", "pagamentos", LEITURA, 2, lambda d, r: ("GET", "/api/pagamentos/pendentes/usuario", None, None)),
+    Operacao("pagamentos.criar", "pagamentos", ESCRITA, 1, lambda d, r: ("POST", "/api/pagamentos/", None, {
+        "valor": round(r.uniform(50, 500), 2), "forma_pagamento": r.choice(FORMAS_PAGAMENTO),
+        "vencimento": _data(r).isoformat(), "pago": False})),
+    Operacao("pagamentos.atualizar", "pagamentos", ESCRITA, 2, _atualizar_pagamento),
+    # manutencoes
+    Operacao("manutencoes.listar", "manutencoes", LEITURA, 2, lambda d, r: ("GET", "/api/manutencoes/", {"limit": 20}, None)),
+    Operacao("manutencoes.por_id", "manutencoes", LEITURA, 3, lambda d, r: ("GET", f"/api/manutencoes/{_id(d.manutencoes, r)}", None, None)),
+    Operacao("manutencoes.tipos_frequentes", "manutencoes", LEITURA, 1, lambda d, r: ("GET", "/api/manutencoes/estatisticas/tipos_frequentes", None, None)),
+    Operacao("manutencoes.criar", "manutencoes", ESCRITA, 1, lambda d, r: ("POST", "/api/manutencoes/", None, {
+        "data": _data(r).isoformat(), "tipo_manutencao": r.choice(TIPOS_MANUTENCAO),
+        "custo": round(r.uniform(100, 1000), 2), "observacao": "carga"})),
+    # veiculos
+    Operacao("veiculos.listar", "veiculos", LEITURA, 3, lambda d, r: ("GET", "/api/veiculos/", {"limit": 20}, None)),
+    Operacao("veiculos.por_id", "veiculos", LEITURA, 4, lambda d, r: ("GET", f"/api/veiculos/{_id(d.veiculos, r)}", None, None)),
+    Operacao("veiculos.por_tipo_manutencao", "veiculos", LEITURA, 1, lambda d, r: (
+        "GET", f"/api/veiculos/by-tipo-manutencao/{r.choice(TIPOS_MANUTENCAO)}", None, None)),
+    Operacao("veiculos.disponiveis", "veiculos", LEITURA, 2, _veiculos_disponiveis),
+    Operacao("veiculos.custo_medio", "veiculos", LEITURA, 1, lambda d, r: ("GET", "/api/veiculos/custo-medio-manutencoes", None, None)),
+    Operacao("veiculos.criar", "veiculos", ESCRITA, 1, lambda d, r: ("POST", "/api/veiculos/", None, {
+        "modelo": r.choice(MODELOS), "marca": r.choice(MARCAS), "placa": f"CRG{next(_sequencia):05d}{r.getrandbits(16):04x}",
+        "ano": r.randint(2010, 2024)})),
+    Operacao("veiculos.atualizar", "veiculos", ESCRITA, 1, _atualizar_veiculo),
+    # veiculo-manutencoes
+    Operacao("veiculo_manutencoes.por_id", "veiculo_manutencoes", LEITURA, 3, lambda d, r: (
+        "GET", f"/api/veiculo-manutencoes/{_id(d.veiculo_manutencoes, r)}", None, None)),
+    Operacao("veiculo_manutencoes.custo_por_marca", "veiculo_manutencoes", LEITURA, 1, lambda d, r: (
+        "GET", "/api/veiculo-manutencoes/total-custo-por-marca", None, None)),
+    Operacao("veiculo_manutencoes.maior_custo", "veiculo_manutencoes", LEITURA, 1, lambda d, r: (
+        "GET", "/api/veiculo-manutencoes/veiculos-com-maior-custo-manutencao", None, None)),
+    Operacao("veiculo_manutencoes.total", "veiculo_manutencoes", LEITURA, 1, lambda d, r: ("GET", "/api/veiculo-manutencoes/count", None, None)),
+    Operacao("veiculo_manutencoes.criar", "veiculo_manutencoes", ESCRITA, 1, lambda d, r: ("POST", "/api/veiculo-manutencoes/", None, {
+        "veiculo_id": _id(d.veiculos, r), "manutencao_id": _id(d.manutencoes, r)})),
+    # diagnostico e metrics
+    Operacao("diagnostico.pool", "diagnostico", LEITURA, 0.5, lambda d, r: ("GET", "/api/diagnostico/pool", None, None)),
+    Operacao("diagnostico.cache", "diagnostico", LEITURA, 0.5, lambda d, r: ("GET", "/api/diagnostico/cache", None, None)),
+    Operacao("metrics", "metrics", LEITURA, 0.5, lambda d, r: ("GET", "/metrics", None, None)),
+]
+
+
+def gerar_dados(tamanhos: Dict[str, int], semente: int) -> Dados:
+    """Mesma semente, mesmos documentos (inclusive os _id)."""
+    rng = Random(semente)
+
+    def novo_id() -> ObjectId:
+        return ObjectId(rng.randbytes(12))
+
+    dados = Dados()
+    for i in range(tamanhos["usuarios"]):
+        dados.usuarios.append({"_id": novo_id(), "nome": f"{NOMES[i % len(NOMES)]} {i}", "email": f"usuario{i}@email.com",
+                               "celular": f"119{i:08d}", "cpf": f"{i:011d}"})
+    for i in range(tamanhos["veiculos"]):
+        dados.veiculos.append({"_id": novo_id(), "modelo": MODELOS[i % len(MODELOS)], "marca": rng.choice(MARCAS),
+                               "placa": f"ABC{i:05d}", "ano": rng.randint(2010, 2024)})
+    for _ in range(tamanhos["pagamentos"]):
+        dados.pagamentos.append({"_id": novo_id(), "valor": round(rng.uniform(50, 500), 2),
+                                 "forma_pagamento": rng.choice(FORMAS_PAGAMENTO), "vencimento": _data(rng), "pago": rng.random() < 0.6})
+    for i in range(tamanhos["manutencoes"]):
+        dados.manutencoes.append({"_id": novo_id(), "data": _data(rng), "tipo_manutencao": rng.choice(TIPOS_MANUTENCAO),
+                                  "custo": round(rng.uniform(100, 1000), 2), "observacao": f"Manutenção {i}"})
+    for _ in range(tamanhos["veiculo_manutencoes"]):
+        dados.veiculo_manutencoes.append({"_id": novo_id(), "veiculo_id": rng.choice(dados.veiculos)["_id"],
+                                          "manutencao_id": rng.choice(dados.manutencoes)["_id"]})
+    for _ in range(tamanhos["contratos"]):
+        inicio = _data(rng)
+        dados.contratos.append({"_id": novo_id(), "usuario_id": rng.choice(dados.usuarios)["_id"],
+                                "veiculo_id": rng.choice(dados.veiculos)["_id"], "pagamento_id": rng.choice(dados.pagamentos)["_id"],
+                                "data_inicio": inicio, "data_fim": inicio + timedelta(days=rng.randint(1, 30))})
+    return dados
+
+
+async def semear(dados: Dados, lote: int = 1000):
+    from src.app.core.db.database import database
+    from src.app.core.db.derivados import reconstruir_custos_manutencao, reconstruir_saldos_pendentes, reconstruir_tipos_manutencao
+    from src.app.core.db.normalizacao import preencher_campo
+    from src.app.core.db.normalizacao import CAMPOS
+
+    for nome in COLECOES:
+        colecao = database.get_collection(nome)
+        await colecao.delete_many({})
+        documentos = getattr(dados, nome)
+        for inicio in range(0, len(documentos), lote):
+            await colecao.insert_many(documentos[inicio:inicio + lote], ordered=False)
+        if nome in CAMPOS:
+            # Inserção direta: os campos normalizados que o repositório grava são preenchidos aqui
+            await preencher_campo(colecao, *CAMPOS[nome], lote=lote)
+        print(f"{nome}: {len(documentos)} documentos")
+
+    # As rotas analíticas leem as coleções derivadas, que precisam refletir a massa semeada
+    await reconstruir_custos_manutencao()
+    await reconstruir_saldos_pendentes()
+    await reconstruir_tipos_manutencao()
+
+
+class Resultado:
+    __slots__ = ("duracoes", "status", "falhas")
+
+    def __init__(self):
+        self.duracoes: List[float] = []
+        self.status: Dict[str, int] = {}
+        self.falhas = 0
+
+    def registrar(self, duracao: float, status: Optional[int]):
+        self.duracoes.append(duracao)
+        if status is None:
+            self.falhas += 1
+        else:
+            self.status[str(status)] = self.status.get(str(status), 0) + 1
+
+    @property
+    def erros(self) -> int:
+        return self.falhas + sum(quantidade for status, quantidade in self.status.items() if int(status) >= 500)
+
+    def resumo(self, duracao_total: float) -> dict:
+        ordenadas = sorted(self.duracoes)
+        quantidade = len(ordenadas)
+        resumo = {
+            "requisicoes": quantidade,
+            "erros": self.erros,
+            "respostas_4xx": sum(n for status, n in self.status.items() if 400 <= int(status) < 500),
+            "status": dict(sorted(self.status.items())),
+            "throughput_rps": round(quantidade / duracao_total, 2) if duracao_total else 0.0,
+        }
+        if ordenadas:
+            resumo.update({f"p{p}_ms": round(_percentil(ordenadas, p) * 1000, 3) for p in PERCENTIS})
+            resumo["media_ms"] = round(sum(ordenadas) / quantidade * 1000, 3)
+            resumo["max_ms"] = round(ordenadas[-1] * 1000, 3)
+        return resumo
+
+    def somar(self, outro: "Resultado"):
+        self.duracoes += outro.duracoes
+        self.falhas += outro.falhas
+        for status, quantidade in outro.status.items():
+            self.status[status] = self.status.get(status, 0) + quantidade
+
+
+def _percentil(ordenados: List[float], p: int) -> float:
+    return ordenados[max(0, -(-len(ordenados) * p // 100) - 1)]
+
+
+async def disparar(cliente: httpx.AsyncClient, operacoes: List[Operacao], dados: Dados, requisicoes: int,
+                   concorrencia: int, escritas: float, semente: int) -> Dict[str, Resultado]:
+    leituras = [operacao for operacao in operacoes if operacao.tipo == LEITURA]
+    de_escrita = [operacao for operacao in operacoes if operacao.tipo == ESCRITA]
+    resultados = {operacao.nome: Resultado() for operacao in operacoes}
+    contador = itertools.count()
+
+    async def trabalhador(indice: int):
+        # Cada trabalhador tem seu gerador: a sequência de operações não depende do escalonamento
+        rng = Random(semente * 1000 + indice)
+        while next(contador) < requisicoes:
+            grupo = de_escrita if de_escrita and (not leituras or rng.random() < escritas) else leituras
+            operacao = rng.choices(grupo, weights=[item.peso for item in grupo])[0]
+            metodo, caminho, params, corpo = operacao.requisicao(dados, rng)
+            inicio = time.perf_counter()
+            try:
+                resposta = await cliente.request(metodo, caminho, params=params, json=corpo)
+                status = resposta.status_code
+            except httpx.HTTPError:
+                status = None
+            resultados[operacao.nome].registrar(time.perf_counter() - inicio, status)
+
+    await asyncio.gather(*(trabalhador(indice) for indice in range(concorrencia)))
+    return resultados
+
+
+def relatorio(resultados: Dict[str, Resultado], operacoes: List[Operacao], duracao: float, metadados: dict) -> dict:
+    por_router: Dict[str, Resultado] = {}
+    total = Resultado()
+    for operacao in operacoes:
+        resultado = resultados[operacao.nome]
+        por_router.setdefault(operacao.router, Resultado()).somar(resultado)
+        total.somar(resultado)
+
+    return {
+        "metadados": metadados,
+        "duracao_s": round(duracao, 3),
+        "totais": total.resumo(duracao),
+        "routers": {router: resultado.resumo(duracao) for router, resultado in sorted(por_router.items())},
+        "operacoes": {
+            operacao.nome: {"router": operacao.router, "tipo": operacao.tipo, **resultados[operacao.nome].resumo(duracao)}
+            for operacao in operacoes
+        },
+    }
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@asynccontextmanager
+async def _cliente(args, app) -> AsyncIterator[httpx.AsyncClient]:
+    if args.url:
+        limites = httpx.Limits(max_connections=args.concorrencia, max_keepalive_connections=args.concorrencia)
+        async with httpx.AsyncClient(base_url=args.url, limits=limites, timeout=args.timeout) as cliente:
+            yield cliente
+        return
+    # O ASGITransport não dispara o lifespan: sem ele a app em processo rodaria sem o índice de
+    # disponibilidade, a reconstrução dos derivados e o esvaziamento dos agrupadores no fim
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://carga", timeout=args.timeout) as cliente:
+            yield cliente
+
+
+async def executar(args) -> dict:
+    # As configurações são lidas na importação: o banco de carga precisa estar no ambiente antes
+    os.environ["MONGO_URI"] = args.mongo_uri
+    os.environ["MONGO_DB"] = args.banco
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from src.app.core.db.database import database
+    from src.app.core.db.derivados import sincronizar_indices_derivados
+    from src.app.core.db.indexes import sincronizar_repositorios
+    from src.app.core.startup import REPOSITORIOS
+    from src.app.main import app
+
+    routers = set(args.routers.split(",")) if args.routers else None
+    operacoes = [operacao for operacao in OPERACOES if routers is None or operacao.router in routers]
+    tamanhos = {nome: getattr(args, nome) for nome in COLECOES}
+    dados = gerar_dados(tamanhos, args.semente)
+
+    await database.connect()
+    await sincronizar_repositorios([repositorio() for repositorio in REPOSITORIOS])
+    await sincronizar_indices_derivados()
+    await semear(dados)
+    if args.url:
+        print(f"Alvo: {args.url} (o servidor deve usar o banco {args.banco}; reinicie-o para descartar caches)")
+    else:
+        # A app em processo abre e fecha a própria conexão no lifespan
+        await database.disconnect()
+
+    async with _cliente(args, app) as cliente:
+        if args.aquecimento:
+            await disparar(cliente, operacoes, dados, args.aquecimento, args.concorrencia, args.escritas, args.semente + 1)
+        inicio = time.perf_counter()
+        resultados = await disparar(cliente, operacoes, dados, args.requisicoes, args.concorrencia, args.escritas, args.semente)
+        duracao = time.perf_counter() - inicio
+    if args.url:
+        await database.disconnect()
+
+    metadados = {
+        "commit": _commit(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "alvo": args.url or "asgi",
+        "parametros": {chave: valor for chave, valor in vars(args).items() if chave not in ("comando", "funcao", "mongo_uri")},
+    }
+    return relatorio(resultados, operacoes, duracao, metadados)
+
+
+def imprimir(resultado: dict):
+    print(f"{'operação':<40} {'req':>6} {'erros':>6} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for nome, item in list(resultado["operacoes"].items()) + [("TOTAL", resultado["totais"])]:
+        if not item["requisicoes"]:
+            continue
+        print(f"{nome:<40} {item['requisicoes']:>6} {item['erros']:>6} {item['throughput_rps']:>9.1f} "
+              f"{item['p50_ms']:>9.2f} {item['p95_ms']:>9.2f} {item['p99_ms']:>9.2f}")
+
+
+def comparar(base: dict, atual: dict, tolerancia: float) -> int:
+    """Compara p95 e throughput por operação; devolve quantas pioraram além da tolerância."""
+    regressoes = 0
+    print(f"base {base['metadados'].get('commit')} -> atual {atual['metadados'].get('commit')}")
+    print(f"{'operação':<40} {'p95 base':>9} {'p95 atual':>9} {'Δ%':>7} {'rps base':>9} {'rps atual':>9}")
+    itens = [(nome, item, base["operacoes"].get(nome)) for nome, item in atual["operacoes"].items()]
+    itens.append(("TOTAL", atual["totais"], base["totais"]))
+    for nome, item, anterior in itens:
+        if not anterior or not anterior.get("requisicoes") or not item.get("requisicoes"):
+            continue
+        variacao = item["p95_ms"] / anterior["p95_ms"] - 1 if anterior["p95_ms"] else 0.0
+        piorou = variacao > tolerancia or item["erros"] > anterior["erros"]
+        regressoes += piorou
+        print(f"{nome:<40} {anterior['p95_ms']:>9.2f} {item['p95_ms']:>9.2f} {variacao * 100:>+6.1f}% "
+              f"{anterior['throughput_rps']:>9.1f} {item['throughput_rps']:>9.1f}{'  <- regressão' if piorou else ''}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    carga = comandos.add_parser("executar", help="Semeia o banco, executa a carga e grava o resultado")
+    carga.add_argument("--url", help="Servidor já em execução (padrão: aplicação no próprio processo)")
+    carga.add_argument("--mongo-uri", default=os.environ.get("MONGO_URI", "mongodb://localhost:27017"))
+    carga.add_argument("--banco", default="tp3_carga", help="Banco usado na carga; as coleções são apagadas e semeadas")
+    for nome, padrao in (("usuarios", 2000), ("veiculos", 500), ("pagamentos", 5000), ("manutencoes", 2000),
+                         ("veiculo_manutencoes", 4000), ("contratos", 5000)):
+        carga.add_argument(f"--{nome.replace('_', '-')}", dest=nome, type=int, default=padrao)
+    carga.add_argument("--concorrencia", type=int, default=32)
+    carga.add_argument("--requisicoes", type=int, default=5000)
+    carga.add_argument("--aquecimento", type=int, default=200, help="Requisições descartadas antes da medição")
+    carga.add_argument("--escritas", type=float, default=0.1, help="Fração de escritas (0 a 1)")
+    carga.add_argument("--routers", help="Só estes routers, separados por vírgula (ex.: usuarios,contratos)")
+    carga.add_argument("--semente", type=int, default=42)
+    carga.add_argument("--timeout", type=float, default=30.0)
+    carga.add_argument("--saida", help="Arquivo JSON do resultado (padrão: benchmarks/resultados/carga-<commit>.json)")
+
+    comparacao = comandos.add_parser("comparar", help="Compara dois resultados; sai com 1 se houver regressão")
+    comparacao.add_argument("base")
+    comparacao.add_argument("atual")
+    comparacao.add_argument("--tolerancia", type=float, default=0.2, help="Aumento de p95 aceito (0.2 = 20%%)")
+
+    args = parser.parse_args()
+    if args.comando == "comparar":
+        with open(args.base, encoding="utf-8") as arquivo_base, open(args.atual, encoding="utf-8") as arquivo_atual:
+            sys.exit(1 if comparar(json.load(arquivo_base), json.load(arquivo_atual), args.tolerancia) else 0)
+
+    resultado = asyncio.run(executar(args))
+    imprimir(resultado)
+    saida = args.saida or os.path.join("benchmarks", "resultados", f"carga-{resultado['metadados']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(saida) or ".", exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    print(f"Resultado gravado em {saida}")
+
+
+if __name__ == "__main__":
+    main()
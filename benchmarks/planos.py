@@ -0,0 +1,201 @@
+"""Teste de regressão dos planos de consulta dos repositórios.
+
+Semeia um banco próprio com os dados do teste de carga (determinísticos pela semente), sobe a
+aplicação no próprio processo e dispara as operações de leitura de benchmarks/carga.py. Cada
+find/aggregate/count/distinct que os repositórios emitem é capturado pelo CommandListener e
+reexecutado com explain("executionStats"); a chave de cada plano é a operação do repositório, o
+comando e o formato do comando, então uma consulta nova ou alterada aparece como chave nova.
+Estágios, índices e documentos/chaves examinados são comparados com uma linha de base versionada.
+Sai com 1 quando algum plano piora: COLLSCAN ou SORT em memória novos, mais documentos ou chaves
+examinados além da tolerância, ou mais varreduras dentro de $lookup; também quando uma consulta
+não está na linha de base. Sem linha de base, sai com 2: ela só é gravada com --atualizar,
+rodando contra um mongod real.
+
+Uso: python -m benchmarks.planos [--mongo-uri mongodb://localhost:27017] [--banco tp3_planos]
+         [--base benchmarks/planos_baseline.json] [--tolerancia 0.2] [--atualizar] [--saida atual.json]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+from random import Random
+from typing import Any, Dict
+
+BASE_PADRAO = os.path.join("benchmarks", "planos_baseline.json")
+
+# Tamanhos fixos: os números examinados só são comparáveis entre execuções sobre os mesmos dados
+TAMANHOS = {
+    "usuarios": 2000,
+    "veiculos": 500,
+    "pagamentos": 5000,
+    "manutencoes": 2000,
+    "veiculo_manutencoes": 4000,
+    "contratos": 5000,
+}
+
+# Requisições por operação: parâmetros sorteados diferentes podem gerar formatos de consulta diferentes
+REPETICOES = 3
+
+# Estágios que, quando aparecem numa consulta que não os tinha, indicam plano pior
+ESTAGIOS_RUINS = ("COLLSCAN", "SORT")
+
+# Folga absoluta: evita falso positivo em consultas que examinam poucos documentos
+FOLGA = 10
+
+
+def _formato(valor: Any) -> Any:
+    # formato_comando resume listas de valores como "[n]": o tamanho da lista não muda o formato
+    if isinstance(valor, dict):
+        return {chave: _formato(item) for chave, item in valor.items()}
+    if isinstance(valor, list):
+        return [_formato(item) for item in valor]
+    return "[...]" if isinstance(valor, str) and re.fullmatch(r"\[\d+\]", valor) else valor
+
+
+def chave_consulta(nome_operacao: str, comando: Dict[str, Any]) -> str:
+    from src.app.core.db.instrumentation import formato_comando
+
+    nome_comando = next(iter(comando))
+    formato = json.dumps(_formato(formato_comando(comando)), sort_keys=True)
+    return f"{nome_operacao} {nome_comando}:{comando[nome_comando]} {hashlib.sha1(formato.encode()).hexdigest()[:10]}"
+
+
+def _grava(comando: Dict[str, Any]) -> bool:
+    # explain("executionStats") executa o pipeline: $merge/$out gravariam no banco de teste
+    return any("$merge" in etapa or "$out" in etapa for etapa in comando.get("pipeline", []))
+
+
+async def coletar(args) -> Dict[str, Dict[str, Any]]:
+    # As configurações são lidas na importação: o banco precisa estar no ambiente antes
+    os.environ["MONGO_URI"] = args.mongo_uri
+    os.environ["MONGO_DB"] = args.banco
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import httpx
+
+    from benchmarks.carga import LEITURA, OPERACOES, gerar_dados, semear
+    from src.app.core.db.database import database
+    from src.app.core.db.derivados import sincronizar_indices_derivados
+    from src.app.core.db.indexes import resumir_plano, sincronizar_repositorios
+    from src.app.core.db.instrumentation import comandos_capturados
+    from src.app.core.db.normalizacao import preencher_pendentes
+    from src.app.core.startup import REPOSITORIOS
+    from src.app.main import app
+
+    dados = gerar_dados(TAMANHOS, args.semente)
+    if not args.sem_popular:
+        await database.connect()
+        await sincronizar_repositorios([repositorio() for repositorio in REPOSITORIOS])
+        await sincronizar_indices_derivados()
+        await semear(dados)
+        await database.disconnect()
+
+    planos = {}
+    async with app.router.lifespan_context(app):
+        # O lifespan preenche os campos normalizados em segundo plano; sem esperar, a busca por
+        # nome usaria o $regex de transição
+        await preencher_pendentes()
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://planos", timeout=60) as cliente:
+            for operacao in (item for item in OPERACOES if item.tipo == LEITURA):
+                rng = Random(f"{args.semente}:{operacao.nome}")
+                for _ in range(REPETICOES):
+                    metodo, caminho, params, corpo = operacao.requisicao(dados, rng)
+                    capturados = []
+                    token = comandos_capturados.set(capturados)
+                    try:
+                        resposta = await cliente.request(metodo, caminho, params=params, json=corpo)
+                    finally:
+                        comandos_capturados.reset(token)
+                    if resposta.status_code >= 500:
+                        print(f"{operacao.nome}: {metodo} {caminho} respondeu {resposta.status_code}")
+
+                    for nome_operacao, comando in capturados:
+                        chave = chave_consulta(nome_operacao, comando)
+                        if chave in planos or _grava(comando):
+                            continue
+                        explain = await database.db.command("explain", comando, verbosity="executionStats")
+                        planos[chave] = {**resumir_plano(explain), "rota": operacao.nome}
+    return planos
+
+
+def comparar(base: Dict[str, dict], atual: Dict[str, dict], tolerancia: float) -> int:
+    """Imprime as diferenças de plano e devolve quantas consultas pioraram."""
+    regressoes = 0
+    print(f"{'consulta':<75} {'docs':>8} {'chaves':>8} {'ret':>6}  estágios")
+    for nome, plano in atual.items():
+        anterior = base.get(nome)
+        problemas = []
+        if anterior is None:
+            # Consulta nova precisa entrar na linha de base com --atualizar, senão nunca seria verificada
+            problemas.append("nova (sem linha de base; rode com --atualizar)")
+        else:
+            for estagio in ESTAGIOS_RUINS:
+                if estagio in plano["estagios"] and estagio not in anterior["estagios"]:
+                    problemas.append(f"passou a usar {estagio}")
+            for campo in ("docs_examinados", "chaves_examinadas"):
+                if plano[campo] > anterior[campo] * (1 + tolerancia) + FOLGA:
+                    problemas.append(f"{campo} {anterior[campo]} -> {plano[campo]}")
+            if plano["collscans_lookup"] > anterior["collscans_lookup"]:
+                problemas.append(f"collscans em $lookup {anterior['collscans_lookup']} -> {plano['collscans_lookup']}")
+            # Troca de índice só é regressão quando vem acompanhada de mais trabalho
+            if problemas and plano["indices"] != anterior["indices"]:
+                problemas.append(f"índices {anterior['indices']} -> {plano['indices']}")
+
+        piorou = bool(problemas)
+        regressoes += piorou
+        marca = "  <- regressão" if piorou else ""
+        print(f"{nome:<75} {plano['docs_examinados']:>8} {plano['chaves_examinadas']:>8} {plano['retornados']:>6}  "
+              f"{','.join(plano['estagios'])}{marca}")
+        for problema in problemas:
+            print(f"    {problema}")
+
+    for nome in sorted(base.keys() - atual.keys()):
+        print(f"{nome:<75} removida (presente só na linha de base)")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-uri", default=os.environ.get("MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--banco", default="tp3_planos", help="Banco usado no teste; as coleções são apagadas e semeadas")
+    parser.add_argument("--base", default=BASE_PADRAO, help="Linha de base versionada")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Aumento de documentos/chaves examinados aceito (0.2 = 20%%)")
+    parser.add_argument("--atualizar", action="store_true", help="Grava o resultado como nova linha de base")
+    parser.add_argument("--sem-popular", action="store_true", help="Usa o banco como está, sem semear")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", help="Também grava o resultado neste arquivo JSON")
+    args = parser.parse_args()
+
+    # Sem linha de base não há com o que comparar: falha antes de semear o banco
+    if not args.atualizar and not os.path.exists(args.base):
+        print(f"Linha de base {args.base} não encontrada; gere-a com --atualizar")
+        sys.exit(2)
+
+    atual = asyncio.run(coletar(args))
+    if args.saida:
+        _gravar(args.saida, atual)
+
+    if args.atualizar:
+        _gravar(args.base, atual)
+        print(f"Linha de base com {len(atual)} consulta(s) gravada em {args.base}")
+        return
+
+    with open(args.base, encoding="utf-8") as arquivo:
+        base = json.load(arquivo)
+    regressoes = comparar(base, atual, args.tolerancia)
+    if regressoes:
+        print(f"{regressoes} consulta(s) com plano pior que a linha de base")
+    sys.exit(1 if regressoes else 0)
+
+
+def _gravar(caminho: str, planos: Dict[str, dict]):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        json.dump(planos, arquivo, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Compara a leitura atual (modelo -> DTO -> response_model) com o serializador direto de documentos BSON.
+
+Uso: python -m benchmarks.serializacao [--documentos 1000] [--repeticoes 20]
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+from pydantic import TypeAdapter
+
+from src.app.core import serializacao
+from src.app.dtos.contrato_dto import ContratoDTO
+from src.app.models.contrato import Contrato
+
+
+def gerar_documentos(quantidade: int) -> List[dict]:
+    inicio = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "usuario_id": ObjectId(),
+            "veiculo_id": ObjectId(),
+            "pagamento_id": ObjectId() if i % 3 else None,
+            "data_inicio": inicio + timedelta(days=i),
+            "data_fim": inicio + timedelta(days=i + 7),
+        }
+        for i in range(quantidade)
+    ]
+
+
+def caminho_atual(documentos: List[dict], adaptador: TypeAdapter) -> bytes:
+    # Repositório monta o modelo e o DTO; o FastAPI revalida contra o response_model e serializa
+    dtos = [ContratoDTO.from_model(Contrato(**documento)) for documento in documentos]
+    validados = adaptador.validate_python([dto.model_dump() for dto in dtos])
+    conteudo = adaptador.dump_python(validados, mode="json")
+    return json.dumps(conteudo, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def caminho_direto(documentos: List[dict], campos: List[str]) -> bytes:
+    return serializacao.dumps([serializacao.projetar(documento, campos) for documento in documentos])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documentos", type=int, default=1000)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    documentos = gerar_documentos(args.documentos)
+    adaptador = TypeAdapter(List[ContratoDTO])
+    campos = list(ContratoDTO.model_fields)
+
+    assert json.loads(caminho_atual(documentos, adaptador)) == json.loads(caminho_direto(documentos, campos))
+
+    orjson = serializacao.orjson
+    casos = [("atual (modelo + DTO + response_model)", lambda: caminho_atual(documentos, adaptador))]
+    if orjson is not None:
+        casos.append(("direto (orjson)", lambda: caminho_direto(documentos, campos)))
+    casos.append(("direto (json)", lambda: caminho_direto(documentos, campos)))
+
+    referencia = None
+    print(f"{args.documentos} contratos, melhor de {args.repeticoes} execuções")
+    for nome, funcao in casos:
+        serializacao.orjson = None if nome == "direto (json)" else orjson
+        melhor = min(timeit.repeat(funcao, number=1, repeat=args.repeticoes))
+        referencia = referencia or melhor
+        print(f"{nome:<40} {melhor * 1000:8.2f} ms  {melhor / args.documentos * 1e6:6.2f} µs/doc  {referencia / melhor:5.1f}x")
+    serializacao.orjson = orjson
+
+
+if __name__ == "__main__":
+    main()
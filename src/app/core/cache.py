@@ -0,0 +1,303 @@
+import asyncio
+import functools
+import logging
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+import bson
+
+from src.app.core.config import config, settings
+
+logger = logging.getLogger('app_logger.cache')
+
+# Tamanho contabilizado para uma entrada negativa (documento inexistente)
+_TAMANHO_NEGATIVO = 64
+
+
+class _Entrada:
+    __slots__ = ("documento", "tamanho", "expira_em")
+
+    def __init__(self, documento: Optional[dict], tamanho: int, expira_em: float):
+        self.documento = documento
+        self.tamanho = tamanho
+        self.expira_em = expira_em
+
+
+class _Contadores:
+    __slots__ = ("hits", "hits_negativos", "misses", "evictions", "expiracoes", "invalidacoes")
+
+    def __init__(self):
+        self.hits = 0
+        self.hits_negativos = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expiracoes = 0
+        self.invalidacoes = 0
+
+
+class DocumentCache:
+    """Cache LRU de documentos brutos por (coleção, _id), limitado por quantidade e por bytes.
+
+    Só é usado no loop de eventos, então não precisa de lock. Um documento None guarda
+    a ausência do _id (cache negativo).
+    """
+
+    def __init__(self, max_entradas: int, max_bytes: int):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entradas: "OrderedDict[Tuple[str, Hashable], _Entrada]" = OrderedDict()
+        self._contadores: Dict[str, _Contadores] = {}
+        # Incrementada a cada invalidação na coleção: leituras iniciadas antes dela não gravam no cache
+        self._geracoes: Dict[str, int] = {}
+
+    def obter(self, colecao: str, chave: Hashable) -> Tuple[bool, Optional[dict]]:
+        contadores = self._contadores_de(colecao)
+        entrada = self._entradas.get((colecao, chave))
+        if entrada is None:
+            contadores.misses += 1
+            return False, None
+        if entrada.expira_em <= time.monotonic():
+            self._remover((colecao, chave))
+            contadores.expiracoes += 1
+            contadores.misses += 1
+            return False, None
+
+        self._entradas.move_to_end((colecao, chave))
+        if entrada.documento is None:
+            contadores.hits_negativos += 1
+            return True, None
+        contadores.hits += 1
+        return True, dict(entrada.documento)
+
+    def geracao(self, colecao: str) -> int:
+        return self._geracoes.get(colecao, 0)
+
+    def guardar(self, colecao: str, chave: Hashable, documento: Optional[dict], ttl: float, geracao: int = 0):
+        if ttl <= 0 or geracao != self.geracao(colecao):
+            return
+        tamanho = len(bson.encode(documento)) if documento is not None else _TAMANHO_NEGATIVO
+        if tamanho > self.max_bytes:
+            return
+
+        self._remover((colecao, chave))
+        self._entradas[(colecao, chave)] = _Entrada(documento, tamanho, time.monotonic() + ttl)
+        self.bytes += tamanho
+
+        while len(self._entradas) > self.max_entradas or self.bytes > self.max_bytes:
+            mais_antiga = next(iter(self._entradas))
+            self._remover(mais_antiga)
+            self._contadores_de(mais_antiga[0]).evictions += 1
+
+    def invalidar(self, colecao: str, chave: Hashable):
+        self._geracoes[colecao] = self.geracao(colecao) + 1
+        if self._remover((colecao, chave)):
+            self._contadores_de(colecao).invalidacoes += 1
+
+    def limpar(self, colecao: Optional[str] = None):
+        for chave in [chave for chave in self._entradas if colecao is None or chave[0] == colecao]:
+            self._remover(chave)
+
+    def snapshot(self) -> dict:
+        return {
+            "entradas": len(self._entradas),
+            "bytes": self.bytes,
+            "max_entradas": self.max_entradas,
+            "max_bytes": self.max_bytes,
+            "colecoes": {
+                colecao: {atributo: getattr(contadores, atributo) for atributo in _Contadores.__slots__}
+                for colecao, contadores in sorted(self._contadores.items())
+            },
+        }
+
+    def prometheus(self) -> str:
+        linhas = [
+            "# HELP document_cache_entries Entradas no cache de documentos.",
+            "# TYPE document_cache_entries gauge",
+            f"document_cache_entries {len(self._entradas)}",
+            "# HELP document_cache_bytes Bytes BSON ocupados pelo cache de documentos.",
+            "# TYPE document_cache_bytes gauge",
+            f"document_cache_bytes {self.bytes}",
+        ]
+        for atributo in _Contadores.__slots__:
+            nome = f"document_cache_{atributo}_total"
+            linhas += [f"# HELP {nome} Cache de documentos: {atributo}.", f"# TYPE {nome} counter"]
+            for colecao, contadores in sorted(self._contadores.items()):
+                linhas.append(f'{nome}{{colecao="{colecao}"}} {getattr(contadores, atributo)}')
+        return "\n".join(linhas) + "\n"
+
+    def _remover(self, chave: Tuple[str, Hashable]) -> bool:
+        entrada = self._entradas.pop(chave, None)
+        if entrada is None:
+            return False
+        self.bytes -= entrada.tamanho
+        return True
+
+    def _contadores_de(self, colecao: str) -> _Contadores:
+        contadores = self._contadores.get(colecao)
+        if contadores is None:
+            contadores = self._contadores[colecao] = _Contadores()
+        return contadores
+
+
+@lru_cache(maxsize=None)
+def cache_ttl(collection_name: str, padrao: float) -> float:
+    # Permite trocar o TTL de uma coleção pelo ambiente, ex.: CACHE_TTL_PAGAMENTOS=5 (0 desativa)
+    return config(f"CACHE_TTL_{collection_name.upper()}", cast=float, default=padrao)
+
+
+async def buscar_documento(collection, _id: Any, ttl: float) -> Optional[dict]:
+    """find_one por _id passando pelo cache; ausências ficam guardadas por CACHE_NEGATIVE_TTL."""
+    if ttl <= 0:
+        return await collection.find_one({"_id": _id})
+
+    encontrado, documento = document_cache.obter(collection.name, _id)
+    if encontrado:
+        return documento
+
+    geracao = document_cache.geracao(collection.name)
+    documento = await collection.find_one({"_id": _id})
+    ttl_entrada = ttl if documento is not None else min(ttl, settings.CACHE_NEGATIVE_TTL)
+    document_cache.guardar(collection.name, _id, documento, ttl_entrada, geracao)
+    return documento
+
+
+def invalidar_documento(collection, _id: Any):
+    document_cache.invalidar(collection.name, _id)
+
+
+document_cache = DocumentCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_MAX_BYTES)
+
+
+class _Resultado:
+    __slots__ = ("valor", "fresco_ate", "expira_em", "colecoes")
+
+    def __init__(self, valor: Any, fresco_ate: float, expira_em: float, colecoes: Tuple[str, ...]):
+        self.valor = valor
+        self.fresco_ate = fresco_ate
+        self.expira_em = expira_em
+        self.colecoes = colecoes
+
+
+class ResultCache:
+    """Cache de resultados de agregações com coalescência de chamadas simultâneas.
+
+    Chamadas iguais enquanto uma agregação está em andamento esperam o mesmo resultado.
+    Depois do TTL o valor ainda é servido por mais `stale` segundos enquanto é recalculado
+    em segundo plano. Escritas nas coleções de origem descartam os resultados que dependem delas.
+    """
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self._resultados: "OrderedDict[Hashable, _Resultado]" = OrderedDict()
+        self._em_andamento: Dict[Hashable, asyncio.Future] = {}
+        self._geracoes: Dict[str, int] = {}
+        self._tarefas: Set[asyncio.Task] = set()
+        self.contadores = {"hits": 0, "hits_stale": 0, "misses": 0, "coalescidas": 0, "invalidacoes": 0, "falhas": 0}
+
+    async def obter(self, chave: Hashable, calcular: Callable[[], Awaitable[Any]], colecoes: Tuple[str, ...],
+                    ttl: float, stale: float) -> Any:
+        agora = time.monotonic()
+        resultado = self._resultados.get(chave)
+        if resultado is not None and resultado.expira_em > agora:
+            self._resultados.move_to_end(chave)
+            if resultado.fresco_ate > agora:
+                self.contadores["hits"] += 1
+            else:
+                self.contadores["hits_stale"] += 1
+                if chave not in self._em_andamento:
+                    tarefa = asyncio.ensure_future(self._calcular(chave, calcular, colecoes, ttl, stale))
+                    self._tarefas.add(tarefa)
+                    tarefa.add_done_callback(self._finalizar_revalidacao)
+            return resultado.valor
+
+        em_andamento = self._em_andamento.get(chave)
+        if em_andamento is not None:
+            self.contadores["coalescidas"] += 1
+            return await asyncio.shield(em_andamento)
+
+        self.contadores["misses"] += 1
+        return await self._calcular(chave, calcular, colecoes, ttl, stale)
+
+    async def _calcular(self, chave: Hashable, calcular: Callable[[], Awaitable[Any]], colecoes: Tuple[str, ...],
+                        ttl: float, stale: float) -> Any:
+        geracoes = tuple(self._geracoes.get(colecao, 0) for colecao in colecoes)
+        # A agregação roda numa tarefa própria: o cancelamento de quem a iniciou não afeta os demais
+        futuro = asyncio.ensure_future(calcular())
+        self._em_andamento[chave] = futuro
+        futuro.add_done_callback(lambda _: self._fim_calculo(chave, futuro))
+        try:
+            valor = await asyncio.shield(futuro)
+        except Exception:
+            self.contadores["falhas"] += 1
+            raise
+
+        # Uma escrita durante o cálculo pode ter tornado o resultado obsoleto: entrega, mas não guarda
+        if geracoes == tuple(self._geracoes.get(colecao, 0) for colecao in colecoes):
+            agora = time.monotonic()
+            self._resultados[chave] = _Resultado(valor, agora + ttl, agora + ttl + stale, colecoes)
+            self._resultados.move_to_end(chave)
+            while len(self._resultados) > self.max_entradas:
+                self._resultados.popitem(last=False)
+        return valor
+
+    def _fim_calculo(self, chave: Hashable, futuro: asyncio.Future):
+        if self._em_andamento.get(chave) is futuro:
+            del self._em_andamento[chave]
+
+    def _finalizar_revalidacao(self, tarefa: asyncio.Task):
+        self._tarefas.discard(tarefa)
+        if not tarefa.cancelled() and tarefa.exception() is not None:
+            logger.error("Erro ao revalidar resultado em cache: %s", tarefa.exception())
+
+    def invalidar(self, colecoes: Iterable[str]):
+        colecoes = set(colecoes)
+        for colecao in colecoes:
+            self._geracoes[colecao] = self._geracoes.get(colecao, 0) + 1
+        for chave in [chave for chave, resultado in self._resultados.items() if colecoes.intersection(resultado.colecoes)]:
+            del self._resultados[chave]
+            self.contadores["invalidacoes"] += 1
+
+    def limpar(self):
+        self._resultados.clear()
+
+    def snapshot(self) -> dict:
+        return {
+            "entradas": len(self._resultados),
+            "em_andamento": len(self._em_andamento),
+            "max_entradas": self.max_entradas,
+            **self.contadores,
+        }
+
+
+def cache_analitico(*colecoes: str, ttl: Optional[float] = None, stale: Optional[float] = None):
+    """Compartilha e guarda o resultado de um método de agregação de repositório.
+
+    A chave é o nome do método com os argumentos (sem o self). O resultado é compartilhado
+    entre as chamadas e não deve ser modificado por quem o recebe. Só valores devolvidos são
+    guardados: o método não deve trocar erros por um valor vazio, que ficaria no cache até o TTL.
+    """
+    def decorador(metodo):
+        @functools.wraps(metodo)
+        async def wrapper(self, *args, **kwargs):
+            if settings.ANALYTICS_CACHE_TTL <= 0:
+                return await metodo(self, *args, **kwargs)
+            chave = (metodo.__qualname__, args, tuple(sorted(kwargs.items())))
+            return await result_cache.obter(
+                chave,
+                lambda: metodo(self, *args, **kwargs),
+                colecoes,
+                settings.ANALYTICS_CACHE_TTL if ttl is None else ttl,
+                settings.ANALYTICS_CACHE_STALE if stale is None else stale,
+            )
+        return wrapper
+    return decorador
+
+
+def invalidar_analises(*colecoes: str):
+    result_cache.invalidar(colecoes)
+
+
+result_cache = ResultCache(settings.ANALYTICS_CACHE_MAX_ENTRIES)
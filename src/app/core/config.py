@@ -24,6 +24,76 @@ class MongoSettings(DatabaseSettings):
     MONGO_DB: str = config("MONGO_DB", default="tp3")
     MONGO_URI: str = config("MONGO_URI", default=f"mongodb+srv://{MONGO_USER}:{MONGO_PASSWORD}@{MONGO_CLUSTER}/{MONGO_DB}?retryWrites=true&w=majority")
 
+    # Pool de conexões do driver
+    MONGO_MAX_POOL_SIZE: int = config("MONGO_MAX_POOL_SIZE", cast=int, default=100)
+    MONGO_MIN_POOL_SIZE: int = config("MONGO_MIN_POOL_SIZE", cast=int, default=0)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int | None = config("MONGO_WAIT_QUEUE_TIMEOUT_MS", cast=int, default=None)
+    MONGO_MAX_IDLE_TIME_MS: int | None = config("MONGO_MAX_IDLE_TIME_MS", cast=int, default=None)
+    MONGO_CONNECT_TIMEOUT_MS: int = config("MONGO_CONNECT_TIMEOUT_MS", cast=int, default=20000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = config("MONGO_SERVER_SELECTION_TIMEOUT_MS", cast=int, default=30000)
+    MONGO_COMPRESSORS: str | None = config("MONGO_COMPRESSORS", default=None)
+
+    # Índices declarados pelos repositórios
+    MONGO_SYNC_INDEXES: bool = config("MONGO_SYNC_INDEXES", cast=bool, default=True)
+    MONGO_INDEX_CHECK: bool = config("MONGO_INDEX_CHECK", cast=bool, default=False)
+
+    # Comandos acima deste limite são registrados no log de comandos lentos (0 desativa)
+    MONGO_SLOW_COMMAND_MS: int = config("MONGO_SLOW_COMMAND_MS", cast=int, default=100)
+
+    # Bytes BSON enviados/recebidos por comando nas métricas; desligado por padrão porque medir
+    # exige recodificar cada comando e cada resposta
+    MONGO_COMMAND_BYTES_ENABLED: bool = config("MONGO_COMMAND_BYTES_ENABLED", cast=bool, default=False)
+
+    # Tamanho padrão dos lotes de insert_many nos endpoints /bulk
+    MONGO_BULK_BATCH_SIZE: int = config("MONGO_BULK_BATCH_SIZE", cast=int, default=1000)
+
+    # Documentos por lote do cursor nos endpoints /export
+    MONGO_EXPORT_BATCH_SIZE: int = config("MONGO_EXPORT_BATCH_SIZE", cast=int, default=1000)
+
+    # Inserções unitárias concorrentes agrupadas num insert_many: janela em ms (0 desativa) e tamanho
+    # máximo do lote; MONGO_COALESCE_WINDOW_MS_<COLECAO> e MONGO_COALESCE_BATCH_SIZE_<COLECAO> sobrescrevem,
+    # ex.: MONGO_COALESCE_WINDOW_MS_PAGAMENTOS=2
+    MONGO_COALESCE_WINDOW_MS: float = config("MONGO_COALESCE_WINDOW_MS", cast=float, default=0.0)
+    MONGO_COALESCE_BATCH_SIZE: int = config("MONGO_COALESCE_BATCH_SIZE", cast=int, default=100)
+
+class CacheSettings:
+    # Cache de documentos por _id (get_by_id); o TTL de cada coleção fica no repositório
+    CACHE_MAX_ENTRIES: int = config("CACHE_MAX_ENTRIES", cast=int, default=10000)
+    CACHE_MAX_BYTES: int = config("CACHE_MAX_BYTES", cast=int, default=32 * 1024 * 1024)
+    CACHE_NEGATIVE_TTL: float = config("CACHE_NEGATIVE_TTL", cast=float, default=5.0)
+
+    # Resultados das agregações analíticas: TTL, janela em que o valor vencido ainda é servido
+    # enquanto é recalculado, e limite de entradas (ANALYTICS_CACHE_TTL=0 desativa)
+    ANALYTICS_CACHE_TTL: float = config("ANALYTICS_CACHE_TTL", cast=float, default=30.0)
+    ANALYTICS_CACHE_STALE: float = config("ANALYTICS_CACHE_STALE", cast=float, default=120.0)
+    ANALYTICS_CACHE_MAX_ENTRIES: int = config("ANALYTICS_CACHE_MAX_ENTRIES", cast=int, default=256)
+
+class LoggingSettings:
+    LOG_LEVEL: str = config("LOG_LEVEL", default="INFO")
+    # Registros aguardando a thread de escrita; com a fila cheia, os novos são descartados
+    LOG_QUEUE_SIZE: int = config("LOG_QUEUE_SIZE", cast=int, default=10000)
+    # INFO/DEBUG por logger: mensagens por segundo e rajada (0 desativa); LOG_RATE_LIMIT_<LOGGER> sobrescreve,
+    # ex.: LOG_RATE_LIMIT_PAGAMENTO_REPOSITORY=5. LOG_SAMPLE_<LOGGER> mantém só essa fração (0 a 1)
+    LOG_RATE_LIMIT: float = config("LOG_RATE_LIMIT", cast=float, default=50.0)
+    LOG_RATE_BURST: int = config("LOG_RATE_BURST", cast=int, default=100)
+    # Tamanho máximo do texto de um valor resumido no log (documentos completos só com LOG_LEVEL=DEBUG)
+    LOG_PAYLOAD_MAX_CHARS: int = config("LOG_PAYLOAD_MAX_CHARS", cast=int, default=200)
+
+class HttpSettings:
+    # Tempo por rota medido pelo middleware (cabeçalho Server-Timing e /api/diagnostico/rotas):
+    # percentis calculados sobre as amostras da janela, até HTTP_TIMING_MAX_SAMPLES por rota
+    HTTP_TIMING_ENABLED: bool = config("HTTP_TIMING_ENABLED", cast=bool, default=True)
+    HTTP_TIMING_WINDOW_SECONDS: float = config("HTTP_TIMING_WINDOW_SECONDS", cast=float, default=300.0)
+    HTTP_TIMING_MAX_SAMPLES: int = config("HTTP_TIMING_MAX_SAMPLES", cast=int, default=2048)
+
+class DisponibilidadeSettings:
+    # Agenda de contratos por veículo em memória (desativada, as checagens vão ao banco). Só contratos
+    # que terminam nos últimos AVAILABILITY_HISTORY_DAYS são carregados; AVAILABILITY_RELOAD_SECONDS > 0
+    # recarrega periodicamente para refletir contratos gravados por outras instâncias
+    AVAILABILITY_INDEX_ENABLED: bool = config("AVAILABILITY_INDEX_ENABLED", cast=bool, default=True)
+    AVAILABILITY_HISTORY_DAYS: float = config("AVAILABILITY_HISTORY_DAYS", cast=float, default=90.0)
+    AVAILABILITY_RELOAD_SECONDS: float = config("AVAILABILITY_RELOAD_SECONDS", cast=float, default=0.0)
+
 class EnvironmentOption(Enum):
     DEVELOPMENT = "development"
     TESTING = "testing"
@@ -34,7 +104,8 @@ class EnvironmentSettings:
     ENVIRONMENT: EnvironmentOption = config("ENVIRONMENT", default=EnvironmentOption.DEVELOPMENT)
 
 
-class Settings(AppSettings, MongoSettings, EnvironmentSettings):
+class Settings(AppSettings, MongoSettings, CacheSettings, LoggingSettings, HttpSettings, DisponibilidadeSettings,
+               EnvironmentSettings):
     pass
 
 
@@ -0,0 +1,28 @@
+from typing import List, Tuple
+
+from pymongo.errors import BulkWriteError
+
+
+async def inserir_em_lote(collection, documentos: List[dict]) -> List[Tuple[int, str]]:
+    """Insere os documentos com um insert_many não ordenado.
+
+    Retorna os erros como (posição no lote, mensagem); as demais posições foram inseridas
+    e receberam o _id no próprio dicionário. Sem o write concern atingido, todas as posições
+    voltam como erro.
+    """
+    if not documentos:
+        return []
+    try:
+        await collection.insert_many(documentos, ordered=False)
+        return []
+    except BulkWriteError as e:
+        erros = {erro["index"]: erro.get("errmsg", "Erro de escrita") for erro in e.details.get("writeErrors", [])}
+        # O write concern vale para o lote todo: nenhum documento gravado pode ser dado como confirmado
+        erros_concern = e.details.get("writeConcernErrors")
+        if erros_concern:
+            mensagem = f"Write concern não atingido: {erros_concern[-1].get('errmsg', 'erro de write concern')}"
+            for posicao in range(len(documentos)):
+                erros.setdefault(posicao, mensagem)
+        return sorted(erros.items())
+    except Exception as e:
+        return [(posicao, str(e)) for posicao in range(len(documentos))]
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteConcernError, WriteError
+
+from src.app.core.config import config, settings
+from src.app.core.db.instrumentation import operacao
+
+logger = logging.getLogger('app_logger.coalescencia')
+
+
+@lru_cache(maxsize=None)
+def parametros_coalescencia(collection_name: str) -> Tuple[float, int]:
+    # Janela (ms) e tamanho do lote por coleção, ex.: MONGO_COALESCE_WINDOW_MS_PAGAMENTOS=2 (0 desativa)
+    sufixo = collection_name.upper()
+    return (
+        config(f"MONGO_COALESCE_WINDOW_MS_{sufixo}", cast=float, default=settings.MONGO_COALESCE_WINDOW_MS),
+        config(f"MONGO_COALESCE_BATCH_SIZE_{sufixo}", cast=int, default=settings.MONGO_COALESCE_BATCH_SIZE),
+    )
+
+
+class AgrupadorInsercoes:
+    """Junta os insert_one concorrentes de uma coleção num insert_many.
+
+    O primeiro documento abre uma janela de `janela` segundos; o lote é gravado quando ela fecha ou
+    quando chega a `lote` documentos. Cada chamador recebe o próprio _id ou a própria exceção:
+    DuplicateKeyError/WriteError para o erro do seu documento, WriteConcernError quando o lote foi
+    gravado sem atingir o write concern, ou o erro do lote inteiro.
+    """
+
+    def __init__(self, collection, janela: float, lote: int):
+        self.collection = collection
+        self.janela = janela
+        self.lote = lote
+        self._pendentes: List[Tuple[dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._gravacoes: set = set()
+        self.lotes = 0
+        self.documentos = 0
+
+    async def inserir(self, documento: dict) -> ObjectId:
+        # O _id é gerado aqui, como faria o insert_one, para o chamador não depender da ordem do lote
+        documento.setdefault("_id", ObjectId())
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendentes.append((documento, futuro))
+        if len(self._pendentes) >= self.lote:
+            self._despachar()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.janela, self._despachar)
+        return await futuro
+
+    def _despachar(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pendentes, self._pendentes = self._pendentes, []
+        if pendentes:
+            tarefa = asyncio.ensure_future(self._gravar(pendentes))
+            self._gravacoes.add(tarefa)
+            tarefa.add_done_callback(self._gravacoes.discard)
+
+    async def _gravar(self, pendentes: List[Tuple[dict, asyncio.Future]]):
+        erros: Dict[int, Exception] = {}
+        with operacao(f"coalescencia.{self.collection.name}"):
+            try:
+                await self.collection.insert_many([documento for documento, _ in pendentes], ordered=False)
+            except BulkWriteError as e:
+                for erro in e.details.get("writeErrors", []):
+                    classe = DuplicateKeyError if erro.get("code") == 11000 else WriteError
+                    erros[erro["index"]] = classe(erro.get("errmsg", "Erro de escrita"), erro.get("code"), erro)
+                # O write concern vale para o lote todo: nenhum documento gravado pode ser dado como confirmado
+                erros_concern = e.details.get("writeConcernErrors")
+                if erros_concern:
+                    erro = erros_concern[-1]
+                    falha = WriteConcernError(erro.get("errmsg", "Write concern não atingido"), erro.get("code"), erro)
+                    for posicao in range(len(pendentes)):
+                        erros.setdefault(posicao, falha)
+            except Exception as e:
+                erros = {posicao: e for posicao in range(len(pendentes))}
+        self.lotes += 1
+        self.documentos += len(pendentes)
+
+        for posicao, (documento, futuro) in enumerate(pendentes):
+            # O chamador pode ter sido cancelado (cliente desconectou) enquanto esperava o lote
+            if futuro.done():
+                continue
+            if posicao in erros:
+                futuro.set_exception(erros[posicao])
+            else:
+                futuro.set_result(documento["_id"])
+
+    async def esvaziar(self):
+        self._despachar()
+        if self._gravacoes:
+            await asyncio.gather(*self._gravacoes, return_exceptions=True)
+
+    def snapshot(self) -> dict:
+        return {
+            "janela_ms": self.janela * 1000,
+            "lote": self.lote,
+            "pendentes": len(self._pendentes),
+            "lotes_gravados": self.lotes,
+            "documentos_gravados": self.documentos,
+            "media_por_lote": round(self.documentos / self.lotes, 2) if self.lotes else None,
+        }
+
+
+_agrupadores: Dict[str, AgrupadorInsercoes] = {}
+
+
+async def inserir_um(collection, documento: dict) -> Any:
+    """insert_one, ou inserção agrupada quando a coleção tem janela de coalescência; devolve o _id."""
+    janela_ms, lote = parametros_coalescencia(collection.name)
+    if janela_ms <= 0 or lote <= 1:
+        return (await collection.insert_one(documento)).inserted_id
+
+    agrupador = _agrupadores.get(collection.name)
+    if agrupador is None:
+        agrupador = _agrupadores[collection.name] = AgrupadorInsercoes(collection, janela_ms / 1000, lote)
+    return await agrupador.inserir(documento)
+
+
+async def esvaziar_agrupadores():
+    """Grava o que ainda está na janela; chamado no desligamento, antes de fechar a conexão."""
+    await asyncio.gather(*(agrupador.esvaziar() for agrupador in _agrupadores.values()))
+    _agrupadores.clear()
+
+
+def estatisticas_coalescencia() -> Dict[str, dict]:
+    return {nome: agrupador.snapshot() for nome, agrupador in _agrupadores.items()}
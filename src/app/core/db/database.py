@@ -1,8 +1,13 @@
 import logging
+from functools import lru_cache
+from typing import Optional
 
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import WriteConcern
 
-from src.app.core.config import settings
+from src.app.core.config import config, settings
+from src.app.core.db.instrumentation import command_metrics
+from src.app.core.db.pool_monitor import pool_metrics
 
 logger = logging.getLogger('app_logger.startup')
 
@@ -13,11 +18,28 @@ class Database:
     @classmethod
     async def connect(cls):
         try:
-            cls.client = AsyncIOMotorClient(settings.MONGO_URI)
+            cls.client = AsyncIOMotorClient(settings.MONGO_URI, **cls.client_options())
             cls.db = cls.client[settings.MONGO_DB]
             logger.info("Connected to the database")
         except Exception as e:
-            logger.error(f"Error connecting to the database: {e}")
+            logger.error("Error connecting to the database: %s", e)
+
+    @classmethod
+    def client_options(cls) -> dict:
+        options = {
+            "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+            "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+            "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+            "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            "event_listeners": [pool_metrics, command_metrics],
+        }
+        if settings.MONGO_WAIT_QUEUE_TIMEOUT_MS is not None:
+            options["waitQueueTimeoutMS"] = settings.MONGO_WAIT_QUEUE_TIMEOUT_MS
+        if settings.MONGO_MAX_IDLE_TIME_MS is not None:
+            options["maxIdleTimeMS"] = settings.MONGO_MAX_IDLE_TIME_MS
+        if settings.MONGO_COMPRESSORS:
+            options["compressors"] = settings.MONGO_COMPRESSORS
+        return options
 
     @classmethod
     async def disconnect(cls):
@@ -25,7 +47,35 @@ class Database:
             cls.client.close()
 
     @classmethod
-    def get_collection(cls, collection_name: str):
-        return cls.db[collection_name]
+    def get_collection(cls, collection_name: str, write_concern: Optional[WriteConcern] = None):
+        collection = cls.db[collection_name]
+        write_concern = write_concern_override(collection_name) or write_concern
+        if write_concern is not None:
+            collection = collection.with_options(write_concern=write_concern)
+        return collection
+
+
+def parse_write_concern(value: str) -> WriteConcern:
+    """Converte "w=1,j=false,wtimeout=5000" em um WriteConcern."""
+    options = {}
+    for part in value.split(","):
+        key, _, raw = part.strip().partition("=")
+        key, raw = key.strip(), raw.strip()
+        if key == "w":
+            options["w"] = int(raw) if raw.isdigit() else raw
+        elif key in ("j", "fsync"):
+            options[key] = raw.lower() in ("1", "true", "yes")
+        elif key == "wtimeout":
+            options["wtimeout"] = int(raw)
+        else:
+            raise ValueError(f"Opção de write concern desconhecida: {key}")
+    return WriteConcern(**options)
+
+
+@lru_cache(maxsize=None)
+def write_concern_override(collection_name: str) -> Optional[WriteConcern]:
+    # Permite trocar o write concern de uma coleção pelo ambiente, ex.: MONGO_WRITE_CONCERN_PAGAMENTOS=w=1,j=false
+    value = config(f"MONGO_WRITE_CONCERN_{collection_name.upper()}", default=None)
+    return parse_write_concern(value) if value else None
 
-database = Database()
\ No newline at end of file
+database = Database()
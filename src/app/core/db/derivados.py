@@ -0,0 +1,408 @@
+import logging
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
+from pymongo.errors import OperationFailure
+
+from src.app.core.cache import invalidar_analises
+from src.app.core.db.database import database
+from src.app.core.db.indexes import sincronizar_indices
+from src.app.core.db.instrumentation import operacao
+from src.app.core.db.normalizacao import preencher_campo
+from src.app.core.locks import LocksPorChave
+from src.app.core.texto import literal, normalizar
+
+logger = logging.getLogger('app_logger.derivados')
+
+# Coleções derivadas: custos de manutenção agregados por veículo e por marca
+CUSTOS_VEICULO = "custos_manutencao_veiculo"
+CUSTOS_MARCA = "custos_manutencao_marca"
+# Saldo pendente (pagamentos não pagos dos contratos) por usuário
+SALDOS_PENDENTES = "saldos_pendentes_usuario"
+# Catálogo de tipos de manutenção: _id é a chave normalizada gravada em manutencoes.tipo_manutencao_chave
+TIPOS_MANUTENCAO = "tipos_manutencao"
+
+INDICES = {
+    CUSTOS_VEICULO: [
+        IndexModel([("custo_total", DESCENDING)], name="custo_total"),
+        IndexModel([("custo_maximo", DESCENDING)], name="custo_maximo"),
+        IndexModel([("custo_medio", DESCENDING)], name="custo_medio"),
+        IndexModel([("marca", ASCENDING)], name="marca"),
+    ],
+    CUSTOS_MARCA: [
+        IndexModel([("custo_total", DESCENDING)], name="custo_total"),
+    ],
+    SALDOS_PENDENTES: [
+        IndexModel([("total_pendente", DESCENDING)], name="total_pendente"),
+    ],
+    TIPOS_MANUTENCAO: [
+        IndexModel([("quantidade", DESCENDING)], name="quantidade"),
+    ],
+}
+
+
+# Atualizações concorrentes do mesmo veículo (ou marca) apagariam o resultado uma da outra;
+# as de veículos e marcas diferentes seguem em paralelo
+_locks_veiculos = LocksPorChave()
+_locks_marcas = LocksPorChave()
+_locks_usuarios = LocksPorChave()
+
+
+def _pipeline_custos_veiculo(veiculo_ids: Optional[List[ObjectId]], rodada: ObjectId) -> List[dict]:
+    pipeline = []
+    if veiculo_ids is not None:
+        pipeline.append({"$match": {"veiculo_id": {"$in": veiculo_ids}}})
+    pipeline += [
+        {"$lookup": {"from": "manutencoes", "localField": "manutencao_id", "foreignField": "_id", "as": "manutencao"}},
+        {"$unwind": "$manutencao"},
+        {"$sort": {"manutencao.custo": -1}},
+        {"$group": {
+            "_id": "$veiculo_id",
+            "custo_total": {"$sum": "$manutencao.custo"},
+            "quantidade": {"$sum": 1},
+            "custo_maximo": {"$max": "$manutencao.custo"},
+            "manutencao_mais_cara": {"$first": {
+                "manutencao_id": "$manutencao._id",
+                "tipo_manutencao": "$manutencao.tipo_manutencao",
+                "custo": "$manutencao.custo",
+                "observacao": "$manutencao.observacao",
+            }},
+        }},
+        # Um $lookup por veículo, depois do agrupamento, e não um por vínculo
+        {"$lookup": {"from": "veiculos", "localField": "_id", "foreignField": "_id", "as": "veiculo"}},
+        {"$unwind": "$veiculo"},
+        {"$project": {
+            "modelo": "$veiculo.modelo",
+            "marca": "$veiculo.marca",
+            "custo_total": 1,
+            "quantidade": 1,
+            "custo_medio": {"$divide": ["$custo_total", "$quantidade"]},
+            "custo_maximo": 1,
+            "manutencao_mais_cara": 1,
+            "rodada": {"$literal": rodada},
+            "atualizado_em": "$$NOW",
+        }},
+        {"$merge": {"into": CUSTOS_VEICULO, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+    return pipeline
+
+
+def _pipeline_custos_marca(marcas: Optional[List[str]], rodada: ObjectId) -> List[dict]:
+    pipeline = []
+    if marcas is not None:
+        pipeline.append({"$match": {"marca": {"$in": marcas}}})
+    pipeline += [
+        {"$sort": {"custo_maximo": -1}},
+        {"$group": {
+            "_id": "$marca",
+            "custo_total": {"$sum": "$custo_total"},
+            "quantidade": {"$sum": "$quantidade"},
+            "custo_maximo": {"$max": "$custo_maximo"},
+            "manutencao_mais_cara": {"$first": {
+                "manutencao_id": "$manutencao_mais_cara.manutencao_id",
+                "tipo_manutencao": "$manutencao_mais_cara.tipo_manutencao",
+                "custo": "$manutencao_mais_cara.custo",
+                "observacao": "$manutencao_mais_cara.observacao",
+                "veiculo_id": "$_id",
+                "modelo": "$modelo",
+            }},
+        }},
+        {"$project": {
+            "custo_total": 1,
+            "quantidade": 1,
+            "custo_medio": {"$divide": ["$custo_total", "$quantidade"]},
+            "custo_maximo": 1,
+            "manutencao_mais_cara": 1,
+            "rodada": {"$literal": rodada},
+            "atualizado_em": "$$NOW",
+        }},
+        {"$merge": {"into": CUSTOS_MARCA, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+    return pipeline
+
+
+def _pipeline_saldos_pendentes(usuario_ids: Optional[List[ObjectId]]) -> List[dict]:
+    pipeline = []
+    if usuario_ids is not None:
+        pipeline.append({"$match": {"usuario_id": {"$in": usuario_ids}}})
+    pipeline += [
+        {"$match": {"pagamento_id": {"$ne": None}}},
+        {"$lookup": {"from": "pagamentos", "localField": "pagamento_id", "foreignField": "_id", "as": "pagamento"}},
+        {"$unwind": "$pagamento"},
+        {"$match": {"pagamento.pago": False}},
+        {"$group": {
+            "_id": "$usuario_id",
+            "total_pendente": {"$sum": "$pagamento.valor"},
+            "quantidade": {"$sum": 1},
+        }},
+        # Um $lookup por usuário, depois do agrupamento
+        {"$lookup": {"from": "usuarios", "localField": "_id", "foreignField": "_id", "as": "usuario"}},
+        {"$unwind": "$usuario"},
+        {"$project": {
+            "nome": "$usuario.nome",
+            "email": "$usuario.email",
+            "total_pendente": 1,
+            "quantidade": 1,
+        }},
+    ]
+    return pipeline
+
+
+def _merge_saldos(pipeline: List[dict], rodada: ObjectId) -> List[dict]:
+    return pipeline + [
+        {"$addFields": {"rodada": {"$literal": rodada}, "atualizado_em": "$$NOW"}},
+        {"$merge": {"into": SALDOS_PENDENTES, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+
+async def _executar(collection, pipeline: List[dict]):
+    # O $merge não devolve documentos, mas o cursor precisa ser consumido para o comando rodar
+    await collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+
+
+async def _atualizar_marcas(marcas: Optional[List[str]]):
+    rodada = ObjectId()
+    await _executar(database.get_collection(CUSTOS_VEICULO), _pipeline_custos_marca(marcas, rodada))
+    # Marcas que deixaram de ter manutenções não são reescritas pela rodada atual
+    filtro = {"rodada": {"$ne": rodada}}
+    if marcas is not None:
+        filtro["_id"] = {"$in": marcas}
+    await database.get_collection(CUSTOS_MARCA).delete_many(filtro)
+
+
+async def atualizar_custos_veiculos(veiculo_ids: Iterable):
+    """Recalcula os custos dos veículos informados e das marcas afetadas por eles."""
+    ids = list({ObjectId(veiculo_id) for veiculo_id in veiculo_ids if veiculo_id})
+    if not ids:
+        return
+    try:
+        with operacao("derivados.atualizar_custos_veiculos"):
+            async with _locks_veiculos.travar(ids):
+                custos_veiculo = database.get_collection(CUSTOS_VEICULO)
+                # A marca pode ter mudado: as antigas e as novas precisam ser recalculadas
+                marcas = set(await custos_veiculo.distinct("marca", {"_id": {"$in": ids}}))
+
+                rodada = ObjectId()
+                await _executar(database.get_collection("veiculo_manutencoes"), _pipeline_custos_veiculo(ids, rodada))
+                await custos_veiculo.delete_many({"_id": {"$in": ids}, "rodada": {"$ne": rodada}})
+
+                marcas |= set(await custos_veiculo.distinct("marca", {"_id": {"$in": ids}}))
+            if marcas:
+                # Sempre veículos antes de marcas: a ordem fixa evita deadlock entre as duas famílias
+                async with _locks_marcas.travar(marcas):
+                    await _atualizar_marcas(sorted(marcas))
+        invalidar_analises(CUSTOS_VEICULO, CUSTOS_MARCA)
+    except Exception as e:
+        logger.error("Erro ao atualizar custos de manutenção dos veículos %s: %s", ids, e)
+
+
+async def atualizar_custos_manutencao(manutencao_id):
+    """Recalcula os custos dos veículos vinculados a uma manutenção."""
+    try:
+        veiculo_ids = await database.get_collection("veiculo_manutencoes").distinct(
+            "veiculo_id", {"manutencao_id": ObjectId(manutencao_id)}
+        )
+    except Exception as e:
+        logger.error("Erro ao buscar veículos da manutenção %s: %s", manutencao_id, e)
+        return
+    await atualizar_custos_veiculos(veiculo_ids)
+
+
+async def reconstruir_custos_manutencao():
+    """Recalcula as coleções de custos do zero a partir de veiculo_manutencoes.
+
+    Sem lock: roda pelo script ou na inicialização, antes de a API aceitar escritas.
+    """
+    with operacao("derivados.reconstruir_custos_manutencao"):
+        rodada = ObjectId()
+        await _executar(database.get_collection("veiculo_manutencoes"), _pipeline_custos_veiculo(None, rodada))
+        await database.get_collection(CUSTOS_VEICULO).delete_many({"rodada": {"$ne": rodada}})
+        await _atualizar_marcas(None)
+    invalidar_analises(CUSTOS_VEICULO, CUSTOS_MARCA)
+    logger.info("Custos de manutenção reconstruídos")
+
+
+async def atualizar_saldos_usuarios(usuario_ids: Iterable):
+    """Recalcula o saldo pendente dos usuários informados."""
+    ids = list({ObjectId(usuario_id) for usuario_id in usuario_ids if usuario_id})
+    if not ids:
+        return
+    try:
+        with operacao("derivados.atualizar_saldos_usuarios"):
+            async with _locks_usuarios.travar(ids):
+                rodada = ObjectId()
+                await _executar(database.get_collection("contratos"), _merge_saldos(_pipeline_saldos_pendentes(ids), rodada))
+                # Usuários sem pagamentos pendentes saem do saldo
+                await database.get_collection(SALDOS_PENDENTES).delete_many({"_id": {"$in": ids}, "rodada": {"$ne": rodada}})
+        invalidar_analises(SALDOS_PENDENTES)
+    except Exception as e:
+        logger.error("Erro ao atualizar saldos pendentes dos usuários %s: %s", ids, e)
+
+
+async def atualizar_saldos_pagamento(pagamento_id):
+    """Recalcula o saldo dos usuários cujos contratos apontam para o pagamento."""
+    try:
+        usuario_ids = await database.get_collection("contratos").distinct(
+            "usuario_id", {"pagamento_id": ObjectId(pagamento_id)}
+        )
+    except Exception as e:
+        logger.error("Erro ao buscar usuários do pagamento %s: %s", pagamento_id, e)
+        return
+    await atualizar_saldos_usuarios(usuario_ids)
+
+
+async def reconstruir_saldos_pendentes():
+    """Recalcula a coleção de saldos pendentes do zero a partir de contratos e pagamentos.
+
+    Sem lock, como reconstruir_custos_manutencao.
+    """
+    with operacao("derivados.reconstruir_saldos_pendentes"):
+        rodada = ObjectId()
+        await _executar(database.get_collection("contratos"), _merge_saldos(_pipeline_saldos_pendentes(None), rodada))
+        await database.get_collection(SALDOS_PENDENTES).delete_many({"rodada": {"$ne": rodada}})
+    invalidar_analises(SALDOS_PENDENTES)
+    logger.info("Saldos pendentes reconstruídos")
+
+
+async def reconciliar_saldos_pendentes(tolerancia: float = 0.005) -> dict:
+    """Compara os saldos guardados com um recálculo completo, sem alterar nada."""
+    with operacao("derivados.reconciliar_saldos_pendentes"):
+        esperados = {
+            documento["_id"]: documento
+            async for documento in database.get_collection("contratos").aggregate(
+                _pipeline_saldos_pendentes(None), allowDiskUse=True
+            )
+        }
+        guardados = {
+            documento["_id"]: documento
+            async for documento in database.get_collection(SALDOS_PENDENTES).find(
+                {}, {"nome": 1, "email": 1, "total_pendente": 1, "quantidade": 1}
+            )
+        }
+
+    divergentes = []
+    for usuario_id in esperados.keys() | guardados.keys():
+        esperado, guardado = esperados.get(usuario_id), guardados.get(usuario_id)
+        if (
+            esperado is None or guardado is None
+            or abs(esperado["total_pendente"] - guardado["total_pendente"]) > tolerancia
+            or esperado["quantidade"] != guardado.get("quantidade")
+            or (esperado.get("nome"), esperado.get("email")) != (guardado.get("nome"), guardado.get("email"))
+        ):
+            divergentes.append({
+                "usuario_id": str(usuario_id),
+                "esperado": esperado and esperado["total_pendente"],
+                "guardado": guardado and guardado["total_pendente"],
+            })
+
+    if divergentes:
+        logger.warning("Saldos pendentes divergentes: %s", divergentes)
+    return {"verificados": len(esperados.keys() | guardados.keys()), "divergentes": divergentes}
+
+
+def chave_tipo_manutencao(documento: dict) -> str:
+    # Documentos gravados antes do catálogo ainda não têm a chave
+    return documento.get("tipo_manutencao_chave") or normalizar(documento.get("tipo_manutencao"))
+
+
+async def atualizar_tipos_manutencao(removidas: Iterable[dict] = (), adicionadas: Iterable[dict] = ()):
+    """Ajusta os contadores do catálogo pelas manutenções removidas e adicionadas.
+
+    O nome exibido é o da primeira manutenção com a chave; tipos que chegam a zero saem do catálogo.
+    """
+    variacoes: Dict[str, int] = Counter()
+    nomes: Dict[str, str] = {}
+    for documento in removidas:
+        variacoes[chave_tipo_manutencao(documento)] -= 1
+    for documento in adicionadas:
+        chave = chave_tipo_manutencao(documento)
+        variacoes[chave] += 1
+        nomes.setdefault(chave, documento["tipo_manutencao"].strip())
+
+    chaves = [chave for chave, variacao in variacoes.items() if variacao]
+    if not chaves:
+        return
+    operacoes = [
+        UpdateOne(
+            {"_id": chave},
+            {"$inc": {"quantidade": variacoes[chave]}, **({"$setOnInsert": {"nome": nomes[chave]}} if chave in nomes else {})},
+            upsert=True,
+        )
+        for chave in chaves
+    ]
+    try:
+        with operacao("derivados.atualizar_tipos_manutencao"):
+            catalogo = database.get_collection(TIPOS_MANUTENCAO)
+            await catalogo.bulk_write(operacoes, ordered=False)
+            await catalogo.delete_many({"_id": {"$in": chaves}, "quantidade": {"$lte": 0}})
+        invalidar_analises(TIPOS_MANUTENCAO)
+    except Exception as e:
+        logger.error("Erro ao atualizar o catálogo de tipos de manutenção %s: %s", dict(variacoes), e)
+
+
+async def reconstruir_tipos_manutencao():
+    """Recalcula o catálogo do zero, preenchendo antes a chave das manutenções que não a têm."""
+    with operacao("derivados.reconstruir_tipos_manutencao"):
+        manutencoes = database.get_collection("manutencoes")
+        await preencher_campo(manutencoes, "tipo_manutencao", "tipo_manutencao_chave", normalizar)
+        rodada = ObjectId()
+        await _executar(manutencoes, [
+            {"$sort": {"_id": 1}},
+            {"$group": {"_id": "$tipo_manutencao_chave", "nome": {"$first": {"$trim": {"input": "$tipo_manutencao"}}}, "quantidade": {"$sum": 1}}},
+            {"$addFields": {"rodada": {"$literal": rodada}}},
+            {"$merge": {"into": TIPOS_MANUTENCAO, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+        ])
+        await database.get_collection(TIPOS_MANUTENCAO).delete_many({"rodada": {"$ne": rodada}})
+    invalidar_analises(TIPOS_MANUTENCAO)
+    logger.info("Catálogo de tipos de manutenção reconstruído")
+
+
+async def chaves_tipos_manutencao(padrao: str) -> List[str]:
+    """Chaves do catálogo que casam com o padrão (trecho do nome, sem acento nem maiúsculas).
+
+    O catálogo tem poucos documentos: a busca por trecho nele substitui o $regex sobre cada manutenção.
+    Uma expressão regular é testada contra a chave normalizada e contra o nome guardado no catálogo
+    (a primeira grafia vista da chave), então casa com qualquer uma das duas formas. Levanta
+    ValueError se o MongoDB recusar a expressão.
+    """
+    if literal(padrao):
+        filtro = {"_id": {"$regex": re.escape(normalizar(padrao))}}
+    else:
+        expressao = {"$regex": padrao, "$options": "i"}
+        filtro = {"$or": [{"_id": expressao}, {"nome": expressao}]}
+    try:
+        return [documento["_id"] async for documento in database.get_collection(TIPOS_MANUTENCAO).find(filtro, {"_id": 1})]
+    except OperationFailure as e:
+        raise ValueError(f"Expressão regular inválida: {padrao}") from e
+
+
+# Coleção derivada e a coleção de origem cujo conteúdo ela resume, com a reconstrução completa
+RECONSTRUCOES = {
+    CUSTOS_VEICULO: ("veiculo_manutencoes", reconstruir_custos_manutencao),
+    SALDOS_PENDENTES: ("contratos", reconstruir_saldos_pendentes),
+    TIPOS_MANUTENCAO: ("manutencoes", reconstruir_tipos_manutencao),
+}
+
+
+async def reconstruir_derivados_vazios():
+    """Na inicialização, reconstrói as coleções derivadas vazias cuja origem já tem documentos.
+
+    Cobre as instalações com dados anteriores a cada coleção derivada, que de outro modo ficariam
+    respondendo listas vazias até alguém rodar o derivados_script.
+    """
+    for derivada, (origem, reconstruir) in RECONSTRUCOES.items():
+        if await database.get_collection(derivada).find_one({}, {"_id": 1}) is not None:
+            continue
+        if await database.get_collection(origem).find_one({}, {"_id": 1}) is None:
+            continue
+        logger.info("%s vazia com %s preenchida: reconstruindo", derivada, origem)
+        await reconstruir()
+
+
+async def sincronizar_indices_derivados():
+    for nome, indexes in INDICES.items():
+        relatorio = await sincronizar_indices(database.get_collection(nome), indexes)
+        logger.info("Índices de %s: criados=%s recriados=%s falhas=%s", nome, relatorio["criados"], relatorio["recriados"], relatorio["falhas"])
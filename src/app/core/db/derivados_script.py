@@ -0,0 +1,60 @@
+import argparse
+import asyncio
+import sys
+import time
+
+from src.app.core.db.database import database
+from src.app.core.db.derivados import (
+    reconciliar_saldos_pendentes,
+    reconstruir_custos_manutencao,
+    reconstruir_saldos_pendentes,
+    reconstruir_tipos_manutencao,
+    sincronizar_indices_derivados,
+)
+from src.app.core.logger import setup_logging
+
+RECONSTRUCOES = {
+    "custos": reconstruir_custos_manutencao,
+    "saldos": reconstruir_saldos_pendentes,
+    "tipos": reconstruir_tipos_manutencao,
+}
+
+# Alvos que podem ser conferidos contra um recálculo completo sem reescrever a coleção
+VERIFICACOES = {
+    "saldos": reconciliar_saldos_pendentes,
+}
+
+
+async def main(alvos, verificar: bool) -> int:
+    await database.connect()
+    await sincronizar_indices_derivados()
+
+    divergencias = 0
+    for alvo in alvos:
+        inicio = time.perf_counter()
+        if verificar:
+            if alvo not in VERIFICACOES:
+                print(f"{alvo}: sem verificação disponível")
+                continue
+            relatorio = await VERIFICACOES[alvo]()
+            divergencias += len(relatorio["divergentes"])
+            print(f"{alvo}: {relatorio['verificados']} verificados, {len(relatorio['divergentes'])} divergentes "
+                  f"em {time.perf_counter() - inicio:.2f}s")
+            for divergente in relatorio["divergentes"]:
+                print(f"  {divergente}")
+        else:
+            await RECONSTRUCOES[alvo]()
+            print(f"{alvo}: reconstruído em {time.perf_counter() - inicio:.2f}s")
+
+    await database.disconnect()
+    return 1 if divergencias else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstrói as coleções derivadas a partir das coleções de origem.")
+    parser.add_argument("alvos", nargs="*", choices=sorted(RECONSTRUCOES), help="Coleções derivadas a reconstruir (padrão: todas)")
+    parser.add_argument("--verificar", action="store_true", help="Apenas compara com um recálculo completo; sai com 1 se houver divergências")
+    args = parser.parse_args()
+
+    setup_logging()
+    sys.exit(asyncio.run(main(args.alvos or sorted(RECONSTRUCOES), args.verificar)))
@@ -0,0 +1,17 @@
+from typing import Any, Dict, Iterable
+
+from bson import ObjectId
+
+from src.app.core.db.database import database
+
+
+async def carregar_por_ids(collection_name: str, ids: Iterable[Any]) -> Dict[ObjectId, dict]:
+    """Busca os documentos de vários _id numa única consulta $in, sem repetir _id.
+
+    Referências vazias ou inválidas são ignoradas; _id inexistentes ficam fora do resultado.
+    """
+    unicos = list({ObjectId(_id) for _id in ids if _id and ObjectId.is_valid(_id)})
+    if not unicos:
+        return {}
+    documentos = database.get_collection(collection_name).find({"_id": {"$in": unicos}})
+    return {documento["_id"]: documento async for documento in documentos}
@@ -0,0 +1,183 @@
+import logging
+from typing import Any, Dict, Iterable, List
+
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+from src.app.core.db.database import database
+
+logger = logging.getLogger('app_logger.startup')
+
+# Opções de índice que, se divergirem, exigem recriar o índice
+_OPCOES_COMPARADAS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def _normalizar_chave(chave) -> List[tuple]:
+    return [(campo, direcao) for campo, direcao in (chave.items() if hasattr(chave, "items") else chave)]
+
+
+def _mesma_definicao(existente: Dict[str, Any], desejado: Dict[str, Any]) -> bool:
+    if _normalizar_chave(existente["key"]) != _normalizar_chave(desejado["key"]):
+        return False
+    return all(existente.get(opcao) == desejado.get(opcao) for opcao in _OPCOES_COMPARADAS)
+
+
+async def sincronizar_indices(collection, indexes: List[IndexModel]) -> Dict[str, List[str]]:
+    """Cria os índices declarados que faltam e recria os que mudaram de definição.
+
+    Índices não declarados são apenas reportados, nunca removidos.
+    """
+    relatorio = {"criados": [], "recriados": [], "inalterados": [], "nao_declarados": [], "falhas": []}
+    existentes = await collection.index_information()
+
+    pendentes = []
+    for index in indexes:
+        desejado = index.document
+        nome = desejado["name"]
+        existente = existentes.get(nome)
+        if existente is None:
+            pendentes.append(index)
+            relatorio["criados"].append(nome)
+        elif _mesma_definicao(existente, desejado):
+            relatorio["inalterados"].append(nome)
+        else:
+            await collection.drop_index(nome)
+            pendentes.append(index)
+            relatorio["recriados"].append(nome)
+
+    declarados = {index.document["name"] for index in indexes}
+    relatorio["nao_declarados"] = [nome for nome in existentes if nome != "_id_" and nome not in declarados]
+
+    for index in pendentes:
+        # Um índice por vez, para que uma falha (ex.: duplicatas em um índice único) não impeça os demais
+        try:
+            await collection.create_indexes([index])
+        except OperationFailure as e:
+            nome = index.document["name"]
+            logger.error("Erro ao criar índice %s.%s: %s", collection.name, nome, e)
+            relatorio["falhas"].append(nome)
+            for lista in ("criados", "recriados"):
+                if nome in relatorio[lista]:
+                    relatorio[lista].remove(nome)
+
+    return relatorio
+
+
+async def sincronizar_repositorios(repositorios: Iterable) -> Dict[str, Dict[str, List[str]]]:
+    relatorios = {}
+    for repositorio in repositorios:
+        collection = repositorio.collection
+        relatorio = await sincronizar_indices(collection, getattr(repositorio, "indexes", []))
+        relatorios[collection.name] = relatorio
+        logger.info(
+            "Índices de %s: criados=%s recriados=%s falhas=%s nao_declarados=%s",
+            collection.name, relatorio["criados"], relatorio["recriados"], relatorio["falhas"], relatorio["nao_declarados"]
+        )
+    return relatorios
+
+
+def _estagios(plano: Any) -> List[str]:
+    """Lista os estágios do plano vencedor, ignorando os planos rejeitados."""
+    estagios = []
+    if isinstance(plano, dict):
+        for chave, valor in plano.items():
+            if chave == "rejectedPlans":
+                continue
+            if chave == "stage" and isinstance(valor, str):
+                estagios.append(valor)
+            else:
+                estagios.extend(_estagios(valor))
+    elif isinstance(plano, list):
+        for item in plano:
+            estagios.extend(_estagios(item))
+    return estagios
+
+
+def _colecao(collection, consulta: Dict[str, Any]):
+    # Consultas sobre outra coleção (ex.: as coleções derivadas lidas pelos repositórios)
+    return database.get_collection(consulta["colecao"]) if consulta.get("colecao") else collection
+
+
+def _comando(collection, consulta: Dict[str, Any]) -> Dict[str, Any]:
+    if "pipeline" in consulta:
+        return {"aggregate": collection.name, "pipeline": consulta["pipeline"], "cursor": {}}
+    comando = {"find": collection.name, "filter": consulta.get("filtro", {})}
+    if consulta.get("projecao"):
+        comando["projection"] = consulta["projecao"]
+    if consulta.get("ordenacao"):
+        comando["sort"] = dict(consulta["ordenacao"])
+    if consulta.get("limite"):
+        comando["limit"] = consulta["limite"]
+    return comando
+
+
+async def explicar_consulta(collection, consulta: Dict[str, Any], verbosidade: str = "queryPlanner") -> Dict[str, Any]:
+    collection = _colecao(collection, consulta)
+    return await database.db.command("explain", _comando(collection, consulta), verbosity=verbosidade)
+
+
+def _coletar(plano: Any, chave: str) -> List[Any]:
+    """Valores de `chave` em qualquer nível do explain, fora dos planos rejeitados."""
+    valores = []
+    if isinstance(plano, dict):
+        for nome, valor in plano.items():
+            if nome in ("rejectedPlans", "allPlansExecution"):
+                continue
+            if nome == chave:
+                valores.append(valor)
+            else:
+                valores.extend(_coletar(valor, chave))
+    elif isinstance(plano, list):
+        for item in plano:
+            valores.extend(_coletar(item, chave))
+    return valores
+
+
+def resumir_plano(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduz um explain("executionStats") ao que importa para comparar planos entre versões.
+
+    Os totais somam a consulta principal e os estágios $lookup, que trazem as próprias estatísticas.
+    """
+    estagios = set(_estagios(explain))
+    indices = {nome for nome in _coletar(explain, "indexName") if isinstance(nome, str)}
+    for usados in _coletar(explain, "indexesUsed"):
+        indices.update(usados)
+
+    etapas = explain.get("stages")
+    if etapas:
+        estagios.update(chave for etapa in etapas for chave in etapa if chave.startswith("$"))
+        retornados = next((etapa["nReturned"] for etapa in reversed(etapas) if "nReturned" in etapa), 0)
+    else:
+        retornados = explain.get("executionStats", {}).get("nReturned", 0)
+
+    return {
+        "estagios": sorted(estagios),
+        "indices": sorted(indices),
+        "docs_examinados": sum(_coletar(explain, "totalDocsExamined")),
+        "chaves_examinadas": sum(_coletar(explain, "totalKeysExamined")),
+        "retornados": retornados,
+        "collscans_lookup": sum(_coletar(explain, "collectionScans")),
+    }
+
+
+async def verificar_planos(repositorios: Iterable) -> List[Dict[str, Any]]:
+    """Executa explain() nas consultas principais de cada repositório e retorna as que fazem COLLSCAN.
+
+    Consultas marcadas com "varredura" percorrem a coleção inteira por natureza e não são reportadas.
+    """
+    resultado = []
+    for repositorio in repositorios:
+        collection = repositorio.collection
+        for consulta in repositorio.consultas_principais():
+            if consulta.get("varredura"):
+                continue
+            try:
+                estagios = _estagios(await explicar_consulta(collection, consulta))
+            except OperationFailure as e:
+                logger.error("Erro ao executar explain de %s: %s", consulta["nome"], e)
+                continue
+            if "COLLSCAN" in estagios:
+                nome_colecao = _colecao(collection, consulta).name
+                logger.warning("Consulta %s em %s ainda faz COLLSCAN: %s", consulta["nome"], nome_colecao, estagios)
+                resultado.append({"consulta": consulta["nome"], "colecao": nome_colecao, "estagios": estagios})
+    return resultado
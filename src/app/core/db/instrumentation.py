@@ -0,0 +1,249 @@
+import functools
+import inspect
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+import bson
+from pymongo import monitoring
+
+from src.app.core.config import settings
+
+logger = logging.getLogger('app_logger.mongo.slow')
+
+# Operação de repositório em execução ("ContratoRepository.search"). O Motor copia o
+# contexto para as threads do executor, então o listener enxerga o valor do chamador.
+operacao_atual: ContextVar[Optional[str]] = ContextVar("operacao_atual", default=None)
+
+# Durações dos comandos da requisição HTTP em andamento, preenchida pelo middleware de latência
+tempos_banco: ContextVar[Optional[List[float]]] = ContextVar("tempos_banco", default=None)
+
+# Comandos de leitura emitidos no contexto, como (operação, comando); benchmarks/planos os reexecuta com explain
+comandos_capturados: ContextVar[Optional[List[Tuple[str, dict]]]] = ContextVar("comandos_capturados", default=None)
+_COMANDOS_LEITURA = {"find", "aggregate", "count", "distinct"}
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Campos de controle do driver que não fazem parte do formato da consulta
+_CAMPOS_IGNORADOS = {"lsid", "$clusterTime", "$db", "txnNumber", "$readPreference", "signature", "apiVersion"}
+
+
+@contextmanager
+def operacao(nome: str):
+    token = operacao_atual.set(nome)
+    try:
+        yield
+    finally:
+        operacao_atual.reset(token)
+
+
+def instrumentar(cls):
+    """Marca os comandos emitidos pelos métodos assíncronos públicos do repositório com "Classe.metodo"."""
+    for nome, metodo in list(vars(cls).items()):
+        if nome.startswith("_") or not inspect.iscoroutinefunction(metodo):
+            continue
+        setattr(cls, nome, _com_operacao(f"{cls.__name__}.{nome}", metodo))
+    return cls
+
+
+def _com_operacao(nome: str, metodo):
+    @functools.wraps(metodo)
+    async def wrapper(*args, **kwargs):
+        with operacao(nome):
+            return await metodo(*args, **kwargs)
+    return wrapper
+
+
+def formato_comando(valor: Any, profundidade: int = 0) -> Any:
+    """Reduz um comando ao seu formato: mantém as chaves e troca os valores pelo tipo."""
+    if profundidade > 12:
+        return "..."
+    if isinstance(valor, dict):
+        return {
+            chave: formato_comando(item, profundidade + 1)
+            for chave, item in valor.items()
+            if chave not in _CAMPOS_IGNORADOS
+        }
+    if isinstance(valor, (list, tuple)):
+        if valor and all(isinstance(item, dict) for item in valor):
+            return [formato_comando(item, profundidade + 1) for item in valor[:20]]
+        return f"[{len(valor)}]"
+    return type(valor).__name__
+
+
+class _Serie:
+    __slots__ = ("buckets", "soma", "quantidade", "documentos", "bytes_enviados", "bytes_recebidos", "falhas")
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.soma = 0.0
+        self.quantidade = 0
+        self.documentos = 0
+        self.bytes_enviados = 0
+        self.bytes_recebidos = 0
+        self.falhas = 0
+
+    def observar(self, duracao: float):
+        self.soma += duracao
+        self.quantidade += 1
+        for i, limite in enumerate(BUCKETS):
+            if duracao <= limite:
+                self.buckets[i] += 1
+                break
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    def __init__(self, slow_threshold_ms: int = 0, contar_bytes: bool = False):
+        self.slow_threshold = slow_threshold_ms / 1000
+        self.contar_bytes = contar_bytes
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], _Serie] = {}
+        self._em_andamento: Dict[Tuple[int, Any], tuple] = {}
+
+    def started(self, event):
+        comando = event.command if self.slow_threshold > 0 else None
+        bytes_enviados = len(bson.encode(event.command)) if self.contar_bytes else 0
+        chave = (event.request_id, event.connection_id)
+        with self._lock:
+            self._em_andamento[chave] = (operacao_atual.get() or "desconhecida", bytes_enviados, comando)
+        capturados = comandos_capturados.get()
+        if capturados is not None and event.command_name in _COMANDOS_LEITURA:
+            capturados.append((
+                operacao_atual.get() or "desconhecida",
+                {campo: valor for campo, valor in event.command.items() if campo not in _CAMPOS_IGNORADOS},
+            ))
+
+    def succeeded(self, event):
+        inicio = self._finalizar(event)
+        if inicio is None:
+            return
+        operacao_nome, bytes_enviados, comando = inicio
+        duracao = event.duration_micros / 1_000_000
+        _somar_requisicao(duracao)
+        reply = event.reply or {}
+        bytes_recebidos = len(bson.encode(reply)) if self.contar_bytes and isinstance(reply, dict) else 0
+
+        with self._lock:
+            serie = self._serie(operacao_nome, event.command_name)
+            serie.observar(duracao)
+            serie.documentos += _documentos_retornados(reply)
+            serie.bytes_enviados += bytes_enviados
+            serie.bytes_recebidos += bytes_recebidos
+
+        self._registrar_lento(operacao_nome, event, duracao, comando)
+
+    def failed(self, event):
+        inicio = self._finalizar(event)
+        if inicio is None:
+            return
+        operacao_nome, bytes_enviados, comando = inicio
+        duracao = event.duration_micros / 1_000_000
+        _somar_requisicao(duracao)
+
+        with self._lock:
+            serie = self._serie(operacao_nome, event.command_name)
+            serie.observar(duracao)
+            serie.bytes_enviados += bytes_enviados
+            serie.falhas += 1
+
+        self._registrar_lento(operacao_nome, event, duracao, comando)
+
+    def _finalizar(self, event):
+        with self._lock:
+            return self._em_andamento.pop((event.request_id, event.connection_id), None)
+
+    def _serie(self, operacao_nome: str, comando: str) -> _Serie:
+        chave = (operacao_nome, comando)
+        serie = self._series.get(chave)
+        if serie is None:
+            serie = self._series[chave] = _Serie()
+        return serie
+
+    def _registrar_lento(self, operacao_nome: str, event, duracao: float, comando):
+        if comando is None or duracao < self.slow_threshold:
+            return
+        formato = formato_comando(comando)
+        # O valor da primeira chave é o nome da coleção, que não é dado do usuário
+        formato[event.command_name] = comando.get(event.command_name)
+        logger.warning(
+            "Comando lento (%.1f ms) em %s: %s %s",
+            duracao * 1000, operacao_nome, event.command_name, formato
+        )
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def prometheus(self) -> str:
+        with self._lock:
+            series = {chave: _copiar(serie) for chave, serie in self._series.items()}
+
+        linhas = [
+            "# HELP mongo_command_duration_seconds Latência dos comandos MongoDB por operação de repositório.",
+            "# TYPE mongo_command_duration_seconds histogram",
+        ]
+        for (operacao_nome, comando), serie in sorted(series.items()):
+            labels = labels_prometheus(operacao=operacao_nome, comando=comando)
+            acumulado = 0
+            for limite, quantidade in zip(BUCKETS, serie.buckets):
+                acumulado += quantidade
+                linhas.append(f'mongo_command_duration_seconds_bucket{{{labels},le="{limite}"}} {acumulado}')
+            linhas.append(f'mongo_command_duration_seconds_bucket{{{labels},le="+Inf"}} {serie.quantidade}')
+            linhas.append(f"mongo_command_duration_seconds_sum{{{labels}}} {serie.soma}")
+            linhas.append(f"mongo_command_duration_seconds_count{{{labels}}} {serie.quantidade}")
+
+        contadores = [
+            ("mongo_command_documents_returned_total", "Documentos retornados ou afetados.", "documentos"),
+            ("mongo_command_failures_total", "Comandos que falharam.", "falhas"),
+        ]
+        if self.contar_bytes:
+            contadores += [
+                ("mongo_command_bytes_sent_total", "Bytes BSON enviados ao servidor.", "bytes_enviados"),
+                ("mongo_command_bytes_received_total", "Bytes BSON recebidos do servidor.", "bytes_recebidos"),
+            ]
+        for nome, descricao, atributo in contadores:
+            linhas.append(f"# HELP {nome} {descricao}")
+            linhas.append(f"# TYPE {nome} counter")
+            for (operacao_nome, comando), serie in sorted(series.items()):
+                linhas.append(f"{nome}{{{labels_prometheus(operacao=operacao_nome, comando=comando)}}} {getattr(serie, atributo)}")
+
+        return "\n".join(linhas) + "\n"
+
+
+def _somar_requisicao(duracao: float):
+    acumulado = tempos_banco.get()
+    if acumulado is not None:
+        # list.append é atômico: comandos de um gather terminam em threads diferentes do executor
+        acumulado.append(duracao)
+
+
+def _copiar(serie: _Serie) -> _Serie:
+    copia = _Serie()
+    copia.buckets = list(serie.buckets)
+    for atributo in ("soma", "quantidade", "documentos", "bytes_enviados", "bytes_recebidos", "falhas"):
+        setattr(copia, atributo, getattr(serie, atributo))
+    return copia
+
+
+def _documentos_retornados(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        lote = cursor.get("firstBatch", cursor.get("nextBatch"))
+        return len(lote) if lote is not None else 0
+    n = reply.get("n")
+    return n if isinstance(n, int) else 0
+
+
+def labels_prometheus(**valores: str) -> str:
+    return ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in valores.items())
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+command_metrics = CommandMetricsListener(
+    slow_threshold_ms=settings.MONGO_SLOW_COMMAND_MS, contar_bytes=settings.MONGO_COMMAND_BYTES_ENABLED
+)
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from typing import Callable, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+
+from src.app.core.db.database import database
+from src.app.core.texto import normalizar
+
+logger = logging.getLogger('app_logger.normalizacao')
+
+# Campos normalizados mantidos nas escritas: coleção -> (campo de origem, campo derivado, conversão)
+CAMPOS = {
+    "usuarios": ("nome", "nome_normalizado", normalizar),
+    "manutencoes": ("tipo_manutencao", "tipo_manutencao_chave", normalizar),
+}
+
+# (coleção, campo derivado) que esta execução já confirmou presentes em todos os documentos
+_preenchidos: Set[Tuple[str, str]] = set()
+
+
+async def preencher_campo(collection, origem: str, destino: str, converter: Callable, lote: int = 1000) -> int:
+    """Grava `destino` = converter(`origem`) nos documentos que ainda não têm o campo derivado.
+
+    Serve para os documentos gravados antes do campo existir; as escritas novas já o preenchem.
+    Retorna a quantidade de documentos atualizados.
+    """
+    atualizados = 0
+    operacoes = []
+    async for documento in collection.find({destino: {"$exists": False}}, {origem: 1}):
+        operacoes.append(UpdateOne({"_id": documento["_id"]}, {"$set": {destino: converter(documento.get(origem))}}))
+        if len(operacoes) >= lote:
+            atualizados += (await collection.bulk_write(operacoes, ordered=False)).modified_count
+            operacoes = []
+    if operacoes:
+        atualizados += (await collection.bulk_write(operacoes, ordered=False)).modified_count
+
+    logger.info("%s.%s preenchido em %s documento(s)", collection.name, destino, atualizados)
+    return atualizados
+
+
+def campo_preenchido(collection_name: str, destino: str) -> bool:
+    """Se as consultas já podem contar com o campo derivado em todos os documentos."""
+    return (collection_name, destino) in _preenchidos
+
+
+async def preencher_pendentes():
+    """Preenche os campos de CAMPOS que ainda faltam em algum documento (bases anteriores aos campos)."""
+    for nome, (origem, destino, converter) in CAMPOS.items():
+        collection = database.get_collection(nome)
+        try:
+            if await collection.find_one({destino: {"$exists": False}}, {"_id": 1}) is not None:
+                await preencher_campo(collection, origem, destino, converter)
+            _preenchidos.add((nome, destino))
+        except Exception as e:
+            logger.error("Erro ao preencher %s.%s: %s", nome, destino, e)
+
+
+_preenchimento: Optional[asyncio.Task] = None
+
+
+def iniciar_preenchimento():
+    """Roda preencher_pendentes em segundo plano, sem atrasar a inicialização da API."""
+    global _preenchimento
+    _preenchimento = asyncio.ensure_future(preencher_pendentes())
+
+
+async def parar_preenchimento():
+    global _preenchimento
+    if _preenchimento is not None and not _preenchimento.done():
+        _preenchimento.cancel()
+    _preenchimento = None
@@ -0,0 +1,26 @@
+import argparse
+import asyncio
+import time
+
+from src.app.core.db.database import database
+from src.app.core.db.normalizacao import CAMPOS, preencher_campo
+from src.app.core.logger import setup_logging
+
+
+async def main(colecoes):
+    await database.connect()
+    for nome in colecoes:
+        origem, destino, converter = CAMPOS[nome]
+        inicio = time.perf_counter()
+        atualizados = await preencher_campo(database.get_collection(nome), origem, destino, converter)
+        print(f"{nome}.{destino}: {atualizados} documento(s) preenchidos em {time.perf_counter() - inicio:.2f}s")
+    await database.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preenche os campos normalizados nos documentos gravados antes deles existirem.")
+    parser.add_argument("colecoes", nargs="*", choices=sorted(CAMPOS), help="Coleções a preencher (padrão: todas)")
+    args = parser.parse_args()
+
+    setup_logging()
+    asyncio.run(main(args.colecoes or sorted(CAMPOS)))
@@ -0,0 +1,75 @@
+import base64
+import binascii
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+from bson import ObjectId, json_util
+from pymongo import ASCENDING
+
+from src.app.models.pagination_result import TotalMode
+
+
+def encode_cursor(valor: Any, _id: Any) -> str:
+    """Gera um cursor opaco a partir do valor da chave de ordenação e do _id do último item."""
+    if not isinstance(_id, ObjectId):
+        _id = ObjectId(_id)
+    payload = json_util.dumps({"v": valor, "id": _id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, ObjectId]:
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(cursor + padding).decode())
+        return payload["v"], payload["id"]
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        raise ValueError("Cursor de paginação inválido") from e
+
+
+def keyset_sort(campo: str) -> List[Tuple[str, int]]:
+    if campo == "_id":
+        return [("_id", ASCENDING)]
+    return [(campo, ASCENDING), ("_id", ASCENDING)]
+
+
+def keyset_filter(query: dict, campo: str, cursor: Optional[str]) -> dict:
+    """Combina a consulta com a condição "depois do cursor" na ordem (campo, _id)."""
+    if not cursor:
+        return query
+    valor, _id = decode_cursor(cursor)
+    if campo == "_id":
+        condicao = {"_id": {"$gt": _id}}
+    else:
+        condicao = {"$or": [
+            {campo: {"$gt": valor}},
+            {campo: valor, "_id": {"$gt": _id}},
+        ]}
+    return {"$and": [query, condicao]} if query else condicao
+
+
+def next_cursor(itens: Sequence[Any], limit: int, campo: str) -> Optional[str]:
+    """Cursor para a próxima página, ou None quando a página veio incompleta."""
+    if not itens or len(itens) < limit:
+        return None
+    ultimo = itens[-1]
+    if isinstance(ultimo, dict):
+        _id = ultimo.get("_id", ultimo.get("id"))
+        valor = ultimo.get(campo) if campo != "_id" else _id
+    else:
+        _id = ultimo.id
+        valor = getattr(ultimo, campo) if campo != "_id" else _id
+    return encode_cursor(valor, _id)
+
+
+async def contar_total(collection, query: dict, modo: TotalMode, cap: int) -> Tuple[Optional[int], bool]:
+    """Conta os documentos conforme o modo pedido. Retorna (total, se o total foi limitado ao cap)."""
+    if modo == TotalMode.NONE:
+        return None, False
+    if modo == TotalMode.EXACT:
+        return await collection.count_documents(query), False
+    if modo == TotalMode.ESTIMATED and not query:
+        # Vem dos metadados da coleção, sem percorrer documentos
+        return await collection.estimated_document_count(), False
+    # capped, ou estimated com filtro (não há estimativa por metadados para consultas filtradas)
+    total = await collection.count_documents(query, limit=cap + 1)
+    return (cap, True) if total > cap else (total, False)
@@ -0,0 +1,159 @@
+import threading
+import time
+from collections import deque
+
+from pymongo import monitoring
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Acompanha a saturação do pool de conexões do driver.
+
+    Os eventos são disparados nas threads do executor do Motor, por isso todo
+    acesso ao estado é protegido por um lock.
+    """
+
+    def __init__(self, latency_window: int = 1024):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._latencies = deque(maxlen=latency_window)
+        self.pools = 0
+        self.connections_open = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.wait_queue = 0
+        self.max_wait_queue = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_failure_reasons = {}
+        self.checkout_latency_total = 0.0
+
+    # --------------------------- pool ---------------------------
+    def pool_created(self, event):
+        with self._lock:
+            self.pools += 1
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools = max(self.pools - 1, 0)
+
+    # --------------------------- conexões ---------------------------
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_open = max(self.connections_open - 1, 0)
+
+    # --------------------------- checkout ---------------------------
+    def connection_check_out_started(self, event):
+        self._local.started_at = time.perf_counter()
+        with self._lock:
+            self.wait_queue += 1
+            self.max_wait_queue = max(self.max_wait_queue, self.wait_queue)
+
+    def connection_check_out_failed(self, event):
+        self._local.started_at = None
+        with self._lock:
+            self.wait_queue = max(self.wait_queue - 1, 0)
+            self.checkout_failures += 1
+            reason = str(event.reason)
+            self.checkout_failure_reasons[reason] = self.checkout_failure_reasons.get(reason, 0) + 1
+
+    def connection_checked_out(self, event):
+        latency = self._checkout_latency(event)
+        with self._lock:
+            self.wait_queue = max(self.wait_queue - 1, 0)
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.checkouts += 1
+            if latency is not None:
+                self.checkout_latency_total += latency
+                self._latencies.append(latency)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def _checkout_latency(self, event):
+        # Versões recentes do pymongo já informam a duração no próprio evento
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            return duration
+        started_at = getattr(self._local, "started_at", None)
+        self._local.started_at = None
+        if started_at is None:
+            return None
+        return time.perf_counter() - started_at
+
+    # --------------------------- leitura ---------------------------
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            data = {
+                "pools": self.pools,
+                "connections_open": self.connections_open,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "wait_queue": self.wait_queue,
+                "max_wait_queue": self.max_wait_queue,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checkout_failure_reasons": dict(self.checkout_failure_reasons),
+            }
+            checkouts_with_latency = self.checkouts
+            latency_total = self.checkout_latency_total
+
+        data["checkout_latency_ms"] = {
+            "avg": round(latency_total / checkouts_with_latency * 1000, 3) if checkouts_with_latency else None,
+            "p50": _percentile_ms(latencies, 0.50),
+            "p95": _percentile_ms(latencies, 0.95),
+            "p99": _percentile_ms(latencies, 0.99),
+            "max": round(latencies[-1] * 1000, 3) if latencies else None,
+            "samples": len(latencies),
+        }
+        return data
+
+    def prometheus(self) -> str:
+        data = self.snapshot()
+        gauges = (
+            ("mongo_pool_connections_open", "Conexões abertas no pool.", data["connections_open"]),
+            ("mongo_pool_checked_out", "Conexões em uso.", data["checked_out"]),
+            ("mongo_pool_wait_queue", "Operações aguardando uma conexão.", data["wait_queue"]),
+        )
+        linhas = []
+        for nome, descricao, valor in gauges:
+            linhas += [f"# HELP {nome} {descricao}", f"# TYPE {nome} gauge", f"{nome} {valor}"]
+        linhas += [
+            "# HELP mongo_pool_checkouts_total Checkouts de conexão concluídos.",
+            "# TYPE mongo_pool_checkouts_total counter",
+            f"mongo_pool_checkouts_total {data['checkouts']}",
+            "# HELP mongo_pool_checkout_failures_total Checkouts de conexão que falharam.",
+            "# TYPE mongo_pool_checkout_failures_total counter",
+            f"mongo_pool_checkout_failures_total {data['checkout_failures']}",
+        ]
+        return "\n".join(linhas) + "\n"
+
+    def reset_peaks(self):
+        with self._lock:
+            self.max_checked_out = self.checked_out
+            self.max_wait_queue = self.wait_queue
+
+
+def _percentile_ms(sorted_values, fraction: float):
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return round(sorted_values[index] * 1000, 3)
+
+
+pool_metrics = PoolMetricsListener()
@@ -1,187 +1,318 @@
+"""Gera e carrega massas de dados determinísticas para testes de desempenho.
+
+Os documentos são montados e codificados em BSON num pool de processos, em blocos de tamanho
+fixo com gerador próprio: a mesma semente produz sempre os mesmos documentos e _id, qualquer
+que seja o número de processos. A carga usa insert_many não ordenado com vários lotes em
+paralelo; rodar de novo sobre o mesmo banco só conta os _id já existentes como duplicados.
+
+Uso: python -m src.app.core.db.populate_script [--usuarios 1000000] [--veiculos 50000] [--pagamentos 2000000]
+         [--manutencoes 500000] [--veiculo-manutencoes 500000] [--contratos 2000000] [--semente 42]
+         [--zipf 1.1] [--processos N] [--concorrencia 4] [--limpar] [--sem-indices] [--sem-derivados]
+"""
+import argparse
+import asyncio
+import math
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from random import Random
+from typing import List, Tuple
 
+import bson
 from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import BulkWriteError
 
 from src.app.core.db.database import database
-from src.app.models.contrato import Contrato
-from src.app.models.manutencao import Manutencao
-from src.app.models.pagamento import Pagamento
-from src.app.models.usuario import Usuario
-from src.app.models.veiculo import Veiculo
-from src.app.models.veiculo_manutencao import VeiculoManutencao
-import asyncio
-
-def generate_random_data(n=15, random_generator=None):
-    """Gera dados aleatórios para as coleções."""
-
-    if random_generator is None:
-        random_generator = Random()
-
-    usuarios = []
-    for i in range(n):
-        usuarios.append(
-            Usuario(
-                nome=f"Usuario {i}",
-                email=f"usuario{i}@email.com",
-                celular=f"1199999{str(i).zfill(4)}",
-                cpf=f"{str(i).zfill(3)}.{str(i+1).zfill(3)}.{str(i+2).zfill(3)}-{str(i%10).zfill(2)}"
-            ).model_dump(exclude={"id"}, by_alias=True)
-        )
-
-    veiculos = []
-    marcas = ["Fiat", "Volkswagen", "Ford", "Chevrolet", "Hyundai"]
-    modelos = ["Uno", "Gol", "Ka", "Onix", "HB20"]
-    for i in range(n):
-        veiculos.append(
-            Veiculo(
-                modelo=modelos[i % len(modelos)],
-                marca=marcas[i % len(marcas)],
-                placa=f"ABC{str(i).zfill(3)}",
-                ano=2010 + (i % 13)
-            ).model_dump(exclude={"id"}, by_alias=True)
-        )
-
-    pagamentos = []
-    formas_pagamento = ["Crédito", "Débito", "Boleto", "PIX"]
-    for i in range(n):
-        pagamentos.append(
-            Pagamento(
-                valor=random_generator.uniform(50.0, 500.0),
-                forma_pagamento=formas_pagamento[i % len(formas_pagamento)],
-                vencimento=datetime.now() + timedelta(days=random_generator.randint(1, 30)),
-                pago=random_generator.choice([True, False])
-            ).model_dump(exclude={"id"}, by_alias=True)
-        )
-
-    manutencoes = []
-    tipos_manutencao = ["Revisão", "Troca de óleo", "Pneus", "Freios"]
-    for i in range(n):
-        manutencoes.append(
-            Manutencao(
-                data=datetime.now() - timedelta(days=random_generator.randint(0, 365)),
-                tipo_manutencao=tipos_manutencao[i % len(tipos_manutencao)],
-                custo=random_generator.uniform(100.0, 1000.0),
-                observacao=f"Manutenção de rotina {i}"
-            ).model_dump(exclude={"id"}, by_alias=True)
-        )
-
-    return usuarios, veiculos, pagamentos, manutencoes
-
-async def populate_database(COLLECTION_USUARIO, COLLECTION_VEICULO, COLLECTION_PAGAMENTO, COLLECTION_MANUTENCAO, usuarios, veiculos, pagamentos, manutencoes):
-    """Popula o banco de dados MongoDB com os dados gerados."""
-
-    if usuarios:
-        for usuario in usuarios:
-            await COLLECTION_USUARIO.insert_one(usuario)
-        print(f"Inseridos {len(usuarios)} documentos em {COLLECTION_USUARIO.name}")
-
-    if veiculos:
-        for veiculo in veiculos:
-            await COLLECTION_VEICULO.insert_one(veiculo)
-        print(f"Inseridos {len(veiculos)} documentos em {COLLECTION_VEICULO.name}")
-
-    if pagamentos:
-        for pagamento in pagamentos:
-            await COLLECTION_PAGAMENTO.insert_one(pagamento)
-        print(f"Inseridos {len(pagamentos)} documentos em {COLLECTION_PAGAMENTO.name}")
-
-    if manutencoes:
-        for manutencao in manutencoes:
-            await COLLECTION_MANUTENCAO.insert_one(manutencao)
-        print(f"Inseridos {len(manutencoes)} documentos em {COLLECTION_MANUTENCAO.name}")
-
-async def generate_contratos(COLLECTION_USUARIO, COLLECTION_VEICULO, COLLECTION_PAGAMENTO, random_generator, n=15):
-    """Gera dados aleatórios para a coleção contratos, buscando IDs existentes."""
-
-    usuarios = await COLLECTION_USUARIO.find({}, {"_id": 1}).to_list(length=None)
-    veiculos = await COLLECTION_VEICULO.find({}, {"_id": 1}).to_list(length=None)
-    pagamentos = await COLLECTION_PAGAMENTO.find({}, {"_id": 1}).to_list(length=None)
-
-    if not usuarios or not veiculos or not pagamentos:
-        print("Atenção: As coleções usuario, veiculo ou pagamento estão vazias. Não é possível criar contratos.")
-        return []
-
-    contratos = []
-    for i in range(n):
-        data_inicio = datetime.now() - timedelta(days=random_generator.randint(1, 365))
-        data_fim = data_inicio + timedelta(days=random_generator.randint(30, 365))
-
-        usuario_id = ObjectId(random_generator.choice(usuarios)['_id'])
-        veiculo_id = ObjectId(random_generator.choice(veiculos)['_id'])
-        pagamento_id = ObjectId(random_generator.choice(pagamentos)['_id'])
-
-        contratos.append(
-            Contrato(
-                usuario_id=usuario_id,
-                veiculo_id=veiculo_id,
-                pagamento_id=pagamento_id,
-                data_inicio=data_inicio,
-                data_fim=data_fim
-            ).model_dump(exclude={"id"}, by_alias=True)
-        )
-    return contratos
-
-async def generate_veiculo_manutencoes(COLLECTION_VEICULO, COLLECTION_MANUTENCAO, random_generator, n=15):
-    """Gera dados para veiculo_manutencoes, buscando IDs existentes."""
-
-    veiculos = await COLLECTION_VEICULO.find({}, {"_id": 1}).to_list(length=None)
-    manutencoes = await COLLECTION_MANUTENCAO.find({}, {"_id": 1}).to_list(length=None)
-
-    if not veiculos or not manutencoes:
-        print("Atenção: As coleções veiculo ou manutencao estão vazias. Não é possível criar veiculo_manutencoes.")
-        return []
-
-    veiculo_manutencoes = []
-    for i in range(n):
-        veiculo_id = ObjectId(random_generator.choice(veiculos)['_id'])
-        manutencao_id = ObjectId(random_generator.choice(manutencoes)['_id'])
-
-        veiculo_manutencoes.append(
-            VeiculoManutencao(
-                veiculo_id=veiculo_id,
-                manutencao_id=manutencao_id
-            ).model_dump(exclude={"id"}, by_alias=True)
-        )
-    return veiculo_manutencoes
-
-async def populate_collection(collection_name, data):
-    """Popula uma coleção com dados."""
-
-    if data:
-        if collection_name == database.get_collection("contratos"):
-            for item in data:
-                item['data_inicio'] = item['data_inicio']
-                item['data_fim'] = item['data_fim']
-
-        for item in data:
-            await collection_name.insert_one(item)
-        print(f"Inseridos {len(data)} documentos em {collection_name.name}")
+from src.app.core.db.derivados import (
+    reconstruir_custos_manutencao,
+    reconstruir_saldos_pendentes,
+    reconstruir_tipos_manutencao,
+    sincronizar_indices_derivados,
+)
+from src.app.core.db.indexes import sincronizar_repositorios
+from src.app.core.texto import normalizar
+
+# Documentos por bloco: define as fronteiras do gerador, então não pode variar entre execuções
+BLOCO = 5000
+
+# Ordem de carga; o código de cada coleção entra no _id, que é calculado a partir do índice
+COLECOES = ["usuarios", "veiculos", "pagamentos", "manutencoes", "veiculo_manutencoes", "contratos"]
+_CODIGOS = {nome: codigo for codigo, nome in enumerate(COLECOES, start=1)}
+_TIMESTAMP_IDS = int(datetime(2024, 1, 1).timestamp())
+
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabriela", "Heitor", "Isabela", "João",
+         "Karina", "Lucas", "Mariana", "Nicolas", "Olívia", "Paulo", "Renata", "Samuel", "Tatiana", "Vitor"]
+SOBRENOMES = ["Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+              "Costa", "Ribeiro", "Martins", "Carvalho", "Almeida", "Lopes", "Soares", "Fernandes", "Vieira", "Barbosa"]
+MARCAS_MODELOS = {
+    "Fiat": ["Uno", "Argo", "Mobi", "Strada"],
+    "Volkswagen": ["Gol", "Polo", "T-Cross", "Virtus"],
+    "Chevrolet": ["Onix", "Tracker", "Spin", "S10"],
+    "Hyundai": ["HB20", "Creta"],
+    "Toyota": ["Corolla", "Yaris", "Hilux"],
+    "Renault": ["Kwid", "Sandero", "Duster"],
+    "Ford": ["Ka", "Ranger"],
+    "Honda": ["Civic", "City", "HR-V"],
+}
+# Participação aproximada de cada marca na frota
+PESOS_MARCAS = [22, 20, 18, 10, 10, 8, 6, 6]
+FORMAS_PAGAMENTO = ["PIX", "Crédito", "Débito", "Boleto"]
+PESOS_FORMAS = [45, 30, 15, 10]
+# Tipo de manutenção: (peso, custo mediano)
+TIPOS_MANUTENCAO = {
+    "Revisão": (35, 600.0),
+    "Troca de óleo": (30, 250.0),
+    "Pneus": (12, 1400.0),
+    "Freios": (10, 700.0),
+    "Alinhamento": (8, 150.0),
+    "Suspensão": (5, 1800.0),
+}
+# Sazonalidade por mês (janeiro a dezembro): férias e fim de ano concentram locações
+PESOS_MESES = [1.4, 1.1, 0.9, 0.9, 0.9, 1.0, 1.4, 1.1, 0.9, 0.9, 1.0, 1.6]
+
+
+def id_documento(colecao: str, indice: int) -> ObjectId:
+    """_id do documento `indice` da coleção: permite referenciar sem consultar o banco."""
+    return ObjectId(struct.pack(">IB3xI", _TIMESTAMP_IDS, _CODIGOS[colecao], indice))
+
+
+def zipf(rng: Random, n: int, s: float) -> int:
+    """Índice em [0, n) com P(i) ~ 1/(i+1)^s, pela inversa da lei de potência contínua."""
+    u = rng.random()
+    if abs(s - 1.0) < 1e-9:
+        x = (n + 1) ** u
     else:
-        print(f"Nenhum dado para inserir em {collection_name.name}")
+        x = (1 + u * ((n + 1) ** (1 - s) - 1)) ** (1 / (1 - s))
+    return min(int(x), n) - 1
+
+
+def _somar_meses(data: datetime, meses: int) -> datetime:
+    ano, mes = divmod(data.month - 1 + meses, 12)
+    return datetime(data.year + ano, mes + 1, 1)
+
+
+def _data_sazonal(rng: Random, inicio: datetime, meses: int) -> datetime:
+    mes = rng.choices(range(meses), weights=[PESOS_MESES[(inicio.month - 1 + i) % 12] for i in range(meses)])[0]
+    return _somar_meses(inicio, mes) + timedelta(days=rng.randrange(28), minutes=rng.randrange(24 * 60))
+
+
+def _placa(indice: int) -> str:
+    # Padrão Mercosul (LLLNLNN): 456 milhões de placas distintas
+    letras, resto = divmod(indice, 10 * 26 * 100)
+    digito, resto = divmod(resto, 26 * 100)
+    letra, final = divmod(resto, 100)
+    prefixo = ""
+    for _ in range(3):
+        letras, posicao = divmod(letras, 26)
+        prefixo = chr(65 + posicao) + prefixo
+    return f"{prefixo}{digito}{chr(65 + letra)}{final:02d}"
+
+
+def _usuario(rng: Random, i: int, parametros: dict) -> dict:
+    nome = f"{NOMES[rng.randrange(len(NOMES))]} {SOBRENOMES[rng.randrange(len(SOBRENOMES))]}"
+    cpf = f"{i:011d}"
+    return {
+        "_id": id_documento("usuarios", i),
+        "nome": nome,
+        "nome_normalizado": normalizar(nome),
+        "email": f"usuario{i}@email.com",
+        "celular": f"119{i % 10 ** 8:08d}",
+        "cpf": f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}",
+    }
+
+
+def _veiculo(rng: Random, i: int, parametros: dict) -> dict:
+    marca = rng.choices(list(MARCAS_MODELOS), weights=PESOS_MARCAS)[0]
+    return {
+        "_id": id_documento("veiculos", i),
+        "modelo": rng.choice(MARCAS_MODELOS[marca]),
+        "marca": marca,
+        "placa": _placa(i),
+        "ano": 2024 - min(int(rng.expovariate(1 / 4)), 14),
+    }
+
+
+def _pagamento(rng: Random, i: int, parametros: dict) -> dict:
+    vencimento = _data_sazonal(rng, parametros["inicio"], parametros["meses"])
+    # Vencimentos antigos quase sempre pagos; os dos dois últimos meses, em boa parte pendentes
+    recente = vencimento >= parametros["fim"] - timedelta(days=60)
+    return {
+        "_id": id_documento("pagamentos", i),
+        "valor": round(rng.lognormvariate(math.log(350), 0.5), 2),
+        "forma_pagamento": rng.choices(FORMAS_PAGAMENTO, weights=PESOS_FORMAS)[0],
+        "vencimento": vencimento,
+        "pago": rng.random() < (0.35 if recente else 0.93),
+    }
+
+
+def _manutencao(rng: Random, i: int, parametros: dict) -> dict:
+    tipo = rng.choices(list(TIPOS_MANUTENCAO), weights=[peso for peso, _ in TIPOS_MANUTENCAO.values()])[0]
+    return {
+        "_id": id_documento("manutencoes", i),
+        "data": _data_sazonal(rng, parametros["inicio"], parametros["meses"]),
+        "tipo_manutencao": tipo,
+        "tipo_manutencao_chave": normalizar(tipo),
+        "custo": round(rng.lognormvariate(math.log(TIPOS_MANUTENCAO[tipo][1]), 0.35), 2),
+        "observacao": f"{tipo} programada",
+    }
+
+
+def _veiculo_manutencao(rng: Random, i: int, parametros: dict) -> dict:
+    # Os veículos mais alugados também são os que mais passam por manutenção
+    return {
+        "_id": id_documento("veiculo_manutencoes", i),
+        "veiculo_id": id_documento("veiculos", zipf(rng, parametros["veiculos"], parametros["zipf"])),
+        "manutencao_id": id_documento("manutencoes", i % parametros["manutencoes"]),
+    }
+
+
+def _contrato(rng: Random, i: int, parametros: dict) -> dict:
+    # Clientes e veículos em Zipf: os mais populares acumulam contratos que se sobrepõem no tempo
+    data_inicio = _data_sazonal(rng, parametros["inicio"], parametros["meses"])
+    return {
+        "_id": id_documento("contratos", i),
+        "usuario_id": id_documento("usuarios", zipf(rng, parametros["usuarios"], parametros["zipf"])),
+        "veiculo_id": id_documento("veiculos", zipf(rng, parametros["veiculos"], parametros["zipf"])),
+        "pagamento_id": id_documento("pagamentos", i % parametros["pagamentos"]) if parametros["pagamentos"] else None,
+        "data_inicio": data_inicio,
+        "data_fim": data_inicio + timedelta(days=max(1, int(rng.expovariate(1 / 7)))),
+    }
+
+
+GERADORES = {
+    "usuarios": _usuario,
+    "veiculos": _veiculo,
+    "pagamentos": _pagamento,
+    "manutencoes": _manutencao,
+    "veiculo_manutencoes": _veiculo_manutencao,
+    "contratos": _contrato,
+}
+
+# Coleções cujos documentos referenciam outras: sem as referenciadas não há o que gerar
+DEPENDENCIAS = {
+    "veiculo_manutencoes": ("veiculos", "manutencoes"),
+    "contratos": ("usuarios", "veiculos"),
+}
+
+
+def gerar_bloco(colecao: str, inicio: int, quantidade: int, semente: int, parametros: dict) -> List[bytes]:
+    """Roda no pool de processos e devolve os documentos já codificados em BSON."""
+    rng = Random(f"{semente}:{colecao}:{inicio}")
+    gerador = GERADORES[colecao]
+    return [bson.encode(gerador(rng, i, parametros)) for i in range(inicio, inicio + quantidade)]
+
+
+async def _inserir(colecao, documentos: List[bytes]) -> Tuple[int, int]:
+    lote = [RawBSONDocument(documento) for documento in documentos]
+    try:
+        resultado = await colecao.insert_many(lote, ordered=False)
+        return len(resultado.inserted_ids), 0
+    except BulkWriteError as e:
+        duplicados = sum(1 for erro in e.details.get("writeErrors", []) if erro.get("code") == 11000)
+        if duplicados != len(e.details.get("writeErrors", [])):
+            raise
+        return e.details.get("nInserted", 0), duplicados
+
+
+async def carregar_colecao(executor: ProcessPoolExecutor, processos: int, nome: str, quantidade: int, semente: int,
+                           parametros: dict, concorrencia: int) -> dict:
+    loop = asyncio.get_running_loop()
+    colecao = database.get_collection(nome)
+    # Blocos em geração ou inserção ao mesmo tempo: limita a memória e mantém o pool ocupado
+    vagas = asyncio.Semaphore(concorrencia + processos)
+    insercoes = asyncio.Semaphore(concorrencia)
+
+    async def processar(inicio: int) -> Tuple[int, int]:
+        async with vagas:
+            documentos = await loop.run_in_executor(
+                executor, gerar_bloco, nome, inicio, min(BLOCO, quantidade - inicio), semente, parametros
+            )
+            async with insercoes:
+                return await _inserir(colecao, documentos)
+
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(processar(bloco) for bloco in range(0, quantidade, BLOCO)))
+    duracao = time.perf_counter() - inicio
+    return {
+        "colecao": nome,
+        "documentos": quantidade,
+        "inseridos": sum(inseridos for inseridos, _ in resultados),
+        "duplicados": sum(duplicados for _, duplicados in resultados),
+        "segundos": duracao,
+        "docs_por_segundo": quantidade / duracao if duracao else 0.0,
+    }
+
+
+async def main(args) -> List[dict]:
+    quantidades = {nome: getattr(args, nome) for nome in COLECOES}
+    for nome, referenciadas in DEPENDENCIAS.items():
+        if quantidades[nome] and not all(quantidades[referenciada] for referenciada in referenciadas):
+            print(f"{nome}: sem {' e '.join(referenciadas)} não é possível gerar referências; ignorada")
+            quantidades[nome] = 0
+
+    inicio = datetime.strptime(args.inicio, "%Y-%m-%d")
+    parametros = {
+        **quantidades,
+        "zipf": args.zipf,
+        "inicio": inicio,
+        "meses": args.meses,
+        "fim": _somar_meses(inicio, args.meses),
+    }
 
-async def main():
     await database.connect()
-    random_generator = Random()
-
-    COLLECTION_CONTRATO = database.get_collection("contratos")
-    COLLECTION_MANUTENCAO = database.get_collection("manutencoes")
-    COLLECTION_PAGAMENTO = database.get_collection("pagamentos")
-    COLLECTION_USUARIO = database.get_collection("usuarios")
-    COLLECTION_VEICULO = database.get_collection("veiculos")
-    COLLECTION_VEICULO_MANUTENCAO = database.get_collection("veiculo_manutencoes")
+    if args.limpar:
+        for nome in COLECOES:
+            await database.get_collection(nome).delete_many({})
+
+    relatorios = []
+    processos = args.processos or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        for nome in COLECOES:
+            if not quantidades[nome]:
+                continue
+            relatorio = await carregar_colecao(executor, processos, nome, quantidades[nome], args.semente, parametros, args.concorrencia)
+            relatorios.append(relatorio)
+            print(f"{nome:<22} {relatorio['documentos']:>10} docs  {relatorio['inseridos']:>10} inseridos  "
+                  f"{relatorio['duplicados']:>8} duplicados  {relatorio['segundos']:>8.2f}s  {relatorio['docs_por_segundo']:>10.0f} docs/s")
+
+    if not args.sem_indices:
+        # Depois da carga: montar o índice uma vez é mais barato do que mantê-lo a cada lote
+        from src.app.core.startup import REPOSITORIOS
+        inicio_indices = time.perf_counter()
+        await sincronizar_repositorios([repositorio() for repositorio in REPOSITORIOS])
+        await sincronizar_indices_derivados()
+        print(f"índices sincronizados em {time.perf_counter() - inicio_indices:.2f}s")
+
+    if not args.sem_derivados:
+        inicio_derivados = time.perf_counter()
+        await reconstruir_custos_manutencao()
+        await reconstruir_saldos_pendentes()
+        await reconstruir_tipos_manutencao()
+        print(f"coleções derivadas reconstruídas em {time.perf_counter() - inicio_derivados:.2f}s")
 
-    usuarios, veiculos, pagamentos, manutencoes = generate_random_data(15, random_generator)
-    await populate_database(COLLECTION_USUARIO, COLLECTION_VEICULO, COLLECTION_PAGAMENTO, COLLECTION_MANUTENCAO, usuarios, veiculos, pagamentos, manutencoes)
-
-    contratos = await generate_contratos(COLLECTION_USUARIO, COLLECTION_VEICULO, COLLECTION_PAGAMENTO, random_generator, 15)
-    veiculo_manutencoes = await generate_veiculo_manutencoes(COLLECTION_VEICULO, COLLECTION_MANUTENCAO, random_generator, 15)
-
-    await populate_collection(COLLECTION_CONTRATO, contratos)
-    await populate_collection(COLLECTION_VEICULO_MANUTENCAO, veiculo_manutencoes)
-
-    print("Dados inseridos com sucesso!")
     await database.disconnect()
+    return relatorios
+
+
+def _argumentos() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    for nome, padrao in (("usuarios", 15), ("veiculos", 15), ("pagamentos", 15), ("manutencoes", 15),
+                         ("veiculo_manutencoes", 15), ("contratos", 15)):
+        parser.add_argument(f"--{nome.replace('_', '-')}", dest=nome, type=int, default=padrao, help=f"Documentos em {nome}")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Expoente da distribuição de clientes e veículos nos contratos")
+    parser.add_argument("--inicio", default="2024-01-01", help="Primeiro dia das datas geradas (AAAA-MM-DD)")
+    parser.add_argument("--meses", type=int, default=24, help="Meses cobertos pelas datas geradas")
+    parser.add_argument("--processos", type=int, default=os.cpu_count(), help="Processos que geram os documentos")
+    parser.add_argument("--concorrencia", type=int, default=4, help="insert_many simultâneos")
+    parser.add_argument("--limpar", action="store_true", help="Apaga os documentos das coleções antes da carga")
+    parser.add_argument("--sem-indices", action="store_true", help="Não sincroniza os índices ao final")
+    parser.add_argument("--sem-derivados", action="store_true", help="Não reconstrói as coleções derivadas ao final")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(_argumentos()))
@@ -0,0 +1,262 @@
+import asyncio
+import bisect
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+
+from src.app.core.config import settings
+from src.app.core.db.database import database
+from src.app.core.db.instrumentation import operacao
+from src.app.core.locks import LocksPorChave
+
+logger = logging.getLogger('app_logger.disponibilidade')
+
+
+class ConflitoDeReserva(ValueError):
+    """O veículo já tem contrato em parte do período pedido."""
+
+    def __init__(self, veiculo_id, conflitos: List[ObjectId]):
+        self.veiculo_id = veiculo_id
+        self.conflitos = conflitos
+        super().__init__(
+            f"Veículo {veiculo_id} já reservado no período (contratos: {', '.join(str(_id) for _id in conflitos)})"
+        )
+
+
+def para_utc(data: datetime) -> datetime:
+    # O banco guarda datas em UTC sem fuso; datas com fuso vindas da API são convertidas
+    return data.astimezone(timezone.utc).replace(tzinfo=None) if data.tzinfo else data
+
+
+class _Agenda:
+    """Períodos de um veículo, ordenados pelo início.
+
+    `maior_fim[i]` é o maior fim entre os períodos 0..i: a busca de sobreposição anda para trás
+    a partir do último período que começa antes do fim pedido e para assim que nenhum período
+    anterior pode terminar depois do início pedido.
+    """
+    __slots__ = ("inicios", "fins", "contratos", "maior_fim")
+
+    def __init__(self):
+        self.inicios: List[datetime] = []
+        self.fins: List[datetime] = []
+        self.contratos: List[ObjectId] = []
+        self.maior_fim: List[datetime] = []
+
+    def adicionar(self, contrato_id: ObjectId, inicio: datetime, fim: datetime):
+        posicao = bisect.bisect_right(self.inicios, inicio)
+        self.inicios.insert(posicao, inicio)
+        self.fins.insert(posicao, fim)
+        self.contratos.insert(posicao, contrato_id)
+        self.maior_fim.insert(posicao, fim)
+        self._recalcular(posicao)
+
+    def remover(self, contrato_id: ObjectId) -> bool:
+        try:
+            posicao = self.contratos.index(contrato_id)
+        except ValueError:
+            return False
+        for lista in (self.inicios, self.fins, self.contratos, self.maior_fim):
+            del lista[posicao]
+        self._recalcular(posicao)
+        return True
+
+    def conflitos(self, inicio: datetime, fim: datetime, ignorar: Optional[ObjectId] = None) -> List[ObjectId]:
+        # Períodos semiabertos [inicio, fim): um contrato pode começar no instante em que outro termina
+        encontrados = []
+        posicao = bisect.bisect_left(self.inicios, fim) - 1
+        while posicao >= 0 and self.maior_fim[posicao] > inicio:
+            if self.fins[posicao] > inicio and self.contratos[posicao] != ignorar:
+                encontrados.append(self.contratos[posicao])
+            posicao -= 1
+        return encontrados
+
+    def _recalcular(self, desde: int):
+        anterior = self.maior_fim[desde - 1] if desde > 0 else None
+        for posicao in range(desde, len(self.fins)):
+            fim = self.fins[posicao]
+            anterior = fim if anterior is None or fim > anterior else anterior
+            self.maior_fim[posicao] = anterior
+
+    def __len__(self):
+        return len(self.inicios)
+
+
+class IndiceDisponibilidade:
+    """Agenda de contratos por veículo, em memória, para buscas de disponibilidade e checagem de sobreposição.
+
+    Guarda só os contratos que terminam depois de `desde` (AVAILABILITY_HISTORY_DAYS para trás);
+    períodos que começam antes disso, ou qualquer período enquanto o índice não está carregado,
+    são respondidos pelo banco. Só é usado no loop de eventos; o lock por veículo serializa checagem e gravação
+    de contratos do mesmo veículo neste processo, e a ausência de conflito é sempre confirmada no banco,
+    onde estão os contratos gravados por outros processos.
+    """
+
+    def __init__(self, historico_dias: float):
+        self.historico_dias = historico_dias
+        self.desde: Optional[datetime] = None
+        self.carregado_em: Optional[float] = None
+        self._agendas: Dict[ObjectId, _Agenda] = defaultdict(_Agenda)
+        self._locks = LocksPorChave()
+        # Gravações feitas enquanto uma recarga lê o banco; reaplicadas nas agendas novas antes da troca
+        self._durante_recarga: Optional[List[Tuple[str, dict]]] = None
+
+    @property
+    def carregado(self) -> bool:
+        return self.desde is not None
+
+    async def carregar(self):
+        desde = datetime.utcnow() - timedelta(days=self.historico_dias)
+        agendas: Dict[ObjectId, _Agenda] = defaultdict(_Agenda)
+        inicio = time.perf_counter()
+        self._durante_recarga = []
+        try:
+            with operacao("disponibilidade.carregar"):
+                contratos = database.get_collection("contratos").find(
+                    {"data_fim": {"$gt": desde}}, {"veiculo_id": 1, "data_inicio": 1, "data_fim": 1}
+                ).sort("data_inicio", 1)
+                async for contrato in contratos:
+                    # Já vêm em ordem de início: append direto, sem busca binária
+                    agenda = agendas[contrato["veiculo_id"]]
+                    agenda.inicios.append(contrato["data_inicio"])
+                    agenda.fins.append(contrato["data_fim"])
+                    agenda.contratos.append(contrato["_id"])
+                    agenda.maior_fim.append(contrato["data_fim"])
+            for agenda in agendas.values():
+                agenda._recalcular(0)
+
+            # O cursor pode ou não ter visto cada gravação feita durante a leitura: o contrato é tirado
+            # antes de ser reaplicado, para não ficar duplicado
+            for tipo, contrato in self._durante_recarga:
+                self._remover_de(agendas, contrato)
+                if tipo == "adicionar":
+                    self._adicionar_em(agendas, desde, contrato)
+        finally:
+            self._durante_recarga = None
+
+        # Sem await entre a reaplicação e a troca: nenhuma gravação fica de fora
+        self._agendas, self.desde, self.carregado_em = agendas, desde, time.monotonic()
+        logger.info("Índice de disponibilidade carregado: %s contrato(s) de %s veículo(s) em %.2fs",
+                    sum(len(agenda) for agenda in agendas.values()), len(agendas), time.perf_counter() - inicio)
+
+    def descarregar(self):
+        self._agendas = defaultdict(_Agenda)
+        self.desde = self.carregado_em = None
+
+    def cobre(self, inicio: datetime) -> bool:
+        return self.carregado and para_utc(inicio) >= self.desde
+
+    def travar(self, *veiculo_ids: ObjectId):
+        return self._locks.travar(veiculo_ids)
+
+    def adicionar(self, contrato: dict):
+        if self._durante_recarga is not None:
+            self._durante_recarga.append(("adicionar", contrato))
+        if self.carregado:
+            self._adicionar_em(self._agendas, self.desde, contrato)
+
+    def remover(self, contrato: dict):
+        if self._durante_recarga is not None:
+            self._durante_recarga.append(("remover", contrato))
+        self._remover_de(self._agendas, contrato)
+
+    @staticmethod
+    def _adicionar_em(agendas: Dict[ObjectId, _Agenda], desde: datetime, contrato: dict):
+        inicio, fim = para_utc(contrato["data_inicio"]), para_utc(contrato["data_fim"])
+        if fim > desde:
+            agendas[contrato["veiculo_id"]].adicionar(contrato["_id"], inicio, fim)
+
+    @staticmethod
+    def _remover_de(agendas: Dict[ObjectId, _Agenda], contrato: dict):
+        agenda = agendas.get(contrato["veiculo_id"])
+        if agenda is not None and agenda.remover(contrato["_id"]) and not agenda:
+            del agendas[contrato["veiculo_id"]]
+
+    async def conflitos(self, veiculo_id: ObjectId, inicio: datetime, fim: datetime,
+                        ignorar: Optional[ObjectId] = None) -> List[ObjectId]:
+        inicio, fim = para_utc(inicio), para_utc(fim)
+        if self.cobre(inicio):
+            agenda = self._agendas.get(veiculo_id)
+            return agenda.conflitos(inicio, fim, ignorar) if agenda is not None else []
+        return await self._conflitos_banco(veiculo_id, inicio, fim, ignorar)
+
+    async def verificar(self, contrato: dict, ignorar: Optional[ObjectId] = None):
+        """Levanta ConflitoDeReserva quando o período do contrato sobrepõe outro contrato do mesmo veículo."""
+        veiculo_id, inicio, fim = contrato["veiculo_id"], contrato["data_inicio"], contrato["data_fim"]
+        conflitos = await self.conflitos(veiculo_id, inicio, fim, ignorar)
+        if not conflitos and self.cobre(inicio):
+            # O que outros processos (workers, instâncias) gravaram desde a carga só está no banco:
+            # a ausência de conflito é confirmada lá, com uma consulta pelo índice (veiculo_id, data_inicio)
+            conflitos = await self._conflitos_banco(veiculo_id, para_utc(inicio), para_utc(fim), ignorar)
+        if conflitos:
+            raise ConflitoDeReserva(veiculo_id, conflitos)
+
+    @staticmethod
+    async def _conflitos_banco(veiculo_id: ObjectId, inicio: datetime, fim: datetime,
+                               ignorar: Optional[ObjectId]) -> List[ObjectId]:
+        # Atendida pelo índice (veiculo_id, data_inicio) de contratos
+        filtro = {"veiculo_id": veiculo_id, "data_inicio": {"$lt": fim}, "data_fim": {"$gt": inicio}}
+        if ignorar is not None:
+            filtro["_id"] = {"$ne": ignorar}
+        return [contrato["_id"] async for contrato in database.get_collection("contratos").find(filtro, {"_id": 1})]
+
+    async def ocupados(self, inicio: datetime, fim: datetime, veiculo_ids: Optional[Iterable[ObjectId]] = None) -> Set[ObjectId]:
+        """Veículos com algum contrato no período; `veiculo_ids` restringe a verificação a esses veículos."""
+        inicio, fim = para_utc(inicio), para_utc(fim)
+        if self.cobre(inicio):
+            candidatos = self._agendas.keys() if veiculo_ids is None else veiculo_ids
+            return {
+                veiculo_id for veiculo_id in candidatos
+                if veiculo_id in self._agendas and self._agendas[veiculo_id].conflitos(inicio, fim)
+            }
+        filtro = {"data_inicio": {"$lt": fim}, "data_fim": {"$gt": inicio}}
+        if veiculo_ids is not None:
+            filtro["veiculo_id"] = {"$in": list(veiculo_ids)}
+        return set(await database.get_collection("contratos").distinct("veiculo_id", filtro))
+
+    def snapshot(self) -> dict:
+        return {
+            "carregado": self.carregado,
+            "desde": self.desde.isoformat() if self.desde else None,
+            "idade_segundos": round(time.monotonic() - self.carregado_em, 3) if self.carregado_em else None,
+            "veiculos": len(self._agendas),
+            "contratos": sum(len(agenda) for agenda in self._agendas.values()),
+            "locks": len(self._locks),
+        }
+
+
+indice_disponibilidade = IndiceDisponibilidade(settings.AVAILABILITY_HISTORY_DAYS)
+
+
+async def _recarregar_periodicamente(intervalo: float):
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            await indice_disponibilidade.carregar()
+        except Exception as e:
+            logger.error("Erro ao recarregar o índice de disponibilidade: %s", e)
+
+
+_recarga: Optional[asyncio.Task] = None
+
+
+async def iniciar_disponibilidade():
+    """Carrega o índice e, com AVAILABILITY_RELOAD_SECONDS, agenda a recarga (contratos gravados por outras instâncias)."""
+    global _recarga
+    if not settings.AVAILABILITY_INDEX_ENABLED:
+        return
+    await indice_disponibilidade.carregar()
+    if settings.AVAILABILITY_RELOAD_SECONDS > 0:
+        _recarga = asyncio.ensure_future(_recarregar_periodicamente(settings.AVAILABILITY_RELOAD_SECONDS))
+
+
+async def parar_disponibilidade():
+    global _recarga
+    if _recarga is not None:
+        _recarga.cancel()
+        _recarga = None
+    indice_disponibilidade.descarregar()
@@ -0,0 +1,85 @@
+import csv
+import io
+import json
+from enum import Enum
+from typing import AsyncIterator, Type
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from src.app.core.db.instrumentation import operacao
+from src.app.core.serializacao import campos_dto, projetar, valor_json
+
+
+class FormatoExportacao(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+    JSON = "json"
+
+
+_MEDIA_TYPES = {
+    FormatoExportacao.NDJSON: "application/x-ndjson",
+    FormatoExportacao.CSV: "text/csv; charset=utf-8",
+    FormatoExportacao.JSON: "application/json",
+}
+
+
+def para_saida(documento: dict, dto: Type[BaseModel]) -> dict:
+    """Converte o documento bruto no formato do DTO, como as respostas JSON, com ObjectId/datetime já em texto."""
+    return {campo: valor_json(valor) for campo, valor in projetar(documento, dto).items()}
+
+
+async def _serializar(cursor, dto: Type[BaseModel], formato: FormatoExportacao,
+                      batch_size: int, nome_operacao: str) -> AsyncIterator[str]:
+    # Um pedaço da resposta por lote do cursor: só o lote atual fica em memória
+    pedaco = io.StringIO()
+    escritor = csv.DictWriter(pedaco, fieldnames=list(campos_dto(dto)), extrasaction="ignore") if formato == FormatoExportacao.CSV else None
+    quantidade = 0
+    primeiro = True
+
+    if escritor:
+        escritor.writeheader()
+    elif formato == FormatoExportacao.JSON:
+        pedaco.write("[")
+
+    try:
+        with operacao(nome_operacao):
+            async for documento in cursor:
+                saida = para_saida(documento, dto)
+                if escritor:
+                    escritor.writerow(saida)
+                elif formato == FormatoExportacao.NDJSON:
+                    pedaco.write(json.dumps(saida, ensure_ascii=False))
+                    pedaco.write("\n")
+                else:
+                    if not primeiro:
+                        pedaco.write(",")
+                    pedaco.write(json.dumps(saida, ensure_ascii=False))
+                primeiro = False
+
+                quantidade += 1
+                if quantidade >= batch_size:
+                    yield pedaco.getvalue()
+                    pedaco.seek(0)
+                    pedaco.truncate()
+                    quantidade = 0
+    finally:
+        await cursor.close()
+
+    if formato == FormatoExportacao.JSON:
+        pedaco.write("]")
+    if pedaco.tell():
+        yield pedaco.getvalue()
+
+
+def exportar(cursor, dto: Type[BaseModel], formato: FormatoExportacao, batch_size: int,
+             nome_operacao: str, nome_arquivo: str = None) -> StreamingResponse:
+    """Transmite os documentos do cursor conforme chegam do servidor, em NDJSON, CSV ou array JSON."""
+    headers = {}
+    if nome_arquivo:
+        headers["Content-Disposition"] = f'attachment; filename="{nome_arquivo}.{formato.value}"'
+    return StreamingResponse(
+        _serializar(cursor.batch_size(batch_size), dto, formato, batch_size, nome_operacao),
+        media_type=_MEDIA_TYPES[formato],
+        headers=headers,
+    )
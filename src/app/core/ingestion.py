@@ -0,0 +1,204 @@
+import codecs
+import json
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+
+from src.app.models.bulk_result import BulkResult, BulkRowError
+
+_DECODER = json.JSONDecoder()
+_ESPACOS = " \t\r\n"
+
+# Tamanho máximo (em caracteres) de um elemento do array JSON ou de uma linha NDJSON. Um elemento
+# maior, ou sem fim reconhecível, encerra a importação com 400; uma linha maior é rejeitada e o
+# resto dela descartado até a próxima quebra. Nos dois casos o corpo não se acumula na memória
+_MAX_ELEMENTO = 1024 * 1024
+
+
+class _ErroLinha:
+    __slots__ = ("mensagem",)
+
+    def __init__(self, mensagem: str):
+        self.mensagem = mensagem
+
+
+async def ler_linhas(request: Request) -> AsyncIterator[Any]:
+    """Lê o corpo da requisição aos poucos, como NDJSON ou como um array JSON.
+
+    O formato é decidido pelo primeiro caractere não vazio: '[' indica array JSON.
+    Linhas que não são JSON válido são emitidas como _ErroLinha, sem interromper a leitura.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    formato = None
+    descartando = False
+    stream = request.stream()
+
+    async for chunk in stream:
+        buffer += decoder.decode(chunk)
+        if formato is None:
+            inicio = buffer.lstrip(_ESPACOS)
+            if not inicio:
+                continue
+            formato = "array" if inicio[0] == "[" else "ndjson"
+            if formato == "array":
+                buffer = inicio[1:]
+        if formato == "ndjson":
+            if descartando:
+                fim_linha = buffer.find("\n")
+                if fim_linha < 0:
+                    buffer = ""
+                    continue
+                buffer, descartando = buffer[fim_linha + 1:], False
+            *linhas, buffer = buffer.split("\n")
+            for linha in linhas:
+                if linha.strip():
+                    yield _decodificar(linha)
+            if len(buffer) > _MAX_ELEMENTO:
+                yield _ErroLinha(f"Linha com mais de {_MAX_ELEMENTO} caracteres")
+                buffer, descartando = "", True
+        else:
+            objetos, buffer, fim = _extrair_objetos(buffer, final=False)
+            for objeto in objetos:
+                yield objeto
+            if fim:
+                return
+
+    buffer += decoder.decode(b"", final=True)
+    if formato == "ndjson" and not descartando and buffer.strip():
+        yield _decodificar(buffer)
+    elif formato == "array":
+        objetos, _, _ = _extrair_objetos(buffer, final=True)
+        for objeto in objetos:
+            yield objeto
+
+
+def _decodificar(linha: str) -> Any:
+    try:
+        return json.loads(linha)
+    except json.JSONDecodeError as e:
+        return _ErroLinha(f"JSON inválido: {e.msg}")
+
+
+def _extrair_objetos(buffer: str, final: bool) -> Tuple[List[Any], str, bool]:
+    objetos = []
+    posicao = 0
+    while True:
+        while posicao < len(buffer) and buffer[posicao] in _ESPACOS + ",":
+            posicao += 1
+        if posicao >= len(buffer):
+            return objetos, "", False
+        if buffer[posicao] == "]":
+            return objetos, "", True
+        try:
+            objeto, posicao = _DECODER.raw_decode(buffer, posicao)
+        except json.JSONDecodeError as e:
+            separador = _proximo_separador(buffer, posicao)
+            if separador is not None:
+                # O elemento termina antes do separador e mesmo assim não é JSON válido: só ele é rejeitado
+                objetos.append(_ErroLinha(f"JSON inválido: {e.msg}"))
+                posicao = separador
+                continue
+            if final or len(buffer) - posicao > _MAX_ELEMENTO:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Array JSON inválido: elemento sem fim reconhecível ({e.msg}); "
+                           f"os lotes gravados antes dele não são desfeitos"
+                )
+            # Objeto incompleto: espera o próximo pedaço do corpo
+            return objetos, buffer[posicao:], False
+        objetos.append(objeto)
+
+
+def _proximo_separador(buffer: str, posicao: int) -> Optional[int]:
+    """Posição da próxima vírgula ou do "]" do array fora de strings e de objetos/arrays aninhados."""
+    profundidade = 0
+    em_string = escape = False
+    for indice in range(posicao, len(buffer)):
+        caractere = buffer[indice]
+        if em_string:
+            if escape:
+                escape = False
+            elif caractere == "\\":
+                escape = True
+            elif caractere == '"':
+                em_string = False
+        elif caractere == '"':
+            em_string = True
+        elif caractere in "{[":
+            profundidade += 1
+        elif caractere in "}]":
+            if profundidade == 0:
+                return indice
+            profundidade -= 1
+        elif caractere == "," and profundidade == 0:
+            return indice
+    return None
+
+
+async def importar(
+        request: Request,
+        dto_cls: Type[BaseModel],
+        para_documento: Callable[[BaseModel], dict],
+        inserir: Callable[[List[dict]], Awaitable[List[Tuple[int, str]]]],
+        batch_size: int,
+        max_erros: int = 1000,
+) -> BulkResult:
+    """Valida as linhas em lotes de batch_size e grava cada lote com um insert_many não ordenado."""
+    inicio = time.perf_counter()
+    recebidos = inseridos = rejeitados = lotes = 0
+    erros: List[BulkRowError] = []
+
+    def registrar_erro(linha: int, erro: Any):
+        nonlocal rejeitados
+        rejeitados += 1
+        if len(erros) < max_erros:
+            erros.append(BulkRowError(linha=linha, erro=erro))
+
+    linhas: List[int] = []
+    documentos: List[dict] = []
+
+    async def gravar_lote():
+        nonlocal inseridos, lotes
+        falhas = await inserir(documentos)
+        lotes += 1
+        for posicao, mensagem in falhas:
+            registrar_erro(linhas[posicao], mensagem)
+        inseridos += len(documentos) - len(falhas)
+        linhas.clear()
+        documentos.clear()
+
+    async for item in ler_linhas(request):
+        recebidos += 1
+        if isinstance(item, _ErroLinha):
+            registrar_erro(recebidos, item.mensagem)
+            continue
+        try:
+            documento = para_documento(dto_cls.model_validate(item))
+        except ValidationError as e:
+            registrar_erro(recebidos, e.errors(include_url=False, include_context=False))
+            continue
+        except Exception as e:
+            registrar_erro(recebidos, str(e))
+            continue
+
+        linhas.append(recebidos)
+        documentos.append(documento)
+        if len(documentos) >= batch_size:
+            await gravar_lote()
+
+    if documentos:
+        await gravar_lote()
+
+    duracao = time.perf_counter() - inicio
+    return BulkResult(
+        recebidos=recebidos,
+        inseridos=inseridos,
+        rejeitados=rejeitados,
+        lotes=lotes,
+        duracao_segundos=round(duracao, 4),
+        linhas_por_segundo=round(recebidos / duracao, 2) if duracao > 0 else 0.0,
+        erros=erros,
+    )
@@ -0,0 +1,267 @@
+import functools
+import inspect
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional, Tuple
+
+from fastapi.routing import APIRoute
+
+from src.app.core.config import settings
+from src.app.core.db.instrumentation import BUCKETS, labels_prometheus, tempos_banco
+
+# Rota sem correspondência (404) e rotas fora do roteador: agrupadas para não criar uma série por URL
+ROTA_DESCONHECIDA = "desconhecida"
+
+PERCENTIS = (50, 95, 99)
+
+
+class _Tempos:
+    """Tempos da requisição em andamento, em segundos."""
+    __slots__ = ("inicio", "banco", "serializacao", "endpoint", "rota")
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.banco: List[float] = []
+        self.serializacao = 0.0
+        # Corpo do endpoint, sem a serialização feita dentro dele
+        self.endpoint = 0.0
+        # Handler do FastAPI: leitura do corpo, dependências, endpoint e response_model
+        self.rota = 0.0
+
+    def componentes(self, total: float) -> Dict[str, float]:
+        banco = sum(self.banco)
+        return {
+            "db": banco,
+            "serializacao": self.serializacao,
+            # Parâmetros, corpo, dependências e response_model (os DTOs são validados e serializados juntos)
+            "validacao": max(self.rota - self.endpoint - self.serializacao, 0.0),
+            "app": max(self.endpoint - banco, 0.0),
+            "total": total,
+        }
+
+
+tempos_requisicao: ContextVar[Optional[_Tempos]] = ContextVar("tempos_requisicao", default=None)
+
+
+@contextmanager
+def serializando():
+    tempos = tempos_requisicao.get()
+    if tempos is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        tempos.serializacao += time.perf_counter() - inicio
+
+
+def server_timing(componentes: Dict[str, float]) -> str:
+    return ", ".join(f"{nome};dur={duracao * 1000:.2f}" for nome, duracao in componentes.items())
+
+
+def _cronometrar_endpoint(endpoint):
+    if not inspect.iscoroutinefunction(endpoint):
+        return endpoint
+
+    # functools.wraps mantém __wrapped__: o FastAPI lê os parâmetros da assinatura original
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        tempos = tempos_requisicao.get()
+        if tempos is None:
+            return await endpoint(*args, **kwargs)
+        inicio = time.perf_counter()
+        serializacao = tempos.serializacao
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            tempos.endpoint += time.perf_counter() - inicio - (tempos.serializacao - serializacao)
+    return wrapper
+
+
+class RotaCronometrada(APIRoute):
+    """APIRoute que separa o tempo do endpoint do tempo gasto pelo FastAPI antes e depois dele."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _cronometrar_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def cronometrado(request):
+            tempos = tempos_requisicao.get()
+            if tempos is None:
+                return await handler(request)
+            inicio = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                tempos.rota += time.perf_counter() - inicio
+        return cronometrado
+
+
+class _Rota:
+    __slots__ = ("router", "amostras", "buckets", "soma", "quantidade", "erros")
+
+    def __init__(self, router: str, max_amostras: int):
+        self.router = router
+        # (instante, total, db, serializacao, validacao, app)
+        self.amostras: Deque[Tuple[float, ...]] = deque(maxlen=max_amostras)
+        self.buckets = [0] * len(BUCKETS)
+        self.soma = 0.0
+        self.quantidade = 0
+        self.erros = 0
+
+
+class LatenciaRotas:
+    """Latência por rota (caminho com parâmetros, ex.: /api/contratos/{id}) e método.
+
+    Guarda as últimas amostras de cada rota para os percentis da janela e um histograma
+    acumulado para o Prometheus. Só é usado no loop de eventos, então não precisa de lock.
+    """
+
+    def __init__(self, janela: float, max_amostras: int):
+        self.janela = janela
+        self.max_amostras = max_amostras
+        self._rotas: Dict[Tuple[str, str], _Rota] = {}
+
+    def observar(self, metodo: str, caminho: str, router: str, status: int, componentes: Dict[str, float]):
+        rota = self._rotas.get((metodo, caminho))
+        if rota is None:
+            rota = self._rotas[(metodo, caminho)] = _Rota(router, self.max_amostras)
+        total = componentes["total"]
+        rota.amostras.append((
+            time.monotonic(), total, componentes["db"], componentes["serializacao"],
+            componentes["validacao"], componentes["app"],
+        ))
+        rota.soma += total
+        rota.quantidade += 1
+        if status >= 500:
+            rota.erros += 1
+        for i, limite in enumerate(BUCKETS):
+            if total <= limite:
+                rota.buckets[i] += 1
+                break
+
+    def snapshot(self) -> dict:
+        limite = time.monotonic() - self.janela
+        rotas = []
+        routers: Dict[str, dict] = {}
+        tempo_total = 0.0
+
+        for (metodo, caminho), rota in self._rotas.items():
+            amostras = [amostra for amostra in rota.amostras if amostra[0] >= limite]
+            if not amostras:
+                continue
+            totais = sorted(amostra[1] for amostra in amostras)
+            soma = sum(totais)
+            tempo_total += soma
+            resumo = {
+                "metodo": metodo,
+                "rota": caminho,
+                "router": rota.router,
+                "requisicoes": len(amostras),
+                **{f"p{p}_ms": round(_percentil(totais, p) * 1000, 3) for p in PERCENTIS},
+                "max_ms": round(totais[-1] * 1000, 3),
+                "tempo_total_ms": round(soma * 1000, 3),
+            }
+            for i, componente in enumerate(("db", "serializacao", "validacao", "app"), start=2):
+                resumo[f"media_{componente}_ms"] = round(sum(amostra[i] for amostra in amostras) / len(amostras) * 1000, 3)
+            resumo["erros_total"] = rota.erros
+            rotas.append(resumo)
+
+            agrupado = routers.setdefault(rota.router, {"requisicoes": 0, "tempo_total_ms": 0.0})
+            agrupado["requisicoes"] += len(amostras)
+            agrupado["tempo_total_ms"] += soma * 1000
+
+        for agrupado in routers.values():
+            agrupado["tempo_total_ms"] = round(agrupado["tempo_total_ms"], 3)
+            agrupado["fracao"] = round(agrupado["tempo_total_ms"] / (tempo_total * 1000), 4) if tempo_total else 0.0
+
+        return {
+            "janela_segundos": self.janela,
+            "max_amostras": self.max_amostras,
+            "routers": dict(sorted(routers.items(), key=lambda item: -item[1]["tempo_total_ms"])),
+            "rotas": sorted(rotas, key=lambda resumo: -resumo["p95_ms"]),
+        }
+
+    def reset(self):
+        self._rotas.clear()
+
+    def prometheus(self) -> str:
+        linhas = [
+            "# HELP http_request_duration_seconds Latência das requisições HTTP por rota.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (metodo, caminho), rota in sorted(self._rotas.items()):
+            labels = labels_prometheus(metodo=metodo, rota=caminho)
+            acumulado = 0
+            for limite, quantidade in zip(BUCKETS, rota.buckets):
+                acumulado += quantidade
+                linhas.append(f'http_request_duration_seconds_bucket{{{labels},le="{limite}"}} {acumulado}')
+            linhas.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {rota.quantidade}')
+            linhas.append(f"http_request_duration_seconds_sum{{{labels}}} {rota.soma}")
+            linhas.append(f"http_request_duration_seconds_count{{{labels}}} {rota.quantidade}")
+
+        linhas += [
+            "# HELP http_request_errors_total Requisições HTTP respondidas com status 5xx.",
+            "# TYPE http_request_errors_total counter",
+        ]
+        for (metodo, caminho), rota in sorted(self._rotas.items()):
+            linhas.append(f"http_request_errors_total{{{labels_prometheus(metodo=metodo, rota=caminho)}}} {rota.erros}")
+        return "\n".join(linhas) + "\n"
+
+
+def _percentil(ordenados: List[float], p: int) -> float:
+    # Nearest-rank: sempre um valor observado
+    indice = max(0, -(-len(ordenados) * p // 100) - 1)
+    return ordenados[indice]
+
+
+class LatenciaMiddleware:
+    """Mede cada requisição HTTP, devolve o cabeçalho Server-Timing e alimenta as estatísticas por rota.
+
+    O Server-Timing reflete o tempo até o início da resposta; a latência registrada vai até o fim
+    do corpo, o que inclui os endpoints /export que transmitem o resultado aos poucos.
+    """
+
+    def __init__(self, app, latencias: "LatenciaRotas" = None):
+        self.app = app
+        self.latencias = latencias or latencia_rotas
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        tempos = _Tempos()
+        token = tempos_requisicao.set(tempos)
+        token_banco = tempos_banco.set(tempos.banco)
+        status = 500
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+                cabecalho = server_timing(tempos.componentes(time.perf_counter() - tempos.inicio))
+                mensagem = {**mensagem, "headers": [*mensagem.get("headers", []), (b"server-timing", cabecalho.encode("latin-1"))]}
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            tempos_requisicao.reset(token)
+            tempos_banco.reset(token_banco)
+            # O roteador grava a rota encontrada no próprio scope
+            rota = scope.get("route")
+            caminho = getattr(rota, "path", None) or ROTA_DESCONHECIDA
+            tags = getattr(rota, "tags", None)
+            self.latencias.observar(
+                scope["method"], caminho, str(tags[0]) if tags else ROTA_DESCONHECIDA, status,
+                tempos.componentes(time.perf_counter() - tempos.inicio),
+            )
+
+
+latencia_rotas = LatenciaRotas(settings.HTTP_TIMING_WINDOW_SECONDS, settings.HTTP_TIMING_MAX_SAMPLES)
@@ -0,0 +1,40 @@
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterable
+
+
+class LocksPorChave:
+    """Um asyncio.Lock por chave, criado no primeiro uso e descartado quando ninguém mais o usa.
+
+    As chaves de uma chamada são travadas em ordem, então duas chamadas com chaves em comum
+    não ficam esperando uma pela outra.
+    """
+
+    def __init__(self):
+        self._locks: Dict[Any, asyncio.Lock] = {}
+        self._uso: Dict[Any, int] = Counter()
+
+    @asynccontextmanager
+    async def travar(self, chaves: Iterable):
+        chaves = sorted(set(chaves), key=str)
+        for chave in chaves:
+            self._uso[chave] += 1
+        travados = []
+        try:
+            for chave in chaves:
+                lock = self._locks.setdefault(chave, asyncio.Lock())
+                await lock.acquire()
+                travados.append(lock)
+            yield
+        finally:
+            for lock in reversed(travados):
+                lock.release()
+            for chave in chaves:
+                self._uso[chave] -= 1
+                if not self._uso[chave]:
+                    del self._uso[chave]
+                    self._locks.pop(chave, None)
+
+    def __len__(self):
+        return len(self._locks)
@@ -1,8 +1,164 @@
+import atexit
+import copy
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+import threading
+import time
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+from src.app.core.config import config, settings
+
+# Thread que grava os registros enfileirados nos handlers de arquivo e console
+_listener: Optional[QueueListener] = None
+
+# Só para o traceback, que precisa ser renderizado antes de o registro ir para a fila
+_formatador = logging.Formatter()
+
+
+class _FilaSemBloqueio(QueueHandler):
+    """Entrega o registro à thread de escrita; com a fila cheia, descarta em vez de esperar."""
+
+    def __init__(self, fila: queue.Queue):
+        super().__init__(fila)
+        self.descartados = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Os args podem ser dicionários e listas que o loop de eventos continua alterando: a mensagem
+        # é montada aqui, na thread que loga. Já a linha final (data, nível, formato dos handlers) fica
+        # para a thread de escrita, ao contrário do QueueHandler padrão, que a formata aqui
+        copia = copy.copy(record)
+        copia.msg = record.getMessage()
+        copia.args = None
+        if record.exc_info:
+            copia.exc_text = record.exc_text or _formatador.formatException(record.exc_info)
+            copia.exc_info = None
+        return copia
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+@lru_cache(maxsize=None)
+def _limite_logger(nome: str) -> float:
+    return config(f"LOG_RATE_LIMIT_{nome.rsplit('.', 1)[-1].upper()}", cast=float, default=settings.LOG_RATE_LIMIT)
+
+
+@lru_cache(maxsize=None)
+def _amostra_logger(nome: str) -> float:
+    return config(f"LOG_SAMPLE_{nome.rsplit('.', 1)[-1].upper()}", cast=float, default=1.0)
+
+
+class LimiteTaxa(logging.Filter):
+    """Amostragem e limite de taxa (token bucket) por logger para INFO e DEBUG.
+
+    WARNING e acima sempre passam. Quando volta a passar, o registro informa quantos foram suprimidos.
+    """
+
+    def __init__(self, rajada: int):
+        super().__init__()
+        self.rajada = rajada
+        self.suprimidos = 0
+        self._baldes: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        amostra = _amostra_logger(record.name)
+        if amostra < 1 and random.random() >= amostra:
+            return False
+
+        taxa = _limite_logger(record.name)
+        if taxa <= 0:
+            return True
+
+        with self._lock:
+            agora = time.monotonic()
+            balde = self._baldes.get(record.name)
+            if balde is None:
+                # [fichas, último reabastecimento, suprimidos desde o último registro aceito]
+                balde = self._baldes[record.name] = [float(self.rajada), agora, 0]
+            balde[0] = min(float(self.rajada), balde[0] + (agora - balde[1]) * taxa)
+            balde[1] = agora
+            if balde[0] < 1:
+                balde[2] += 1
+                self.suprimidos += 1
+                return False
+            balde[0] -= 1
+            suprimidos, balde[2] = balde[2], 0
+
+        if suprimidos:
+            record.msg, record.args = "%s (%d mensagens suprimidas)", (record.getMessage(), suprimidos)
+        return True
+
+
+class Resumo:
+    """Adia a conversão de documentos para texto até o registro passar pelo nível e pelos filtros.
+
+    Fora do nível DEBUG mostra só a quantidade e os _id, nunca o conteúdo.
+    """
+    __slots__ = ("valor",)
+
+    def __init__(self, valor: Any):
+        self.valor = valor
+
+    def __str__(self) -> str:
+        if logging.getLogger('app_logger').isEnabledFor(logging.DEBUG):
+            return str(self.valor)
+        if isinstance(self.valor, (list, tuple)):
+            ids = [_identificador(item) for item in self.valor[:5]]
+            ids = [str(_id) for _id in ids if _id is not None]
+            reticencias = ", ..." if len(self.valor) > 5 else ""
+            return f"{len(self.valor)} item(ns)" + (f" ids=[{', '.join(ids)}{reticencias}]" if ids else "")
+        _id = _identificador(self.valor)
+        if _id is not None:
+            return f"id={_id}"
+        texto = str(self.valor)
+        if len(texto) > settings.LOG_PAYLOAD_MAX_CHARS:
+            return texto[:settings.LOG_PAYLOAD_MAX_CHARS] + f"... ({len(texto)} caracteres)"
+        return texto
+
+
+def _identificador(valor: Any) -> Any:
+    if isinstance(valor, dict):
+        return valor.get("_id", valor.get("id"))
+    return getattr(valor, "id", None)
+
+
+def resumo(valor: Any) -> Resumo:
+    return Resumo(valor)
+
+
+def estatisticas_logging() -> dict:
+    logger = logging.getLogger('app_logger')
+    estatisticas = {"nivel": logging.getLevelName(logger.getEffectiveLevel()), "descartados": 0, "suprimidos": 0, "na_fila": 0}
+    for handler in logger.handlers:
+        if isinstance(handler, _FilaSemBloqueio):
+            estatisticas["descartados"] += handler.descartados
+            estatisticas["na_fila"] += handler.queue.qsize()
+            estatisticas["suprimidos"] += sum(f.suprimidos for f in handler.filters if isinstance(f, LimiteTaxa))
+    return estatisticas
+
+
+def encerrar_logging():
+    """Grava o que ainda está na fila e para a thread de escrita."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 def setup_logging():
+    global _listener
+
     # Diretório para salvar os logs
     LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
     if not os.path.exists(LOG_DIR):
@@ -13,7 +169,7 @@ def setup_logging():
 
     # Criação do logger (Obtém o logger principal)
     logger = logging.getLogger('app_logger')
-    logger.setLevel(logging.INFO)  # Define o nível do logger
+    logger.setLevel(settings.LOG_LEVEL.upper())  # Define o nível do logger
 
     # Verifica se o logger já tem handlers (para evitar duplicatas se setup_logging for chamado novamente)
     if not logger.hasHandlers():
@@ -21,12 +177,19 @@ def setup_logging():
         file_handler = RotatingFileHandler(LOG_FILE_PATH, maxBytes=10 * 1024 * 1024, backupCount=5)
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s') # Inclui o nome do logger
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
 
         # Handler para console (opcional)
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)  # Use o mesmo formatter para consistência
-        logger.addHandler(console_handler)
+
+        # O loop de eventos só enfileira: arquivo e console são escritos por uma thread separada
+        fila_handler = _FilaSemBloqueio(queue.Queue(settings.LOG_QUEUE_SIZE))
+        fila_handler.addFilter(LimiteTaxa(settings.LOG_RATE_BURST))
+        logger.addHandler(fila_handler)
+
+        _listener = QueueListener(fila_handler.queue, file_handler, console_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(encerrar_logging)
 
     print("Configuração de logging realizada com sucesso!")
-    return logger # Retorna o logger configurado
\ No newline at end of file
+    return logger # Retorna o logger configurado
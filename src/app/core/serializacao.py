@@ -0,0 +1,107 @@
+import json
+import types
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Type, Union, get_args, get_origin
+
+from bson import ObjectId
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from src.app.core.latencia import serializando
+from src.app.models.pagination_result import PaginationResult
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional: sem ele, json da biblioteca padrão
+    orjson = None
+
+
+# Tipos escalares que a validação do DTO converteria (ex.: valor 10 gravado como int sai como 10.0)
+_CONVERSIVEIS = (float, int, bool)
+
+
+def valor_json(valor: Any) -> Any:
+    """ObjectId vira texto e datetime vira ISO 8601, também dentro de dicionários e listas."""
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, dict):
+        return {chave: valor_json(item) for chave, item in valor.items()}
+    if isinstance(valor, list):
+        return [valor_json(item) for item in valor]
+    return valor
+
+
+@lru_cache(maxsize=None)
+def campos_dto(dto: Type[BaseModel]) -> Dict[str, Tuple[Optional[Callable[[Any], Any]], Any]]:
+    """Por campo do DTO, na ordem declarada: a coerção do tipo anotado e o padrão (None se obrigatório)."""
+    campos = {}
+    for nome, campo in dto.model_fields.items():
+        tipo = campo.annotation
+        argumentos = [argumento for argumento in get_args(tipo) if argumento is not type(None)]
+        if get_origin(tipo) in (Union, types.UnionType) and len(argumentos) == 1:
+            tipo = argumentos[0]
+        conversor = tipo if tipo in _CONVERSIVEIS else None
+        padrao = None if campo.is_required() else campo.get_default(call_default_factory=True)
+        campos[nome] = (conversor, padrao)
+    return campos
+
+
+def _valor_campo(documento: Mapping[str, Any], campo: str, conversor: Optional[Callable[[Any], Any]], padrao: Any) -> Any:
+    if campo == "id":
+        return documento.get("_id", documento.get("id"))
+    valor = documento.get(campo, padrao)
+    return conversor(valor) if conversor is not None and valor is not None else valor
+
+
+def _padrao(valor: Any) -> Any:
+    if isinstance(valor, (ObjectId, datetime)):
+        return valor_json(valor)
+    if isinstance(valor, BaseModel):
+        return valor.model_dump(mode="json")
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def dumps(conteudo: Any) -> bytes:
+    """JSON direto dos documentos BSON: ObjectId vira texto e datetime vira ISO 8601."""
+    if orjson is not None:
+        return orjson.dumps(conteudo, default=_padrao, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(conteudo, default=_padrao, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def projetar(documento: Mapping[str, Any], dto: Type[BaseModel], campos: Optional[Iterable[str]] = None) -> dict:
+    """Os campos do DTO (ou só `campos`), com _id exposto como id e o padrão e a coerção de cada campo.
+
+    ObjectId e datetime seguem brutos até o dumps. Documentos já projetados (com id e sem _id)
+    passam sem alteração dos valores.
+    """
+    especificacao = campos_dto(dto)
+    return {
+        campo: _valor_campo(documento, campo, *especificacao.get(campo, (None, None)))
+        for campo in (especificacao if campos is None else campos)
+    }
+
+
+class RespostaBruta(Response):
+    """Resposta JSON que não passa pelo response_model nem pelo jsonable_encoder."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        with serializando():
+            return content if isinstance(content, bytes) else dumps(content)
+
+
+def responder_documentos(documentos: List[Mapping[str, Any]], dto: Type[BaseModel], headers: Optional[dict] = None) -> RespostaBruta:
+    return RespostaBruta([projetar(documento, dto) for documento in documentos], headers=headers)
+
+
+def responder_documento(documento: Mapping[str, Any], dto: Type[BaseModel]) -> RespostaBruta:
+    return RespostaBruta(projetar(documento, dto))
+
+
+def responder_pagina(resultado: PaginationResult, dto: Type[BaseModel], campos: Optional[List[str]] = None) -> RespostaBruta:
+    pagina = resultado.model_dump(mode="json", exclude={"data"})
+    pagina["data"] = [projetar(documento, dto, campos) for documento in resultado.data]
+    return RespostaBruta(pagina)
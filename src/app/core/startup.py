@@ -5,11 +5,32 @@ from typing import Any
 
 from fastapi import FastAPI, APIRouter
 
-from src.app.core.config import AppSettings, EnvironmentSettings
+from src.app.core.config import AppSettings, DisponibilidadeSettings, EnvironmentSettings, HttpSettings, MongoSettings
+from src.app.core.db.coalescencia import esvaziar_agrupadores
 from src.app.core.db.database import database
+from src.app.core.db.derivados import reconstruir_derivados_vazios, sincronizar_indices_derivados
+from src.app.core.db.indexes import sincronizar_repositorios, verificar_planos
+from src.app.core.db.normalizacao import iniciar_preenchimento, parar_preenchimento
+from src.app.core.disponibilidade import iniciar_disponibilidade, parar_disponibilidade
+from src.app.core.latencia import LatenciaMiddleware
+from src.app.repositories.contrato_repository import ContratoRepository
+from src.app.repositories.manutencao_repository import ManutencaoRepository
+from src.app.repositories.pagamento_repository import PagamentoRepository
+from src.app.repositories.usuario_repository import UsuarioRepository
+from src.app.repositories.veiculo_mutencao_repository import VeiculoManutencaoRepository
+from src.app.repositories.veiculo_repository import VeiculoRepository
 
 logger = logging.getLogger('app_logger.startup')
 
+REPOSITORIOS = [
+    ContratoRepository,
+    ManutencaoRepository,
+    PagamentoRepository,
+    UsuarioRepository,
+    VeiculoManutencaoRepository,
+    VeiculoRepository,
+]
+
 # --------------------------- database ---------------------------
 async def connect_to_db():
     await database.connect()
@@ -17,6 +38,15 @@ async def connect_to_db():
 async def disconnect_from_db():
     await database.disconnect()
 
+async def sync_indexes(settings: MongoSettings):
+    repositorios = [repositorio() for repositorio in REPOSITORIOS]
+    if settings.MONGO_SYNC_INDEXES:
+        await sincronizar_repositorios(repositorios)
+        await sincronizar_indices_derivados()
+    if settings.MONGO_INDEX_CHECK:
+        collscans = await verificar_planos(repositorios)
+        logger.info("Verificação de planos concluída: %s consulta(s) com COLLSCAN", len(collscans))
+
 # --------------------------- application ---------------------------
 def lifespan_factory(
         settings: AppSettings | EnvironmentSettings,
@@ -24,7 +54,16 @@ def lifespan_factory(
     @asynccontextmanager
     async def lifespan(app: FastAPI):
         await connect_to_db()
+        if isinstance(settings, MongoSettings):
+            await sync_indexes(settings)
+            await reconstruir_derivados_vazios()
+            iniciar_preenchimento()
+        if isinstance(settings, DisponibilidadeSettings):
+            await iniciar_disponibilidade()
         yield
+        await parar_disponibilidade()
+        await parar_preenchimento()
+        await esvaziar_agrupadores()
         await disconnect_from_db()
 
     logger.info("Application lifespan created successfully")
@@ -42,7 +81,9 @@ def create_application(
 
     application = FastAPI(lifespan=lifespan, **kwargs)
     application.include_router(router)
+    if isinstance(settings, HttpSettings) and settings.HTTP_TIMING_ENABLED:
+        application.add_middleware(LatenciaMiddleware)
 
     logger.info("Application created successfully")
-    logger.info(f"Application started: {settings.APP_NAME}")
-    return application
\ No newline at end of file
+    logger.info("Application started: %s", settings.APP_NAME)
+    return application
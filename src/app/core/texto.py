@@ -0,0 +1,21 @@
+import unicodedata
+from typing import Dict
+
+# Caracteres com significado em expressões regulares: buscas com algum deles não são literais
+METACARACTERES = frozenset(".^$*+?{}[]\\|()")
+
+
+def normalizar(texto: str) -> str:
+    """Texto sem acentos, em minúsculas e com espaços simples: "  João  da SILVA" -> "joao da silva"."""
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    sem_acentos = "".join(caractere for caractere in decomposto if not unicodedata.combining(caractere))
+    return " ".join(sem_acentos.casefold().split())
+
+
+def literal(padrao: str) -> bool:
+    return not METACARACTERES.intersection(padrao)
+
+
+def intervalo_prefixo(prefixo: str) -> Dict[str, str]:
+    """Condição de intervalo que casa os valores começando por `prefixo` e usa o índice do campo."""
+    return {"$gte": prefixo, "$lt": prefixo[:-1] + chr(ord(prefixo[-1]) + 1)}
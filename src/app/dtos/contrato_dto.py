@@ -4,6 +4,9 @@ from typing import Optional
 from bson import ObjectId
 from pydantic import BaseModel
 
+from src.app.dtos.pagamento_dto import PagamentoDTO
+from src.app.dtos.usuario_dto import UsuarioDTO
+from src.app.dtos.veiculo_dto import VeiculoDTO
 from src.app.models.contrato import Contrato
 
 
@@ -34,4 +37,10 @@ class ContratoDTO(BaseModel):
             pagamento_id=ObjectId(cls.pagamento_id) if cls.pagamento_id else None,
             data_inicio=cls.data_inicio,
             data_fim=cls.data_fim
-        )
\ No newline at end of file
+        )
+
+class ContratoExpandidoDTO(ContratoDTO):
+    # Preenchidos apenas quando pedidos em ?expand=; null se a referência não existe mais
+    usuario: Optional[UsuarioDTO] = None
+    veiculo: Optional[VeiculoDTO] = None
+    pagamento: Optional[PagamentoDTO] = None
@@ -0,0 +1,18 @@
+from typing import Any
+
+from pydantic import BaseModel
+
+
+class BulkRowError(BaseModel):
+    linha: int
+    erro: Any
+
+
+class BulkResult(BaseModel):
+    recebidos: int
+    inseridos: int
+    rejeitados: int
+    lotes: int
+    duracao_segundos: float
+    linhas_por_segundo: float
+    erros: list[BulkRowError]
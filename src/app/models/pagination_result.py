@@ -1,9 +1,42 @@
+from enum import Enum
+from typing import Optional
+
 from pydantic import BaseModel
 
 
+class TotalMode(str, Enum):
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    CAPPED = "capped"
+    NONE = "none"
+
+
 class PaginationResult(BaseModel):
     page: int
     limit: int
-    total_items: int
-    number_of_pages: int
-    data: list
\ No newline at end of file
+    total_items: Optional[int]
+    number_of_pages: Optional[int]
+    data: list
+    next_cursor: Optional[str] = None
+    total_mode: TotalMode = TotalMode.EXACT
+    total_label: Optional[str] = None
+
+    @classmethod
+    def build(cls, page: int, limit: int, total_items: Optional[int], capped: bool, data: list,
+              next_cursor: Optional[str] = None, total_mode: TotalMode = TotalMode.EXACT):
+        if total_items is None:
+            number_of_pages = None
+            total_label = None
+        else:
+            number_of_pages = (total_items + limit - 1) // limit
+            total_label = f"{total_items}+" if capped else str(total_items)
+        return cls(
+            page=page,
+            limit=limit,
+            total_items=total_items,
+            number_of_pages=number_of_pages,
+            data=data,
+            next_cursor=next_cursor,
+            total_mode=total_mode,
+            total_label=total_label
+        )
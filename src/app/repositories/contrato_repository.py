@@ -1,60 +1,145 @@
+import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 from bson import ObjectId
-from pymongo import ASCENDING
+from pymongo import ASCENDING, IndexModel, ReturnDocument
 
+from src.app.core.cache import buscar_documento, cache_analitico, cache_ttl, invalidar_analises, invalidar_documento
+from src.app.core.db.bulk import inserir_em_lote
+from src.app.core.db.coalescencia import inserir_um
 from src.app.core.db.database import database
+from src.app.core.db.derivados import atualizar_saldos_usuarios
+from src.app.core.db.expansao import carregar_por_ids
+from src.app.core.db.instrumentation import instrumentar
+from src.app.core.db.pagination import contar_total, encode_cursor, keyset_filter, keyset_sort, next_cursor
+from src.app.core.disponibilidade import ConflitoDeReserva, indice_disponibilidade, para_utc
 from src.app.models.contrato import Contrato
-from src.app.dtos.contrato_dto import ContratoDTO
-from src.app.models.pagination_result import PaginationResult
+from src.app.models.pagamento import Pagamento
+from src.app.models.usuario import Usuario
+from src.app.models.veiculo import Veiculo
+from src.app.dtos.contrato_dto import ContratoDTO, ContratoExpandidoDTO
+from src.app.dtos.pagamento_dto import PagamentoDTO
+from src.app.dtos.usuario_dto import UsuarioDTO
+from src.app.dtos.veiculo_dto import VeiculoDTO
+from src.app.models.pagination_result import PaginationResult, TotalMode
 
 
+# Tamanho máximo de cada lista $in de pagamento_id enviada ao banco
+_LOTE_IDS = 1000
+
+# Lotes de pagamento_id consultados ao mesmo tempo (o resto espera, sem ocupar o pool)
+_LOTES_SIMULTANEOS = 4
+
+
+@instrumentar
 class ContratoRepository:
+    indexes = [
+        # Também atende às consultas só por usuario_id (prefixo)
+        IndexModel([("usuario_id", ASCENDING), ("pagamento_id", ASCENDING)], name="usuario_pagamento"),
+        # Checagem de sobreposição de períodos por veículo (e consultas só por veiculo_id, pelo prefixo)
+        IndexModel([("veiculo_id", ASCENDING), ("data_inicio", ASCENDING)], name="veiculo_id"),
+        IndexModel([("pagamento_id", ASCENDING)], name="pagamento_id"),
+        IndexModel([("data_inicio", ASCENDING), ("_id", ASCENDING)], name="data_inicio_id"),
+    ]
+
+    write_concern = None
+
+    # Segundos que um documento lido por _id fica no cache (CACHE_TTL_CONTRATOS sobrescreve)
+    cache_ttl = 30
+
+    # Relações que podem ser embutidas com ?expand=: campo de referência, coleção e conversão para DTO
+    relacoes = {
+        "usuario": ("usuario_id", "usuarios", lambda documento: UsuarioDTO.from_model(Usuario(**documento))),
+        "veiculo": ("veiculo_id", "veiculos", lambda documento: VeiculoDTO.from_model(Veiculo(**documento))),
+        "pagamento": ("pagamento_id", "pagamentos", lambda documento: PagamentoDTO.from_model(Pagamento(**documento))),
+    }
+
     def __init__(self):
         self.logger = logging.getLogger("app_logger.repositories.contrato_repository")
-        self.collection = database.get_collection("contratos")
+        self.collection = database.get_collection("contratos", self.write_concern)
 
     async def create(self, contrato_dto: ContratoDTO) -> Optional[ContratoDTO]:
         try:
-            contrato_dict = contrato_dto.model_dump(by_alias=True)
-            contrato_dict['usuario_id'] = ObjectId(contrato_dict['usuario_id'])
-            contrato_dict['veiculo_id'] = ObjectId(contrato_dict['veiculo_id'])
-            if contrato_dict.get('pagamento_id'):
-                contrato_dict['pagamento_id'] = ObjectId(contrato_dict['pagamento_id'])
-                
-            new_contrato = await self.collection.insert_one(contrato_dict)
-            contrato_created = await self.collection.find_one({"_id": new_contrato.inserted_id})
-
-            if not contrato_created:
-                self.logger.error("Error creating contract: Contract not found after insertion.")
-                return None
-
-            return ContratoDTO.from_model(Contrato(**contrato_created))
+            contrato_dict = self.to_document(contrato_dto)
+            # Checagem e gravação sob o lock do veículo: dois pedidos simultâneos não reservam o mesmo período
+            async with indice_disponibilidade.travar(contrato_dict["veiculo_id"]):
+                await indice_disponibilidade.verificar(contrato_dict)
+                contrato_dict["_id"] = await inserir_um(self.collection, contrato_dict)
+                indice_disponibilidade.adicionar(contrato_dict)
+            invalidar_analises("contratos")
+            if contrato_dict.get("pagamento_id"):
+                await atualizar_saldos_usuarios([contrato_dict["usuario_id"]])
+
+            return ContratoDTO.from_model(Contrato(**contrato_dict))
+        except ConflitoDeReserva:
+            raise
         except Exception as e:
-            self.logger.error(f"Error creating contract: {e}")
+            self.logger.error("Error creating contract: %s", e)
             return None
 
-    async def get_by_id(self, contrato_id: str) -> Optional[ContratoDTO]:
-        try:
-            _id = ObjectId(contrato_id)
-            contrato = await self.collection.find_one({"_id": _id})
+    async def create_many(self, documentos: List[dict]) -> List[Tuple[int, str]]:
+        """Insere os contratos cujo período não sobrepõe outro contrato do mesmo veículo; os demais voltam como falha."""
+        aceitos, posicoes, falhas = [], [], []
+        for posicao, documento in enumerate(documentos):
+            # O _id vem antes do insert para que o período entre no índice e barre os próximos do lote
+            documento.setdefault("_id", ObjectId())
+            async with indice_disponibilidade.travar(documento["veiculo_id"]):
+                try:
+                    await indice_disponibilidade.verificar(documento)
+                except ConflitoDeReserva as e:
+                    falhas.append((posicao, str(e)))
+                    continue
+                indice_disponibilidade.adicionar(documento)
+            aceitos.append(documento)
+            posicoes.append(posicao)
+
+        erros = await inserir_em_lote(self.collection, aceitos)
+        for posicao_lote, _ in erros:
+            indice_disponibilidade.remover(aceitos[posicao_lote])
+        falhas = sorted(falhas + [(posicoes[posicao_lote], mensagem) for posicao_lote, mensagem in erros])
+
+        invalidar_analises("contratos")
+        rejeitados = {posicao for posicao, _ in falhas}
+        await atualizar_saldos_usuarios(
+            documento["usuario_id"] for posicao, documento in enumerate(documentos)
+            if documento.get("pagamento_id") and posicao not in rejeitados
+        )
+        return falhas
 
-            if not contrato:
-                return None
+    def to_document(self, contrato_dto: ContratoDTO) -> dict:
+        contrato_dict = contrato_dto.model_dump(by_alias=True, exclude={"id"})
+        contrato_dict['usuario_id'] = ObjectId(contrato_dict['usuario_id'])
+        contrato_dict['veiculo_id'] = ObjectId(contrato_dict['veiculo_id'])
+        if contrato_dict.get('pagamento_id'):
+            contrato_dict['pagamento_id'] = ObjectId(contrato_dict['pagamento_id'])
+        return contrato_dict
 
-            return ContratoDTO.from_model(Contrato(**contrato))
+    async def get_by_id(self, contrato_id: str) -> Optional[ContratoDTO]:
+        contrato = await self.get_documento_by_id(contrato_id)
+        return ContratoDTO.from_model(Contrato(**contrato)) if contrato else None
+
+    async def get_documento_by_id(self, contrato_id: str) -> Optional[dict]:
+        try:
+            return await buscar_documento(self.collection, ObjectId(contrato_id), cache_ttl("contratos", self.cache_ttl))
         except Exception as e:
-            self.logger.error(f"Error getting contract with ID {contrato_id}: {e}")
+            self.logger.error("Error getting contract with ID %s: %s", contrato_id, e)
             return None
 
-    async def get_all_no_pagination(self) -> List[ContratoDTO]:
-        contratos = await self.collection.find().to_list(length=1000)
-        return [ContratoDTO.from_model(Contrato(**contrato)) for contrato in contratos]
+    def cursor_exportacao(self):
+        return self.collection.find()
 
     async def get_all(self, data_inicial: Optional[datetime] = None, data_final: Optional[datetime] = None,
-                      page: int = 1, limit: int = 10) -> PaginationResult:
+                      page: int = 1, limit: int = 10, cursor: Optional[str] = None,
+                      total: TotalMode = TotalMode.EXACT, total_cap: int = 1000) -> PaginationResult:
+        result = await self.get_all_documentos(data_inicial, data_final, page, limit, cursor, total, total_cap)
+        result.data = [ContratoDTO.from_model(Contrato(**document)) for document in result.data]
+        return result
+
+    async def get_all_documentos(self, data_inicial: Optional[datetime] = None, data_final: Optional[datetime] = None,
+                                 page: int = 1, limit: int = 10, cursor: Optional[str] = None,
+                                 total: TotalMode = TotalMode.EXACT, total_cap: int = 1000) -> PaginationResult:
         query = {}
         if data_inicial and data_final:
             query['data_inicio'] = {'$gte': data_inicial}
@@ -62,97 +147,94 @@ class ContratoRepository:
         elif data_inicial:
             query['data_inicio'] = data_inicial
 
-        total_items = await self.collection.count_documents(query)
-        number_of_pages = (total_items + limit - 1) // limit
+        resultado = self.collection.find(keyset_filter(query, "data_inicio", cursor)).sort(keyset_sort("data_inicio"))
+        if not cursor:
+            resultado = resultado.skip((page - 1) * limit)
 
-        cursor = self.collection.find(query).skip((page - 1) * limit).limit(limit)
-        contratos = []
-        async for document in cursor:
-            contratos.append(ContratoDTO.from_model(Contrato(**document)))
-
-        return PaginationResult(
-            page=page,
-            limit=limit,
-            total_items=total_items,
-            number_of_pages=number_of_pages,
-            data=contratos
+        # A contagem e a página são buscadas em paralelo
+        (total_items, capped), documentos = await asyncio.gather(
+            contar_total(self.collection, query, total, total_cap),
+            resultado.limit(limit).to_list(length=limit)
+        )
+        return PaginationResult.build(
+            page, limit, total_items, capped, documentos,
+            next_cursor=next_cursor(documentos, limit, "data_inicio"),
+            total_mode=total
         )
 
 
     async def get_contratos_by_usuario_id(self, usuario_id: str) -> List[ContratoDTO]:
-        contratos = []
-        async for document in self.collection.find({"usuario_id": ObjectId(usuario_id)}):
-            contratos.append(ContratoDTO.from_model(Contrato(**document)))
-        return contratos
+        documentos = await self.get_documentos_by_usuario_id(usuario_id)
+        return [ContratoDTO.from_model(Contrato(**document)) for document in documentos]
+
+    async def get_documentos_by_usuario_id(self, usuario_id: str) -> List[dict]:
+        return await self.collection.find({"usuario_id": ObjectId(usuario_id)}).to_list(length=None)
 
     
     async def search(self, placa: Optional[str] = None, nome_usuario: Optional[str] = None, page: int = 1,
-                     limit: int = 10) -> PaginationResult:
-        pipeline = []
-
-        if not placa and not nome_usuario:
-            pipeline.append({"$match": {}})
-
-        if placa:
-            pipeline.extend([
-                {"$lookup": {
-                    "from": "veiculos",
-                    "localField": "veiculo_id",
-                    "foreignField": "_id",
-                    "as": "veiculo"
-                }},
-                {"$unwind": {"path": "$veiculo", "preserveNullAndEmptyArrays": True}},
-                {"$match": {"veiculo.placa": placa}}
-            ])
-
-        if nome_usuario:
-            pipeline.extend([
-                {"$lookup": {
-                    "from": "usuarios",
-                    "localField": "usuario_id",
-                    "foreignField": "_id",
-                    "as": "usuario"
-                }},
-                {"$unwind": {"path": "$usuario", "preserveNullAndEmptyArrays": True}},
-                {"$match": {"usuario.nome": nome_usuario}}
-            ])
-
-        count_pipeline = pipeline + [{"$count": "total_items"}]
-        total_items_cursor = await self.collection.aggregate(count_pipeline).to_list(length=1)
-        total_items = total_items_cursor[0]["total_items"] if total_items_cursor else 0
-
-        # Paginação
-        pagination_pipeline = pipeline + [
-            {"$sort": {"_id": ASCENDING}},
-            {"$skip": (page - 1) * limit},
-            {"$limit": limit},
-            {"$project": self._project_contrato()}
-        ]
-
-        contratos = await self.collection.aggregate(pagination_pipeline).to_list(length=limit)
-        print(contratos)
-        number_of_pages = (total_items + limit - 1) // limit
+                     limit: int = 10, cursor: Optional[str] = None, total: TotalMode = TotalMode.EXACT,
+                     total_cap: int = 1000) -> PaginationResult:
+        filtro = await self._resolver_filtro_busca(placa, nome_usuario)
+        if filtro is None:
+            total_items = None if total == TotalMode.NONE else 0
+            return PaginationResult.build(page, limit, total_items, False, [], total_mode=total)
+
+        pipeline, facetado = self._pipeline_busca(filtro, page, limit, cursor, total)
+        if facetado:
+            resultado = await self.collection.aggregate(pipeline).to_list(length=1)
+            contratos = resultado[0]["data"] if resultado else []
+            total_items = resultado[0]["total"][0]["total_items"] if resultado and resultado[0]["total"] else 0
+            capped = False
+        else:
+            (total_items, capped), contratos = await asyncio.gather(
+                contar_total(self.collection, filtro, total, total_cap),
+                self.collection.aggregate(pipeline).to_list(length=limit)
+            )
 
         for contrato in contratos:
-            contrato["_id"] = str(contrato["_id"])
-            if "usuario_id" in contrato and isinstance(contrato["usuario_id"], ObjectId):
-                contrato["usuario_id"] = str(contrato["usuario_id"])
-            if "veiculo_id" in contrato and isinstance(contrato["veiculo_id"], ObjectId):
-                contrato["veiculo_id"] = str(contrato["veiculo_id"])
-            if "pagamento_id" in contrato and isinstance(contrato["pagamento_id"], ObjectId):
-                contrato["pagamento_id"] = str(contrato["pagamento_id"])
-
-        print("contratos", contratos)
-
-        return PaginationResult(
-            page=page,
-            limit=limit,
-            total_items=total_items,
-            number_of_pages=number_of_pages,
-            data=contratos
+            for campo in ("usuario_id", "veiculo_id", "pagamento_id"):
+                if isinstance(contrato.get(campo), ObjectId):
+                    contrato[campo] = str(contrato[campo])
+
+        return PaginationResult.build(
+            page, limit, total_items, capped, contratos,
+            next_cursor=next_cursor(contratos, limit, "_id"),
+            total_mode=total
         )
 
+    def _pipeline_busca(self, filtro: dict, page: int, limit: int, cursor: Optional[str],
+                        total: TotalMode) -> Tuple[List[dict], bool]:
+        """Pipeline da busca; o segundo valor indica se a contagem vem junto, no $facet."""
+        # Paginação: com cursor, a busca começa pelo índice de _id logo após o último item visto
+        pagina = [{"$match": keyset_filter({}, "_id", cursor)}] if cursor else [{"$skip": (page - 1) * limit}]
+        pagina += [{"$limit": limit}, {"$project": self._project_contrato()}]
+
+        if filtro and total == TotalMode.EXACT:
+            # Filtrado pelos índices de usuario_id/veiculo_id: página e contagem numa única ida ao banco.
+            # Só no modo exato: o $facet consome tudo o que o $match produz, e um $limit dentro do ramo
+            # da contagem não evita isso; os outros modos contam à parte, com count_documents limitado
+            return [
+                {"$match": filtro},
+                {"$sort": {"_id": ASCENDING}},
+                {"$facet": {"data": pagina, "total": [{"$count": "total_items"}]}},
+            ], True
+        # Sem $facet a página vem do índice de _id e a contagem, em paralelo, segue o modo pedido
+        return ([{"$match": filtro}] if filtro else []) + [{"$sort": {"_id": ASCENDING}}] + pagina, False
+
+    @cache_analitico("contratos", "veiculos", "pagamentos")
     async def get_contratos_by_veiculo_marca_pagamento_pago(self, marca: str, pagamento_pago: Optional[bool] = None) -> List[ContratoDTO]:
+        pipeline = self._pipeline_marca(marca, pagamento_pago)
+        contratos = await self.collection.aggregate(pipeline).to_list(length=1000)
+        return [ContratoDTO.from_model(Contrato(
+            id=ObjectId(contrato["_id"]) if ObjectId.is_valid(contrato["_id"]) else None,
+            usuario_id=ObjectId(contrato["usuario_id"]) if ObjectId.is_valid(contrato["usuario_id"]) else None,
+            veiculo_id=ObjectId(contrato["veiculo_id"]) if ObjectId.is_valid(contrato["veiculo_id"]) else None,
+            pagamento_id=ObjectId(contrato["pagamento_id"]) if contrato.get("pagamento_id") and ObjectId.is_valid(contrato["pagamento_id"]) else None,
+            data_inicio=contrato["data_inicio"],
+            data_fim=contrato["data_fim"]
+        )) for contrato in contratos]
+
+    def _pipeline_marca(self, marca: str, pagamento_pago: Optional[bool]) -> List[dict]:
         pipeline = [
             {"$lookup": {"from": "veiculos", "localField": "veiculo_id", "foreignField": "_id", "as": "veiculo"}},
             {"$unwind": "$veiculo"},
@@ -168,64 +250,282 @@ class ContratoRepository:
 
         # Ajuste final do pipeline para remover os arrays e projetar apenas os campos necessários para o formato Contrato
         pipeline.extend([{"$project": self._project_contrato()}])
-
-        contratos = await self.collection.aggregate(pipeline).to_list(length=1000)
-        return [ContratoDTO.from_model(Contrato(
-            id=ObjectId(contrato["_id"]) if ObjectId.is_valid(contrato["_id"]) else None,
-            usuario_id=ObjectId(contrato["usuario_id"]) if ObjectId.is_valid(contrato["usuario_id"]) else None,
-            veiculo_id=ObjectId(contrato["veiculo_id"]) if ObjectId.is_valid(contrato["veiculo_id"]) else None,
-            pagamento_id=ObjectId(contrato["pagamento_id"]) if contrato.get("pagamento_id") and ObjectId.is_valid(contrato["pagamento_id"]) else None,
-            data_inicio=contrato["data_inicio"],
-            data_fim=contrato["data_fim"]
-        )) for contrato in contratos]
+        return pipeline
 
     async def get_contratos_by_pagamento_vencimento_month_and_usuario_id(self, vencimento_month: datetime, usuario_id: Optional[str] = None) -> List[ContratoDTO]:
-        vencimento_inicio = vencimento_month.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        vencimento_fim = (vencimento_inicio + timedelta(days=31)).replace(day=1)
-
-        pipeline = [
-            {"$lookup": {"from": "pagamentos", "localField": "pagamento_id", "foreignField": "_id", "as": "pagamento"}},
-            {"$unwind": "$pagamento"},
-            {"$match": {"pagamento.vencimento": {"$gte": vencimento_inicio, "$lte": vencimento_fim}}}
-        ]
-
+        mes = para_utc(vencimento_month)
+        meses = await self.get_contratos_by_pagamento_vencimento_months((mes,), usuario_id)
+        return meses[mes.strftime("%Y-%m")]
+
+    @cache_analitico("contratos", "pagamentos")
+    async def get_contratos_by_pagamento_vencimento_months(self, meses: Tuple[datetime, ...], usuario_id: Optional[str] = None) -> Dict[str, List[ContratoDTO]]:
+        """Contratos cujo pagamento vence em cada mês, agrupados por "AAAA-MM".
+
+        Com usuario_id, parte dos contratos do usuário (índice usuario_pagamento) e confere o vencimento
+        só dos pagamentos deles. Sem usuario_id, percorre os pagamentos dos meses (índice vencimento_id)
+        em lotes de _LOTE_IDS, cada lote virando uma consulta por pagamento_id enquanto o cursor segue;
+        nos dois casos só os ids do lote em andamento ficam em memória, nunca os de todos os meses.
+        """
+        # Os vencimentos estão em UTC sem fuso: o mês pedido é convertido antes de virar chave e intervalo
+        intervalos = {para_utc(mes).strftime("%Y-%m"): self._intervalo_mes(para_utc(mes)) for mes in meses}
+        resultado = {mes: [] for mes in sorted(intervalos)}
         if usuario_id:
-            pipeline.extend([{ "$match": {"usuario_id": ObjectId(usuario_id)} }])
-
-        # Ajuste final do pipeline para remover os arrays e projetar apenas os campos necessários para o formato Contrato
-        pipeline.extend([{"$project": self._project_contrato()}])
-
-        contratos = await self.collection.aggregate(pipeline).to_list(length=1000)
-        return [ContratoDTO.from_model(Contrato(
-            id=ObjectId(contrato["_id"]) if ObjectId.is_valid(contrato["_id"]) else None,
-            usuario_id=ObjectId(contrato["usuario_id"]) if ObjectId.is_valid(contrato["usuario_id"]) else None,
-            veiculo_id=ObjectId(contrato["veiculo_id"]) if ObjectId.is_valid(contrato["veiculo_id"]) else None,
-            pagamento_id=ObjectId(contrato["pagamento_id"]) if contrato.get("pagamento_id") and ObjectId.is_valid(contrato["pagamento_id"]) else None,
-            data_inicio=contrato["data_inicio"],
-            data_fim=contrato["data_fim"]
-        )) for contrato in contratos]
+            await self._contratos_usuario_por_vencimento(ObjectId(usuario_id), intervalos, resultado)
+        else:
+            await self._contratos_por_vencimento(intervalos, resultado)
+        for contratos in resultado.values():
+            contratos.sort(key=lambda contrato: contrato.id)
+        return resultado
+
+    async def _contratos_usuario_por_vencimento(self, usuario_id: ObjectId, intervalos: Dict[str, Tuple[datetime, datetime]],
+                                                resultado: Dict[str, List[ContratoDTO]]):
+        contratos = self.collection.find({"usuario_id": usuario_id, "pagamento_id": {"$ne": None}})
+        por_pagamento: Dict[ObjectId, List[dict]] = {}
+        async for contrato in contratos:
+            por_pagamento.setdefault(contrato["pagamento_id"], []).append(contrato)
+
+        for ids in self._lotes(por_pagamento):
+            pagamentos = database.get_collection("pagamentos").find(
+                {"_id": {"$in": ids}, **self._filtro_vencimentos(intervalos)}, {"_id": 1, "vencimento": 1}
+            )
+            async for pagamento in pagamentos:
+                mes = pagamento["vencimento"].strftime("%Y-%m")
+                for contrato in por_pagamento[pagamento["_id"]]:
+                    resultado[mes].append(ContratoDTO.from_model(Contrato(**contrato)))
+
+    async def _contratos_por_vencimento(self, intervalos: Dict[str, Tuple[datetime, datetime]],
+                                        resultado: Dict[str, List[ContratoDTO]]):
+        vagas = asyncio.Semaphore(_LOTES_SIMULTANEOS)
+        tarefas: List[asyncio.Future] = []
+
+        async def _buscar(mes_do_pagamento: Dict[ObjectId, str]):
+            try:
+                documentos = self.collection.find({"pagamento_id": {"$in": list(mes_do_pagamento)}})
+                async for documento in documentos:
+                    resultado[mes_do_pagamento[documento["pagamento_id"]]].append(ContratoDTO.from_model(Contrato(**documento)))
+            finally:
+                vagas.release()
+
+        async def _despachar(mes_do_pagamento: Dict[ObjectId, str]):
+            # Com _LOTES_SIMULTANEOS lotes em andamento, o cursor de pagamentos espera
+            await vagas.acquire()
+            tarefas.append(asyncio.ensure_future(_buscar(mes_do_pagamento)))
+
+        # Consulta coberta pelo índice (vencimento, _id): só as chaves do índice são lidas
+        pagamentos = database.get_collection("pagamentos").find(
+            self._filtro_vencimentos(intervalos), {"_id": 1, "vencimento": 1}
+        ).batch_size(_LOTE_IDS)
+        try:
+            lote: Dict[ObjectId, str] = {}
+            async for pagamento in pagamentos:
+                lote[pagamento["_id"]] = pagamento["vencimento"].strftime("%Y-%m")
+                if len(lote) >= _LOTE_IDS:
+                    await _despachar(lote)
+                    lote = {}
+            if lote:
+                await _despachar(lote)
+            await asyncio.gather(*tarefas)
+        except BaseException:
+            for tarefa in tarefas:
+                tarefa.cancel()
+            raise
+
+    @staticmethod
+    def _filtro_vencimentos(intervalos: Dict[str, Tuple[datetime, datetime]]) -> dict:
+        return {"$or": [{"vencimento": {"$gte": inicio, "$lt": fim}} for inicio, fim in intervalos.values()]}
+
+    @staticmethod
+    def _intervalo_mes(mes: datetime) -> Tuple[datetime, datetime]:
+        inicio = mes.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        return inicio, (inicio + timedelta(days=32)).replace(day=1)
+
+    @staticmethod
+    def _lotes(ids: Iterable[ObjectId]) -> List[List[ObjectId]]:
+        ids = list(ids)
+        return [ids[i:i + _LOTE_IDS] for i in range(0, len(ids), _LOTE_IDS)]
 
     async def update(self, contrato_id: str, contrato_dto: ContratoDTO) -> Optional[ContratoDTO]:
         try:
-            contrato = contrato_dto.to_model()
-            contrato_dict = contrato.model_dump(by_alias=True)
-            update_result = await self.collection.update_one({"_id": ObjectId(contrato_id)}, {"$set": contrato_dict})
-            if update_result.modified_count > 0:
+            contrato_dict = self.to_document(contrato_dto)
+            anterior = None
+            while True:
+                atual = await self.collection.find_one({"_id": ObjectId(contrato_id)}, {"veiculo_id": 1})
+                if atual is None:
+                    break
+                # A agenda do veículo antigo também muda: os dois locks, em ordem, como em create
+                async with indice_disponibilidade.travar(atual["veiculo_id"], contrato_dict["veiculo_id"]):
+                    await indice_disponibilidade.verificar(contrato_dict, ignorar=ObjectId(contrato_id))
+                    # Versão anterior: o usuário antigo também precisa ter o saldo recalculado. O filtro pelo
+                    # veículo lido garante que ele é o que está travado; se mudou nesse meio tempo, relê
+                    anterior = await self.collection.find_one_and_update(
+                        {"_id": ObjectId(contrato_id), "veiculo_id": atual["veiculo_id"]},
+                        {"$set": contrato_dict},
+                        projection={"usuario_id": 1, "veiculo_id": 1, "pagamento_id": 1},
+                        return_document=ReturnDocument.BEFORE
+                    )
+                    if anterior:
+                        indice_disponibilidade.remover(anterior)
+                        indice_disponibilidade.adicionar({**contrato_dict, "_id": anterior["_id"]})
+                        break
+            invalidar_documento(self.collection, ObjectId(contrato_id))
+            invalidar_analises("contratos")
+            if anterior:
+                if anterior.get("pagamento_id") or contrato_dict.get("pagamento_id"):
+                    await atualizar_saldos_usuarios([anterior.get("usuario_id"), contrato_dict.get("usuario_id")])
                 return await self.get_by_id(contrato_id)  # Retorna o contrato atualizado
             else:
                 return None
+        except ConflitoDeReserva:
+            raise
         except Exception as e:
-            self.logger.error(f"Erro ao atualizar contrato com ID {contrato_id}: {e}")
+            self.logger.error("Erro ao atualizar contrato com ID %s: %s", contrato_id, e)
             return None
 
     async def delete(self, contrato_id: str) -> bool:
-        result = await self.collection.delete_one({"_id": ObjectId(contrato_id)})
-        return result.deleted_count > 0
+        removido = await self.collection.find_one_and_delete(
+            {"_id": ObjectId(contrato_id)}, projection={"usuario_id": 1, "veiculo_id": 1, "pagamento_id": 1}
+        )
+        invalidar_documento(self.collection, ObjectId(contrato_id))
+        invalidar_analises("contratos")
+        if removido:
+            indice_disponibilidade.remover(removido)
+        if removido and removido.get("pagamento_id"):
+            await atualizar_saldos_usuarios([removido.get("usuario_id")])
+        return removido is not None
+
+    async def expandir(self, contratos: List[Any], expand: Set[str]) -> List[Any]:
+        """Embute as relações pedidas em cada contrato com uma consulta $in por relação.
+
+        Aceita ContratoDTO (devolve ContratoExpandidoDTO) ou os dicionários da busca (devolve dicionários).
+        """
+        nomes = sorted(expand)
+        if not nomes or not contratos:
+            return contratos
+
+        def referencia(contrato, campo: str) -> Optional[str]:
+            valor = contrato.get(campo) if isinstance(contrato, dict) else getattr(contrato, campo)
+            return str(valor) if valor else None
+
+        carregados = await asyncio.gather(*(
+            carregar_por_ids(self.relacoes[nome][1], [referencia(contrato, self.relacoes[nome][0]) for contrato in contratos])
+            for nome in nomes
+        ))
+
+        expandidos = []
+        for contrato in contratos:
+            embutidos = {}
+            for nome, documentos in zip(nomes, carregados):
+                campo, _, converter = self.relacoes[nome]
+                valor = referencia(contrato, campo)
+                documento = documentos.get(ObjectId(valor)) if valor and ObjectId.is_valid(valor) else None
+                embutidos[nome] = converter(documento) if documento else None
+
+            if isinstance(contrato, dict):
+                expandidos.append({**contrato, **embutidos})
+            else:
+                expandidos.append(ContratoExpandidoDTO(**contrato.model_dump(), **embutidos))
+        return expandidos
 
     async def get_quantidade_contratos(self) -> int:
         total_contratos = await self.collection.count_documents({})
         return total_contratos
 
+    async def _resolver_filtro_busca(self, placa: Optional[str], nome_usuario: Optional[str]) -> Optional[dict]:
+        """Traduz placa e nome do usuário em IDs pelos índices de veiculos/usuarios.
+
+        Retorna o filtro de contratos, ou None quando algum dos critérios não encontra nada.
+        """
+        async def _ids(collection_name: str, query: dict) -> List[ObjectId]:
+            documentos = database.get_collection(collection_name).find(query, {"_id": 1})
+            return [documento["_id"] async for documento in documentos]
+
+        consultas = []
+        if placa:
+            consultas.append(("veiculo_id", _ids("veiculos", {"placa": placa})))
+        if nome_usuario:
+            consultas.append(("usuario_id", _ids("usuarios", {"nome": nome_usuario})))
+        ids = await asyncio.gather(*(consulta for _, consulta in consultas))
+
+        filtro = {}
+        for (campo, _), encontrados in zip(consultas, ids):
+            if not encontrados:
+                return None
+            filtro[campo] = encontrados[0] if len(encontrados) == 1 else {"$in": encontrados}
+        return filtro
+
+    def consultas_principais(self, amostra: Optional[Dict[str, Any]] = None) -> List[dict]:
+        """Consultas emitidas pelo repositório; `amostra` troca os valores fictícios por dados reais."""
+        amostra = amostra or {}
+        usuario_id = amostra.get("usuario_id", ObjectId())
+        veiculo_id = amostra.get("veiculo_id", ObjectId())
+        data = amostra.get("data", datetime(2024, 1, 1))
+        inicio, fim = self._intervalo_mes(data)
+        cursor = encode_cursor(data, amostra.get("contrato_id", ObjectId()))
+        return [
+            {
+                "nome": "ContratoRepository.get_all",
+                "filtro": {"data_inicio": {"$gte": inicio}, "data_fim": {"$lte": fim}},
+                "ordenacao": keyset_sort("data_inicio"),
+                "limite": 10
+            },
+            {
+                "nome": "ContratoRepository.get_all[cursor]",
+                "filtro": keyset_filter({}, "data_inicio", cursor),
+                "ordenacao": keyset_sort("data_inicio"),
+                "limite": 10
+            },
+            {"nome": "ContratoRepository.get_contratos_by_usuario_id", "filtro": {"usuario_id": usuario_id}},
+            {
+                "nome": "ContratoRepository.create[conflitos]",
+                "filtro": {"veiculo_id": veiculo_id, "data_inicio": {"$lt": fim}, "data_fim": {"$gt": inicio}},
+                "projecao": {"_id": 1}
+            },
+            {
+                "nome": "ContratoRepository.get_contratos_by_pagamento_vencimento_months[pagamentos]",
+                "colecao": "pagamentos",
+                "filtro": self._filtro_vencimentos({"mes": (inicio, fim)}),
+                "projecao": {"_id": 1, "vencimento": 1}
+            },
+            {
+                "nome": "ContratoRepository.get_contratos_by_pagamento_vencimento_months",
+                "filtro": {"pagamento_id": {"$in": [amostra.get("pagamento_id", ObjectId()), ObjectId()]}}
+            },
+            {
+                "nome": "ContratoRepository.get_contratos_by_pagamento_vencimento_months[usuario_id]",
+                "filtro": {"usuario_id": usuario_id, "pagamento_id": {"$ne": None}}
+            },
+            {
+                "nome": "ContratoRepository.get_contratos_by_pagamento_vencimento_months[usuario_id,pagamentos]",
+                "colecao": "pagamentos",
+                "filtro": {"_id": {"$in": [amostra.get("pagamento_id", ObjectId()), ObjectId()]}, **self._filtro_vencimentos({"mes": (inicio, fim)})},
+                "projecao": {"_id": 1, "vencimento": 1}
+            },
+            {"nome": "ContratoRepository.search[ids_placa]", "colecao": "veiculos", "filtro": {"placa": amostra.get("placa", "ABC0000")}, "projecao": {"_id": 1}},
+            {"nome": "ContratoRepository.search[ids_nome]", "colecao": "usuarios", "filtro": {"nome": amostra.get("nome", "Usuario")}, "projecao": {"_id": 1}},
+            {
+                "nome": "ContratoRepository.search[placa]",
+                "pipeline": self._pipeline_busca({"veiculo_id": veiculo_id}, 1, 10, None, TotalMode.EXACT)[0]
+            },
+            {
+                "nome": "ContratoRepository.search[nome_usuario]",
+                "pipeline": self._pipeline_busca({"usuario_id": {"$in": [usuario_id, ObjectId()]}}, 1, 10, None, TotalMode.EXACT)[0]
+            },
+            {
+                "nome": "ContratoRepository.search[placa,nome_usuario,capped]",
+                "pipeline": self._pipeline_busca({"veiculo_id": veiculo_id, "usuario_id": usuario_id}, 1, 10, None, TotalMode.CAPPED)[0]
+            },
+            {
+                "nome": "ContratoRepository.search[sem_filtro,cursor]",
+                "pipeline": self._pipeline_busca({}, 1, 10, encode_cursor(None, amostra.get("contrato_id", ObjectId())), TotalMode.NONE)[0]
+            },
+            {
+                "nome": "ContratoRepository.get_contratos_by_veiculo_marca_pagamento_pago",
+                "pipeline": self._pipeline_marca(amostra.get("marca", "Fiat"), True),
+                "varredura": True
+            },
+            {"nome": "ContratoRepository.get_quantidade_contratos", "filtro": {}, "varredura": True},
+        ]
+
     def _project_contrato(self):
         return {
             "_id": {"$toString": "$_id"},
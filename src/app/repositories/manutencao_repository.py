@@ -1,50 +1,82 @@
 import logging
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Tuple
 
 from bson import ObjectId
-from pymongo import ReturnDocument
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
 from pymongo.errors import DuplicateKeyError
 
+from src.app.core.cache import buscar_documento, cache_analitico, cache_ttl, invalidar_analises, invalidar_documento
+from src.app.core.db.bulk import inserir_em_lote
+from src.app.core.db.coalescencia import inserir_um
 from src.app.core.db.database import database  
+from src.app.core.db.derivados import TIPOS_MANUTENCAO, atualizar_custos_manutencao, atualizar_tipos_manutencao
+from src.app.core.db.instrumentation import instrumentar
+from src.app.core.db.pagination import encode_cursor, keyset_filter, keyset_sort
+from src.app.core.logger import resumo
+from src.app.core.texto import normalizar
 from src.app.models.manutencao import Manutencao 
 from src.app.dtos.manutencao_dto import ManutencaoDTO
 
 logger = logging.getLogger('app_logger.manutencao_repository')
 
+@instrumentar
 class ManutencaoRepository:
-   
+    indexes = [
+        IndexModel([("data", ASCENDING), ("_id", ASCENDING)], name="data_id"),
+        IndexModel([("tipo_manutencao", ASCENDING), ("data", ASCENDING), ("_id", ASCENDING)], name="tipo_manutencao_data_id"),
+        # Busca pelo catálogo de tipos: só _id é lido, direto do índice
+        IndexModel([("tipo_manutencao_chave", ASCENDING), ("_id", ASCENDING)], name="tipo_manutencao_chave_id"),
+    ]
+
+    write_concern = None
+
+    # Segundos que um documento lido por _id fica no cache (CACHE_TTL_MANUTENCOES sobrescreve)
+    cache_ttl = 60
+
     def __init__(self):
-        self.collection = database.get_collection("manutencoes")
+        self.collection = database.get_collection("manutencoes", self.write_concern)
 
     async def create(self, manutencao: Manutencao) -> Optional[ManutencaoDTO]:
         try:
-            manutencao_dict = manutencao.dict(by_alias=True, exclude={"id"})
-            nova_manutencao = await self.collection.insert_one(manutencao_dict)
-            manutencao_criada = await self.collection.find_one({"_id": nova_manutencao.inserted_id})
+            manutencao_dict = self.to_document(manutencao)
+            manutencao_dict["_id"] = await inserir_um(self.collection, manutencao_dict)
+            invalidar_analises("manutencoes")
+            await atualizar_tipos_manutencao(adicionadas=[manutencao_dict])
 
-            if not manutencao_criada:
-                logger.error("Erro ao criar manutenção: Manutenção não encontrada após a inserção.")
-                return None
-
-            logger.info(f"Manutenção criada com sucesso: {manutencao_criada}")
-            return ManutencaoDTO.from_model(Manutencao(**manutencao_criada))
+            logger.info("Manutenção criada com sucesso: %s", resumo(manutencao_dict))
+            return ManutencaoDTO.from_model(Manutencao(**manutencao_dict))
 
         except DuplicateKeyError as e:
-            logger.error(f"Erro ao criar manutenção: Manutenção duplicada - {e}")
+            logger.error("Erro ao criar manutenção: Manutenção duplicada - %s", e)
             raise ValueError("Erro ao criar manutenção: Manutenção duplicada") from e
         except Exception as e:
-            logger.error(f"Erro ao criar manutenção: {e}")
+            logger.error("Erro ao criar manutenção: %s", e)
             return None
 
+    async def create_many(self, documentos: List[dict]) -> List[Tuple[int, str]]:
+        falhas = await inserir_em_lote(self.collection, documentos)
+        invalidar_analises("manutencoes")
+        falhos = {posicao for posicao, _ in falhas}
+        await atualizar_tipos_manutencao(adicionadas=[documento for posicao, documento in enumerate(documentos) if posicao not in falhos])
+        return falhas
+
+    def to_document(self, manutencao: Manutencao) -> dict:
+        manutencao_dict = manutencao.dict(by_alias=True, exclude={"id"})
+        manutencao_dict["tipo_manutencao_chave"] = normalizar(manutencao_dict["tipo_manutencao"])
+        return manutencao_dict
+
+    def cursor_exportacao(self):
+        return self.collection.find()
+
     async def get_all_no_pagination(self) -> List[ManutencaoDTO]:
         try:
             manutencoes = await self.collection.find().to_list(length=None)
-            logger.info(f"Manutenções listadas sem paginação: {manutencoes}")
+            logger.info("Manutenções listadas sem paginação: %s", resumo(manutencoes))
             result = [Manutencao(**manutencao) for manutencao in manutencoes]
             return [ManutencaoDTO.from_model(manutencao) for manutencao in result]
         except Exception as e:
-            logger.error(f"Erro ao listar manutenções sem paginação: {e}")
+            logger.error("Erro ao listar manutenções sem paginação: %s", e)
             return []
 
     async def get_all(
@@ -53,8 +85,25 @@ class ManutencaoRepository:
         data_final: Optional[datetime] = None,
         tipo_manutencao: Optional[str] = None,
         page: Optional[int] = 1,
-        limit: Optional[int] = 10
+        limit: Optional[int] = 10,
+        cursor: Optional[str] = None
     ) -> List[ManutencaoDTO]:
+        manutencoes = await self.get_all_documentos(data_inicial, data_final, tipo_manutencao, page, limit, cursor)
+        return [ManutencaoDTO.from_model(Manutencao(**manutencao)) for manutencao in manutencoes]
+
+    async def get_by_id(self, manutencao_id: str) -> Optional[ManutencaoDTO]:
+        manutencao = await self.get_documento_by_id(manutencao_id)
+        return ManutencaoDTO.from_model(Manutencao(**manutencao)) if manutencao else None
+
+    async def get_all_documentos(
+        self,
+        data_inicial: Optional[datetime] = None,
+        data_final: Optional[datetime] = None,
+        tipo_manutencao: Optional[str] = None,
+        page: Optional[int] = 1,
+        limit: Optional[int] = 10,
+        cursor: Optional[str] = None
+    ) -> List[dict]:
         try:
             filtro = {}
             if data_inicial and data_final:
@@ -64,106 +113,136 @@ class ManutencaoRepository:
             if tipo_manutencao:
                 filtro["tipo_manutencao"] = tipo_manutencao
 
-            logger.info(f"Buscando manutenções com filtros: {filtro}, página={page}, limite={limit}")
+            logger.info("Buscando manutenções com filtros: %s, página=%s, limite=%s", filtro, page, limit)
 
-            skip = (page - 1) * limit
-            manutencoes = await self.collection.find(filtro).skip(skip).limit(limit).to_list(length=limit)
+            resultado = self.collection.find(keyset_filter(filtro, "data", cursor)).sort(keyset_sort("data"))
+            if not cursor:
+                resultado = resultado.skip((page - 1) * limit)
+            manutencoes = await resultado.limit(limit).to_list(length=limit)
 
-            logger.info(f"Manutenções encontradas: {manutencoes}")
-            result = [Manutencao(**manutencao) for manutencao in manutencoes]
-            return [ManutencaoDTO.from_model(manutencao) for manutencao in result]
+            logger.info("Manutenções encontradas: %s", resumo(manutencoes))
+            return manutencoes
         except Exception as e:
-            logger.error(f"Erro ao buscar manutenções: {e}")
+            logger.error("Erro ao buscar manutenções: %s", e)
             return []
 
-    async def get_by_id(self, manutencao_id: str) -> Optional[ManutencaoDTO]:
+    async def get_documento_by_id(self, manutencao_id: str) -> Optional[dict]:
         try:
-            filtro = {"_id": ObjectId(manutencao_id)} if ObjectId.is_valid(manutencao_id) else {"_id": manutencao_id}
-            manutencao = await self.collection.find_one(filtro)
+            _id = ObjectId(manutencao_id) if ObjectId.is_valid(manutencao_id) else manutencao_id
+            manutencao = await buscar_documento(self.collection, _id, cache_ttl("manutencoes", self.cache_ttl))
 
             if not manutencao:
-                logger.warning(f"Manutenção com ID {manutencao_id} não encontrada")
+                logger.warning("Manutenção com ID %s não encontrada", manutencao_id)
                 return None
 
-            logger.info(f"Manutenção encontrada com ID {manutencao_id}: {manutencao}")
-            return ManutencaoDTO.from_model(Manutencao(**manutencao))
+            logger.info("Manutenção encontrada com ID %s: %s", manutencao_id, resumo(manutencao))
+            return manutencao
         except Exception as e:
-            logger.error(f"Erro ao buscar manutenção com ID {manutencao_id}: {e}")
+            logger.error("Erro ao buscar manutenção com ID %s: %s", manutencao_id, e)
             return None
 
     async def update(self, manutencao_id: str, manutencao: Manutencao) -> Optional[ManutencaoDTO]:
         try:
             if not ObjectId.is_valid(manutencao_id):
-                logger.warning(f"ID de manutenção inválido: {manutencao_id}")
+                logger.warning("ID de manutenção inválido: %s", manutencao_id)
                 return None
 
-            manutencao_dict = manutencao.dict(by_alias=True, exclude={"id"})
-            result = await self.collection.find_one_and_update(
+            manutencao_dict = self.to_document(manutencao)
+            # Versão anterior: o tipo antigo perde uma manutenção no catálogo
+            anterior = await self.collection.find_one_and_update(
                 {"_id": ObjectId(manutencao_id)},
                 {"$set": manutencao_dict},
-                return_document=ReturnDocument.AFTER  
+                return_document=ReturnDocument.BEFORE
             )
-
-            if result:
-                logger.info(f"Manutenção atualizada com sucesso: {result}")
+            invalidar_documento(self.collection, ObjectId(manutencao_id))
+            invalidar_analises("manutencoes")
+
+            if anterior:
+                result = {**anterior, **manutencao_dict}
+                await atualizar_tipos_manutencao(removidas=[anterior], adicionadas=[result])
+                await atualizar_custos_manutencao(manutencao_id)
+                logger.info("Manutenção atualizada com sucesso: %s", resumo(result))
                 return ManutencaoDTO.from_model(Manutencao(**result))
             else:
-                logger.warning(f"Manutenção com ID {manutencao_id} não encontrada para atualização")
+                logger.warning("Manutenção com ID %s não encontrada para atualização", manutencao_id)
                 return None
         except Exception as e:
-            logger.error(f"Erro ao atualizar manutenção com ID {manutencao_id}: {e}")
+            logger.error("Erro ao atualizar manutenção com ID %s: %s", manutencao_id, e)
             return None
 
     async def delete(self, manutencao_id: str) -> bool:
         try:
             if not ObjectId.is_valid(manutencao_id):
-                logger.warning(f"ID de manutenção inválido: {manutencao_id}")
+                logger.warning("ID de manutenção inválido: %s", manutencao_id)
                 return False
 
-            resultado = await self.collection.delete_one({"_id": ObjectId(manutencao_id)})
-            if resultado.deleted_count > 0:
-                logger.info(f"Manutenção com ID {manutencao_id} deletada com sucesso")
+            removida = await self.collection.find_one_and_delete(
+                {"_id": ObjectId(manutencao_id)}, projection={"tipo_manutencao": 1, "tipo_manutencao_chave": 1}
+            )
+            invalidar_documento(self.collection, ObjectId(manutencao_id))
+            invalidar_analises("manutencoes")
+            if removida is not None:
+                await atualizar_tipos_manutencao(removidas=[removida])
+                await atualizar_custos_manutencao(manutencao_id)
+                logger.info("Manutenção com ID %s deletada com sucesso", manutencao_id)
                 return True
             else:
-                logger.warning(f"Manutenção com ID {manutencao_id} não encontrada para deleção")
+                logger.warning("Manutenção com ID %s não encontrada para deleção", manutencao_id)
                 return False
         except Exception as e:
-            logger.error(f"Erro ao deletar manutenção com ID {manutencao_id}: {e}")
+            logger.error("Erro ao deletar manutenção com ID %s: %s", manutencao_id, e)
             return False
 
+    @cache_analitico(TIPOS_MANUTENCAO)
     async def get_tipos_manutencao_mais_frequentes(self) -> List[Dict[str, Any]]:
+        # Lê os contadores do catálogo tipos_manutencao, mantidos a cada escrita em manutencoes
         try:
-            pipeline = [
-                {
-                    "$group": {
-                        "_id": "$tipo_manutencao",
-                        "frequencia": {"$sum": 1}
-                    }
-                },
-                {
-                    "$project": {
-                        "_id": 0,  
-                        "tipo_manutencao": "$_id",
-                        "frequencia": 1
-                    }
-                },
-                {
-                    "$sort": {"frequencia": -1}
-                }
-            ]
-
-            resultados = await self.collection.aggregate(pipeline).to_list(length=None)
-            logger.info(f"Tipos de manutenção mais frequentes: {resultados}")
+            tipos = database.get_collection(TIPOS_MANUTENCAO).find({}, {"nome": 1, "quantidade": 1}).sort("quantidade", DESCENDING)
+            resultados = [{"tipo_manutencao": tipo["nome"], "frequencia": tipo["quantidade"]} async for tipo in tipos]
+            logger.info("Tipos de manutenção mais frequentes: %s", resumo(resultados))
             return resultados
         except Exception as e:
-            logger.error(f"Erro ao buscar tipos de manutenção mais frequentes: {e}")
-            return []
+            logger.error("Erro ao buscar tipos de manutenção mais frequentes: %s", e)
+            # Sobe em vez de devolver []: o cache_analitico guardaria a lista vazia como resultado
+            raise
 
     async def get_quantidade_manutencoes(self) -> int:
         try:
             quantidade = await self.collection.count_documents({})
-            logger.info(f"Quantidade total de manutenções: {quantidade}")
+            logger.info("Quantidade total de manutenções: %s", quantidade)
             return quantidade
         except Exception as e:
-            logger.error(f"Erro ao contar quantidade de manutenções: {e}")
-            return 0
\ No newline at end of file
+            logger.error("Erro ao contar quantidade de manutenções: %s", e)
+            return 0
+
+    def consultas_principais(self, amostra: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        amostra = amostra or {}
+        inicio = amostra.get("data", datetime(2024, 1, 1))
+        fim = inicio + timedelta(days=31)
+        return [
+            {
+                "nome": "ManutencaoRepository.get_all",
+                "filtro": {"data": {"$gte": inicio, "$lte": fim}},
+                "ordenacao": keyset_sort("data"),
+                "limite": 10
+            },
+            {
+                "nome": "ManutencaoRepository.get_all[tipo_manutencao]",
+                "filtro": {"tipo_manutencao": amostra.get("tipo_manutencao", "Revisão")},
+                "ordenacao": keyset_sort("data"),
+                "limite": 10
+            },
+            {
+                "nome": "ManutencaoRepository.get_all[cursor]",
+                "filtro": keyset_filter({}, "data", encode_cursor(inicio, amostra.get("manutencao_id", ObjectId()))),
+                "ordenacao": keyset_sort("data"),
+                "limite": 10
+            },
+            {
+                "nome": "ManutencaoRepository.get_tipos_manutencao_mais_frequentes",
+                "colecao": TIPOS_MANUTENCAO,
+                "filtro": {},
+                "ordenacao": [("quantidade", DESCENDING)]
+            },
+            {"nome": "ManutencaoRepository.get_quantidade_manutencoes", "filtro": {}, "varredura": True},
+        ]
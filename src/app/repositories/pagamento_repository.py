@@ -1,53 +1,82 @@
 import logging
-from datetime import datetime
-from typing import Optional, List, Dict
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Tuple
 from typing import Any
 
 from bson import ObjectId
-from pymongo import ReturnDocument
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument, WriteConcern
 from pymongo.errors import DuplicateKeyError
 
+from src.app.core.cache import buscar_documento, cache_analitico, cache_ttl, invalidar_analises, invalidar_documento
+from src.app.core.db.bulk import inserir_em_lote
+from src.app.core.db.coalescencia import inserir_um
 from src.app.core.db.database import database
+from src.app.core.db.derivados import SALDOS_PENDENTES, atualizar_saldos_pagamento
+from src.app.core.db.instrumentation import instrumentar
+from src.app.core.db.pagination import encode_cursor, keyset_filter, keyset_sort
+from src.app.core.logger import resumo
 from src.app.dtos.pagamento_dto import PagamentoDTO  
 from src.app.models.pagamento import Pagamento
 
 logger = logging.getLogger('app_logger.pagamento_repository')
 
 
+@instrumentar
 class PagamentoRepository:
+    indexes = [
+        IndexModel([("vencimento", ASCENDING), ("_id", ASCENDING)], name="vencimento_id"),
+        IndexModel(
+            [("pago", ASCENDING), ("vencimento", ASCENDING), ("_id", ASCENDING)],
+            name="pendentes_vencimento",
+            partialFilterExpression={"pago": False}
+        ),
+    ]
+
+    # Alto volume: confirmação apenas do primário, sem esperar o journal
+    write_concern = WriteConcern(w=1, j=False)
+
+    # Segundos que um documento lido por _id fica no cache (CACHE_TTL_PAGAMENTOS sobrescreve)
+    cache_ttl = 15
 
     def __init__(self):
-        self.collection = database.get_collection("pagamentos")
+        self.collection = database.get_collection("pagamentos", self.write_concern)
 
     async def create(self, pagamento: Pagamento) -> Optional[PagamentoDTO]:
         try:
-            pagamento_dict = pagamento.dict(by_alias=True, exclude={"id"})
-            novo_pagamento = await self.collection.insert_one(pagamento_dict)
-            pagamento_criado = await self.collection.find_one({"_id": novo_pagamento.inserted_id})
+            pagamento_dict = self.to_document(pagamento)
+            pagamento_dict["_id"] = await inserir_um(self.collection, pagamento_dict)
+            invalidar_analises("pagamentos")
 
-            if not pagamento_criado:
-                logger.error("Erro ao criar pagamento: Pagamento não encontrado após inserção")
-                return None
-
-            logger.info(f"Pagamento criado com sucesso: {pagamento_criado}")
-            pagamento = Pagamento(**pagamento_criado)
+            logger.info("Pagamento criado com sucesso: %s", resumo(pagamento_dict))
+            pagamento = Pagamento(**pagamento_dict)
             return PagamentoDTO.from_model(pagamento)
 
         except DuplicateKeyError as e:
-            logger.error(f"Erro ao criar pagamento: Pagamento duplicado - {e}")
+            logger.error("Erro ao criar pagamento: Pagamento duplicado - %s", e)
             raise ValueError("Erro ao criar pagamento: Pagamento duplicado") from e
         except Exception as e:
-            logger.error(f"Erro ao criar pagamento: {e}")
+            logger.error("Erro ao criar pagamento: %s", e)
             return None
 
+    async def create_many(self, documentos: List[dict]) -> List[Tuple[int, str]]:
+        falhas = await inserir_em_lote(self.collection, documentos)
+        invalidar_analises("pagamentos")
+        return falhas
+
+    def to_document(self, pagamento: Pagamento) -> dict:
+        return pagamento.dict(by_alias=True, exclude={"id"})
+
+    def cursor_exportacao(self):
+        return self.collection.find()
+
     async def get_all_no_pagination(self) -> List[PagamentoDTO]:
         try:
             pagamentos = await self.collection.find().to_list(length=None)
-            logger.info(f"Pagamentos listados sem paginação: {pagamentos}")
+            logger.info("Pagamentos listados sem paginação: %s", resumo(pagamentos))
             result = [Pagamento(**pagamento) for pagamento in pagamentos]
             return [PagamentoDTO.from_model(pagamento) for pagamento in result]
         except Exception as e:
-            logger.error(f"Erro ao listar pagamentos sem paginação: {e}")
+            logger.error("Erro ao listar pagamentos sem paginação: %s", e)
             return []
 
     async def get_all(
@@ -56,8 +85,25 @@ class PagamentoRepository:
         data_final: Optional[datetime] = None,
         pago: Optional[bool] = None,
         page: Optional[int] = 1,
-        limit: Optional[int] = 10
+        limit: Optional[int] = 10,
+        cursor: Optional[str] = None
     ) -> List[PagamentoDTO]:
+        pagamentos = await self.get_all_documentos(data_inicial, data_final, pago, page, limit, cursor)
+        return [PagamentoDTO.from_model(Pagamento(**pagamento)) for pagamento in pagamentos]
+
+    async def get_by_id(self, pagamento_id: str) -> Optional[PagamentoDTO]:
+        pagamento = await self.get_documento_by_id(pagamento_id)
+        return PagamentoDTO.from_model(Pagamento(**pagamento)) if pagamento else None
+
+    async def get_all_documentos(
+        self,
+        data_inicial: Optional[datetime] = None,
+        data_final: Optional[datetime] = None,
+        pago: Optional[bool] = None,
+        page: Optional[int] = 1,
+        limit: Optional[int] = 10,
+        cursor: Optional[str] = None
+    ) -> List[dict]:
         try:
             filtro = {}
             if data_inicial and data_final:
@@ -67,37 +113,38 @@ class PagamentoRepository:
             if pago is not None:
                 filtro["pago"] = pago
 
-            logger.info(f"Buscando pagamentos com filtros: {filtro}, página={page}, limite={limit}")
+            logger.info("Buscando pagamentos com filtros: %s, página=%s, limite=%s", filtro, page, limit)
 
-            skip = (page - 1) * limit
-            pagamentos = await self.collection.find(filtro).skip(skip).limit(limit).to_list(length=limit)
+            resultado = self.collection.find(keyset_filter(filtro, "vencimento", cursor)).sort(keyset_sort("vencimento"))
+            if not cursor:
+                resultado = resultado.skip((page - 1) * limit)
+            pagamentos = await resultado.limit(limit).to_list(length=limit)
 
-            logger.info(f"Pagamentos encontrados: {pagamentos}")
-            result = [Pagamento(**pagamento) for pagamento in pagamentos]
-            return [PagamentoDTO.from_model(pagamento) for pagamento in result]
+            logger.info("Pagamentos encontrados: %s", resumo(pagamentos))
+            return pagamentos
         except Exception as e:
-            logger.error(f"Erro ao buscar pagamentos: {e}")
+            logger.error("Erro ao buscar pagamentos: %s", e)
             return []
 
-    async def get_by_id(self, pagamento_id: str) -> Optional[PagamentoDTO]:
+    async def get_documento_by_id(self, pagamento_id: str) -> Optional[dict]:
         try:
-            filtro = {"_id": ObjectId(pagamento_id)} if ObjectId.is_valid(pagamento_id) else {"_id": pagamento_id}
-            pagamento = await self.collection.find_one(filtro)
+            _id = ObjectId(pagamento_id) if ObjectId.is_valid(pagamento_id) else pagamento_id
+            pagamento = await buscar_documento(self.collection, _id, cache_ttl("pagamentos", self.cache_ttl))
 
             if not pagamento:
-                logger.warning(f"Pagamento com ID {pagamento_id} não encontrado")
+                logger.warning("Pagamento com ID %s não encontrado", pagamento_id)
                 return None
 
-            logger.info(f"Pagamento encontrado com ID {pagamento_id}: {pagamento}")
-            return PagamentoDTO.from_model(Pagamento(**pagamento))
+            logger.info("Pagamento encontrado com ID %s: %s", pagamento_id, resumo(pagamento))
+            return pagamento
         except Exception as e:
-            logger.error(f"Erro ao buscar pagamento com ID {pagamento_id}: {e}")
+            logger.error("Erro ao buscar pagamento com ID %s: %s", pagamento_id, e)
             return None
 
     async def update(self, pagamento_id: str, pagamento: Pagamento) -> Optional[PagamentoDTO]:
         try:
             if not ObjectId.is_valid(pagamento_id):
-                logger.warning(f"ID de pagamento inválido: {pagamento_id}")
+                logger.warning("ID de pagamento inválido: %s", pagamento_id)
                 return None
 
             pagamento_dict = pagamento.dict(by_alias=True, exclude={"id"})
@@ -106,95 +153,103 @@ class PagamentoRepository:
                 {"$set": pagamento_dict},
                 return_document=ReturnDocument.AFTER
             )
+            invalidar_documento(self.collection, ObjectId(pagamento_id))
+            invalidar_analises("pagamentos")
 
             if result:
-                logger.info(f"Pagamento atualizado com sucesso: {result}")
+                await atualizar_saldos_pagamento(result["_id"])
+                logger.info("Pagamento atualizado com sucesso: %s", resumo(result))
                 pagamento = Pagamento(**result)
                 return PagamentoDTO.from_model(pagamento)
             else:
-                logger.warning(f"Pagamento com ID {pagamento_id} não encontrado para atualização")
+                logger.warning("Pagamento com ID %s não encontrado para atualização", pagamento_id)
                 return None
         except Exception as e:
-            logger.error(f"Erro ao atualizar pagamento com ID {pagamento_id}: {e}")
+            logger.error("Erro ao atualizar pagamento com ID %s: %s", pagamento_id, e)
             return None
 
     async def delete(self, pagamento_id: str) -> bool:
         try:
             if not ObjectId.is_valid(pagamento_id):
-                logger.warning(f"ID de pagamento inválido: {pagamento_id}")
+                logger.warning("ID de pagamento inválido: %s", pagamento_id)
                 return False
 
             resultado = await self.collection.delete_one({"_id": ObjectId(pagamento_id)})
+            invalidar_documento(self.collection, ObjectId(pagamento_id))
+            invalidar_analises("pagamentos")
             if resultado.deleted_count > 0:
-                logger.info(f"Pagamento com ID {pagamento_id} deletado com sucesso")
+                await atualizar_saldos_pagamento(pagamento_id)
+                logger.info("Pagamento com ID %s deletado com sucesso", pagamento_id)
                 return True
             else:
-                logger.warning(f"Pagamento com ID {pagamento_id} não encontrado para deleção")
+                logger.warning("Pagamento com ID %s não encontrado para deleção", pagamento_id)
                 return False
         except Exception as e:
-            logger.error(f"Erro ao deletar pagamento com ID {pagamento_id}: {e}")
+            logger.error("Erro ao deletar pagamento com ID %s: %s", pagamento_id, e)
             return False
 
     from typing import Optional
 
     async def get_pagamentos_pendentes_por_usuario(self, usuario_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        if usuario_id and not ObjectId.is_valid(usuario_id):
+            # Id inválido não tem saldo: [] sem ir ao banco e sem ocupar o cache
+            logger.warning("ID de usuário inválido ao buscar pagamentos pendentes: %s", usuario_id)
+            return []
+        return await self._pendentes_por_usuario(usuario_id)
+
+    @cache_analitico(SALDOS_PENDENTES)
+    async def _pendentes_por_usuario(self, usuario_id: Optional[str]) -> List[Dict[str, Any]]:
+        # Lê o saldo mantido em saldos_pendentes_usuario, atualizado a cada escrita em pagamentos/contratos/usuarios
         try:
-            pipeline = [
-                {
-                    "$lookup": {
-                        "from": "contratos",
-                        "localField": "_id",
-                        "foreignField": "pagamento_id",
-                        "as": "contrato"
-                    }
-                },
-                {
-                    "$unwind": "$contrato"
-                },
-                {
-                    "$lookup": {
-                        "from": "usuarios",
-                        "localField": "contrato.usuario_id",
-                        "foreignField": "_id",
-                        "as": "usuario"
-                    }
-                },
-                {
-                    "$unwind": "$usuario"
-                },
-                {
-                    "$match": {
-                        "pago": False,
-                        **({"usuario._id": ObjectId(usuario_id)} if usuario_id else {})
-                    }
-                },
-                {
-                    "$group": {
-                        "_id": "$usuario._id",
-                        "nome": {"$first": "$usuario.nome"},
-                        "email": {"$first": "$usuario.email"},
-                        "total_pendente": {"$sum": "$valor"}
-                    }
-                },
-                {
-                    "$project": {
-                        "_id": 0,
-                        "nome": 1,
-                        "email": 1,
-                        "total_pendente": 1
-                    }
-                },
-                {
-                    "$sort": {
-                        "total_pendente": -1
-                    }
-                }
-            ]
-
-            pagamentos_pendentes = await self.collection.aggregate(pipeline).to_list(length=None)
-            logger.info(f"Pagamentos pendentes por usuário (usuario_id={usuario_id}): {pagamentos_pendentes}")
+            filtro = {"_id": ObjectId(usuario_id)} if usuario_id else {}
+            saldos = database.get_collection(SALDOS_PENDENTES).find(
+                filtro, {"_id": 0, "nome": 1, "email": 1, "total_pendente": 1}
+            ).sort("total_pendente", DESCENDING)
+            pagamentos_pendentes = await saldos.to_list(length=None)
+            logger.info("Pagamentos pendentes por usuário (usuario_id=%s): %s", usuario_id, resumo(pagamentos_pendentes))
             return pagamentos_pendentes
 
         except Exception as e:
-            logger.error(f"Erro ao buscar pagamentos pendentes por usuário (usuario_id={usuario_id}): {e}")
-            return []
\ No newline at end of file
+            logger.error("Erro ao buscar pagamentos pendentes por usuário (usuario_id=%s): %s", usuario_id, e)
+            # Sobe em vez de devolver []: o cache_analitico guardaria a lista vazia como resultado
+            raise
+
+    def consultas_principais(self, amostra: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        amostra = amostra or {}
+        inicio = amostra.get("data", datetime(2024, 1, 1))
+        fim = inicio + timedelta(days=31)
+        return [
+            {
+                "nome": "PagamentoRepository.get_all",
+                "filtro": {"vencimento": {"$gte": inicio, "$lte": fim}},
+                "ordenacao": keyset_sort("vencimento"),
+                "limite": 10
+            },
+            {
+                "nome": "PagamentoRepository.get_all[pendentes]",
+                "filtro": {"vencimento": {"$gte": inicio, "$lte": fim}, "pago": False},
+                "ordenacao": keyset_sort("vencimento"),
+                "limite": 10
+            },
+            {
+                "nome": "PagamentoRepository.get_all[cursor]",
+                "filtro": keyset_filter({}, "vencimento", encode_cursor(inicio, amostra.get("pagamento_id", ObjectId()))),
+                "ordenacao": keyset_sort("vencimento"),
+                "limite": 10
+            },
+            {
+                "nome": "PagamentoRepository.get_pagamentos_pendentes_por_usuario",
+                "colecao": SALDOS_PENDENTES,
+                "filtro": {},
+                "projecao": {"_id": 0, "nome": 1, "email": 1, "total_pendente": 1},
+                "ordenacao": [("total_pendente", DESCENDING)]
+            },
+            {
+                "nome": "PagamentoRepository.get_pagamentos_pendentes_por_usuario[usuario_id]",
+                "colecao": SALDOS_PENDENTES,
+                "filtro": {"_id": amostra.get("usuario_id", ObjectId())},
+                "projecao": {"_id": 0, "nome": 1, "email": 1, "total_pendente": 1},
+                "ordenacao": [("total_pendente", DESCENDING)]
+            },
+            {"nome": "PagamentoRepository.get_all_no_pagination", "filtro": {}, "varredura": True},
+        ]
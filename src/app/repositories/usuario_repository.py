@@ -1,126 +1,247 @@
 import logging
-from typing import Optional, List
+import re
+from typing import Optional, List, Tuple
 
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 from pymongo.errors import DuplicateKeyError
 
+from src.app.core.cache import buscar_documento, cache_ttl, invalidar_analises, invalidar_documento
+from src.app.core.db.bulk import inserir_em_lote
+from src.app.core.db.coalescencia import inserir_um
 from src.app.core.db.database import database
+from src.app.core.db.derivados import atualizar_saldos_usuarios
+from src.app.core.db.instrumentation import instrumentar
+from src.app.core.db.normalizacao import campo_preenchido
+from src.app.core.db.pagination import encode_cursor, keyset_filter, keyset_sort
+from src.app.core.logger import resumo
+from src.app.core.texto import intervalo_prefixo, literal, normalizar
 from src.app.dtos.usuario_dto import UsuarioDTO  # Corrected import
 from src.app.models.usuario import Usuario
 
 logger = logging.getLogger('app_logger.usuario_repository')
 
+# Candidatos lidos do índice por resultado pedido no autocomplete, antes da ordenação por relevância
+_JANELA_AUTOCOMPLETE = 5
 
+
+@instrumentar
 class UsuarioRepository:
+    indexes = [
+        IndexModel([("email", ASCENDING)], name="email", unique=True),
+        IndexModel([("cpf", ASCENDING)], name="cpf", unique=True),
+        IndexModel([("nome", ASCENDING)], name="nome"),
+        # Busca por prefixo sem acento e sem diferença de maiúsculas (autocomplete)
+        IndexModel([("nome_normalizado", ASCENDING)], name="nome_normalizado"),
+    ]
+
+    write_concern = None
+
+    # Segundos que um documento lido por _id fica no cache (CACHE_TTL_USUARIOS sobrescreve)
+    cache_ttl = 60
+
     def __init__(self):
-        self.collection = database.get_collection("usuarios")
+        self.collection = database.get_collection("usuarios", self.write_concern)
 
     async def criar_usuario(self, usuario: Usuario) -> Optional[UsuarioDTO]:
         try:
-            usuario_dict = usuario.dict(by_alias=True, exclude={"id"})
-            novo_usuario = await self.collection.insert_one(usuario_dict)
-            usuario_criado = await self.collection.find_one({"_id": novo_usuario.inserted_id})
+            usuario_dict = self.to_document(usuario)
+            usuario_dict["_id"] = await inserir_um(self.collection, usuario_dict)
+            invalidar_analises("usuarios")
 
-            if not usuario_criado:
-                logger.error("Erro ao criar usuário: Usuário não encontrado após inserção")
-                return None
-
-            logger.info(f"Usuário criado com sucesso: {usuario_criado}")
-            usuario = Usuario(**usuario_criado)
+            logger.info("Usuário criado com sucesso: %s", resumo(usuario_dict))
+            usuario = Usuario(**usuario_dict)
             return UsuarioDTO.from_model(usuario)
         except DuplicateKeyError as e:
-            logger.error(f"Erro ao criar usuário: Email já cadastrado - {e}")
+            logger.error("Erro ao criar usuário: Email já cadastrado - %s", e)
             raise ValueError("Email já cadastrado") from e
         except Exception as e:
-            logger.error(f"Erro ao criar usuário: {e}")
+            logger.error("Erro ao criar usuário: %s", e)
             return None
 
-    async def listar_usuarios(self, skip: int = 0, limit: int = 10) -> List[UsuarioDTO]:
+    async def create_many(self, documentos: List[dict]) -> List[Tuple[int, str]]:
+        falhas = await inserir_em_lote(self.collection, documentos)
+        invalidar_analises("usuarios")
+        return falhas
+
+    def to_document(self, usuario: Usuario) -> dict:
+        usuario_dict = usuario.dict(by_alias=True, exclude={"id"})
+        usuario_dict["nome_normalizado"] = normalizar(usuario_dict["nome"])
+        return usuario_dict
+
+    def cursor_exportacao(self):
+        return self.collection.find()
+
+    async def listar_usuarios(self, skip: int = 0, limit: int = 10, cursor: Optional[str] = None) -> List[UsuarioDTO]:
+        usuarios = await self.listar_documentos(skip, limit, cursor)
+        return [UsuarioDTO.from_model(Usuario(**usuario)) for usuario in usuarios]
+
+    async def listar_documentos(self, skip: int = 0, limit: int = 10, cursor: Optional[str] = None) -> List[dict]:
         try:
-            usuarios = await self.collection.find().skip(skip).limit(limit).to_list(length=limit)
+            resultado = self.collection.find(keyset_filter({}, "_id", cursor)).sort(keyset_sort("_id"))
+            if not cursor:
+                resultado = resultado.skip(skip)
+            usuarios = await resultado.limit(limit).to_list(length=limit)
 
-            logger.info(f"Usuários listados com sucesso: {usuarios}")
-            result = [Usuario(**usuario) for usuario in usuarios]
-            return [UsuarioDTO.from_model(usuario) for usuario in result]
+            logger.info("Usuários listados com sucesso: %s", resumo(usuarios))
+            return usuarios
         except Exception as e:
-            logger.error(f"Erro ao listar usuários: {e}")
+            logger.error("Erro ao listar usuários: %s", e)
             return []
 
     async def buscar_usuario_por_id(self, usuario_id: str) -> Optional[UsuarioDTO]:
+        usuario_data = await self.buscar_documento_por_id(usuario_id)
+        return UsuarioDTO.from_model(Usuario(**usuario_data)) if usuario_data else None
+
+    async def buscar_documento_por_id(self, usuario_id: str) -> Optional[dict]:
         try:
-            filtro = {"_id": ObjectId(usuario_id)} if ObjectId.is_valid(usuario_id) else {"_id": usuario_id}
-            usuario_data = await self.collection.find_one(filtro)
+            _id = ObjectId(usuario_id) if ObjectId.is_valid(usuario_id) else usuario_id
+            usuario_data = await buscar_documento(self.collection, _id, cache_ttl("usuarios", self.cache_ttl))
 
             if not usuario_data:
-                logger.warning(f"Usuário com ID {usuario_id} não encontrado")
+                logger.warning("Usuário com ID %s não encontrado", usuario_id)
                 return None
 
-            logger.info(f"Usuário encontrado com ID {usuario_id}: {usuario_data}")
-            usuario = Usuario(**usuario_data)
-            return UsuarioDTO.from_model(usuario)
+            logger.info("Usuário encontrado com ID %s: %s", usuario_id, resumo(usuario_data))
+            return usuario_data
         except Exception as e:
-            logger.error(f"Erro ao buscar usuário com ID {usuario_id}: {e}")
+            logger.error("Erro ao buscar usuário com ID %s: %s", usuario_id, e)
             return None
 
     async def atualizar_usuario(self, usuario_id: str, usuario: Usuario) -> Optional[UsuarioDTO]:
         try:
             if not ObjectId.is_valid(usuario_id):
-                logger.warning(f"ID de usuário inválido: {usuario_id}")
+                logger.warning("ID de usuário inválido: %s", usuario_id)
                 return None
 
-            usuario_dict = usuario.dict(by_alias=True, exclude={"id"})
+            usuario_dict = self.to_document(usuario)
             resultado = await self.collection.update_one({"_id": ObjectId(usuario_id)}, {"$set": usuario_dict})
+            invalidar_documento(self.collection, ObjectId(usuario_id))
+            invalidar_analises("usuarios")
 
             if resultado.matched_count == 0:
-                logger.warning(f"Usuário com ID {usuario_id} não encontrado para atualização")
+                logger.warning("Usuário com ID %s não encontrado para atualização", usuario_id)
                 return None
+            if resultado.modified_count:
+                # Nome e e-mail são copiados para o saldo pendente
+                await atualizar_saldos_usuarios([usuario_id])
 
             usuario_atualizado = await self.collection.find_one({"_id": ObjectId(usuario_id)})
             if usuario_atualizado:
-                logger.info(f"Usuário atualizado com sucesso: {usuario_atualizado}")
+                logger.info("Usuário atualizado com sucesso: %s", resumo(usuario_atualizado))
                 usuario = Usuario(**usuario_atualizado)
                 return UsuarioDTO.from_model(usuario)
             else:
-                logger.warning(f"Falha ao buscar usuário atualizado após atualização para ID: {usuario_id}")
+                logger.warning("Falha ao buscar usuário atualizado após atualização para ID: %s", usuario_id)
                 return None
 
         except Exception as e:
-            logger.error(f"Erro ao atualizar usuário com ID {usuario_id}: {e}")
+            logger.error("Erro ao atualizar usuário com ID %s: %s", usuario_id, e)
             return None
 
     async def deletar_usuario(self, usuario_id: str) -> bool:
         try:
             if not ObjectId.is_valid(usuario_id):
-                logger.warning(f"ID de usuário inválido: {usuario_id}")
+                logger.warning("ID de usuário inválido: %s", usuario_id)
                 return False
 
             resultado = await self.collection.delete_one({"_id": ObjectId(usuario_id)})
+            invalidar_documento(self.collection, ObjectId(usuario_id))
+            invalidar_analises("usuarios")
             if resultado.deleted_count > 0:
-                logger.info(f"Usuário com ID {usuario_id} deletado com sucesso")
+                await atualizar_saldos_usuarios([usuario_id])
+                logger.info("Usuário com ID %s deletado com sucesso", usuario_id)
                 return True
             else:
-                logger.warning(f"Usuário com ID {usuario_id} não encontrado para deleção")
+                logger.warning("Usuário com ID %s não encontrado para deleção", usuario_id)
                 return False
         except Exception as e:
-            logger.error(f"Erro ao deletar usuário com ID {usuario_id}: {e}")
+            logger.error("Erro ao deletar usuário com ID %s: %s", usuario_id, e)
             return False
 
-    async def buscar_usuario_por_nome(self, nome: str) -> List[UsuarioDTO]:
+    async def buscar_usuario_por_nome(self, nome: str, limit: Optional[int] = None) -> List[UsuarioDTO]:
         try:
-            usuarios = await self.collection.find({"nome": {"$regex": nome, "$options": "i"}}).to_list(length=None)
+            usuarios = await self.collection.find(self._filtro_nome(nome)).limit(limit or 0).to_list(length=limit)
 
-            logger.info(f"Usuários encontrados com nome {nome}: {usuarios}")
+            logger.info("Usuários encontrados com nome %s: %s", nome, resumo(usuarios))
             result = [Usuario(**usuario) for usuario in usuarios]
             return [UsuarioDTO.from_model(usuario) for usuario in result]
         except Exception as e:
-            logger.error(f"Erro ao buscar usuários por nome {nome}: {e}")
+            logger.error("Erro ao buscar usuários por nome %s: %s", nome, e)
             return []
 
+    @staticmethod
+    def _filtro_nome(nome: str) -> dict:
+        """Filtro da busca por nome: padrões literais usam o campo normalizado e o seu índice.
+
+        "^texto" vira intervalo de prefixo; texto sem metacaracteres percorre só as chaves do índice.
+        Expressões regulares de fato continuam sobre o nome original, assim como tudo enquanto o
+        preenchimento de nome_normalizado nos usuários antigos não terminou.
+        """
+        ancorado = nome.startswith("^")
+        texto = nome[1:] if ancorado else nome
+        if not literal(texto) or not campo_preenchido("usuarios", "nome_normalizado"):
+            return {"nome": {"$regex": nome, "$options": "i"}}
+        termo = normalizar(texto)
+        if not termo:
+            return {}
+        if ancorado:
+            return {"nome_normalizado": intervalo_prefixo(termo)}
+        return {"nome_normalizado": {"$regex": re.escape(termo)}}
+
+    async def autocompletar(self, prefixo: str, limit: int = 10) -> List[dict]:
+        """Usuários cujo nome começa por `prefixo`, ignorando acentos e maiúsculas.
+
+        Nome igual ao digitado vem primeiro, depois os que continuam numa palavra nova
+        ("ana" -> "Ana Silva" antes de "Anabela"), e então a ordem alfabética.
+        """
+        termo = normalizar(prefixo)
+        if not termo:
+            return []
+        candidatos = await self.collection.find({"nome_normalizado": intervalo_prefixo(termo)}).sort(
+            "nome_normalizado", ASCENDING
+        ).limit(limit * _JANELA_AUTOCOMPLETE).to_list(length=limit * _JANELA_AUTOCOMPLETE)
+
+        def relevancia(usuario: dict):
+            nome = usuario["nome_normalizado"]
+            continuacao = nome[len(termo):len(termo) + 1]
+            return (continuacao != "", continuacao not in ("", " "), nome)
+
+        return sorted(candidatos, key=relevancia)[:limit]
+
     async def total_usuarios(self) -> int:
         try:
             total = await self.collection.count_documents({})
-            logger.info(f"Total de usuários: {total}")
+            logger.info("Total de usuários: %s", total)
             return total
         except Exception as e:
-            logger.error(f"Erro ao contar total de usuários: {e}")
-            return 0
\ No newline at end of file
+            logger.error("Erro ao contar total de usuários: %s", e)
+            return 0
+
+    def consultas_principais(self, amostra: Optional[dict] = None) -> List[dict]:
+        amostra = amostra or {}
+        nome = amostra.get("nome", "Usuario")
+        return [
+            {"nome": "UsuarioRepository.listar_usuarios", "filtro": {}, "ordenacao": keyset_sort("_id"), "limite": 10},
+            {
+                "nome": "UsuarioRepository.listar_usuarios[cursor]",
+                "filtro": keyset_filter({}, "_id", encode_cursor(None, amostra.get("usuario_id", ObjectId()))),
+                "ordenacao": keyset_sort("_id"),
+                "limite": 10
+            },
+            {"nome": "UsuarioRepository.buscar_usuario_por_nome", "filtro": self._filtro_nome(nome), "limite": 100},
+            {"nome": "UsuarioRepository.buscar_usuario_por_nome[prefixo]", "filtro": self._filtro_nome(f"^{nome}"), "limite": 100},
+            {
+                "nome": "UsuarioRepository.buscar_usuario_por_nome[regex]",
+                "filtro": self._filtro_nome(f"{nome}.*"),
+                "limite": 100,
+                "varredura": True
+            },
+            {
+                "nome": "UsuarioRepository.autocompletar",
+                "filtro": {"nome_normalizado": intervalo_prefixo(normalizar(nome)[:3])},
+                "ordenacao": [("nome_normalizado", ASCENDING)],
+                "limite": 10 * _JANELA_AUTOCOMPLETE
+            },
+            {"nome": "UsuarioRepository.total_usuarios", "filtro": {}, "varredura": True},
+        ]
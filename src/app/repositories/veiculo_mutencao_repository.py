@@ -1,175 +1,106 @@
 import logging
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
 
+from src.app.core.cache import buscar_documento, cache_analitico, cache_ttl, invalidar_analises, invalidar_documento
+from src.app.core.db.bulk import inserir_em_lote
+from src.app.core.db.coalescencia import inserir_um
 from src.app.core.db.database import database
+from src.app.core.db.derivados import CUSTOS_MARCA, CUSTOS_VEICULO, atualizar_custos_veiculos
+from src.app.core.db.instrumentation import instrumentar
 from src.app.dtos.veiculo_manutencao_dto import VeiculoManutencaoDTO
 from src.app.models.manutencao import Manutencao
 from src.app.models.veiculo_manutencao import VeiculoManutencao
 
 
+@instrumentar
 class VeiculoManutencaoRepository:
+    indexes = [
+        IndexModel([("veiculo_id", ASCENDING), ("manutencao_id", ASCENDING)], name="veiculo_id_manutencao_id"),
+        # Com veiculo_id, a busca de veículos por tipo de manutenção é coberta pelo índice
+        IndexModel([("manutencao_id", ASCENDING), ("veiculo_id", ASCENDING)], name="manutencao_id"),
+    ]
+
+    write_concern = None
+
+    # Segundos que um documento lido por _id fica no cache (CACHE_TTL_VEICULO_MANUTENCOES sobrescreve)
+    cache_ttl = 60
+
     def __init__(self):
         self.logger = logging.getLogger("app_logger.repositories.veiculo_manutencao_repository")
-        self.collection = database.get_collection("veiculo_manutencoes")
+        self.collection = database.get_collection("veiculo_manutencoes", self.write_concern)
 
     async def create(self, veiculo_manutencao: VeiculoManutencaoDTO) -> VeiculoManutencaoDTO:
         try:
-            veiculo_manutencao_dict = veiculo_manutencao.model_dump(by_alias=True, exclude={"id"})
-            veiculo_manutencao_dict["veiculo_id"] = ObjectId(veiculo_manutencao_dict["veiculo_id"])
-            veiculo_manutencao_dict["manutencao_id"] = ObjectId(veiculo_manutencao_dict["manutencao_id"])
-            new_veiculo_manutencao = await self.collection.insert_one(veiculo_manutencao_dict)
-            veiculo_manutencao_created = await self.collection.find_one(
-                {"_id": new_veiculo_manutencao.inserted_id}
-            )
+            veiculo_manutencao_dict = self.to_document(veiculo_manutencao)
+            veiculo_manutencao_dict["_id"] = await inserir_um(self.collection, veiculo_manutencao_dict)
+            invalidar_analises("veiculo_manutencoes")
+            await atualizar_custos_veiculos([veiculo_manutencao_dict["veiculo_id"]])
 
-            if not veiculo_manutencao_created:
-                self.logger.error("Erro ao criar veículo_manutencao: Registro não encontrado após inserção.")
-                return None
-
-            return VeiculoManutencaoDTO.from_model(VeiculoManutencao(**veiculo_manutencao_created))
+            return VeiculoManutencaoDTO.from_model(VeiculoManutencao(**veiculo_manutencao_dict))
         except Exception as e:
-            self.logger.error(f"Erro ao criar veículo_manutencao: {e}")
+            self.logger.error("Erro ao criar veículo_manutencao: %s", e)
             return None
 
-    async def get_all(self) -> List[VeiculoManutencaoDTO]:
-        veiculo_manutencoes = await self.collection.find().to_list(length=1000)
-        return [VeiculoManutencaoDTO.from_model(VeiculoManutencao(**vm)) for vm in veiculo_manutencoes]
+    async def create_many(self, documentos: List[dict]) -> List[Tuple[int, str]]:
+        falhas = await inserir_em_lote(self.collection, documentos)
+        invalidar_analises("veiculo_manutencoes")
+        await atualizar_custos_veiculos(documento["veiculo_id"] for documento in documentos)
+        return falhas
+
+    def to_document(self, veiculo_manutencao: VeiculoManutencaoDTO) -> dict:
+        veiculo_manutencao_dict = veiculo_manutencao.model_dump(by_alias=True, exclude={"id"})
+        veiculo_manutencao_dict["veiculo_id"] = ObjectId(veiculo_manutencao_dict["veiculo_id"])
+        veiculo_manutencao_dict["manutencao_id"] = ObjectId(veiculo_manutencao_dict["manutencao_id"])
+        return veiculo_manutencao_dict
+
+    def cursor_exportacao(self):
+        return self.collection.find()
 
     async def get_by_id(self, veiculo_manutencao_id: str) -> Optional[VeiculoManutencaoDTO]:
+        veiculo_manutencao = await self.get_documento_by_id(veiculo_manutencao_id)
+        return VeiculoManutencaoDTO.from_model(VeiculoManutencao(**veiculo_manutencao)) if veiculo_manutencao else None
+
+    async def get_documento_by_id(self, veiculo_manutencao_id: str) -> Optional[dict]:
         try:
-            veiculo_manutencao = await self.collection.find_one({"_id": ObjectId(veiculo_manutencao_id)})
-            print("retorno", veiculo_manutencao)
-            if not veiculo_manutencao:
-                return None
-            return VeiculoManutencaoDTO.from_model(VeiculoManutencao(**veiculo_manutencao))
+            return await buscar_documento(
+                self.collection, ObjectId(veiculo_manutencao_id), cache_ttl("veiculo_manutencoes", self.cache_ttl)
+            )
         except Exception as e:
-            self.logger.error(f"Erro ao buscar veículo_manutencao com ID {veiculo_manutencao_id}: {e}")
+            self.logger.error("Erro ao buscar veículo_manutencao com ID %s: %s", veiculo_manutencao_id, e)
             return None
 
+    @cache_analitico(CUSTOS_MARCA)
     async def get_total_custo_manutencao_por_marca(self) -> List[dict]:
-        pipeline = [
-            {
-                "$lookup": {
-                    "from": "veiculos",
-                    "localField": "veiculo_id",
-                    "foreignField": "_id",
-                    "as": "veiculo"
-                }
-            },
-            {
-                "$unwind": "$veiculo"
-            },
-            {
-                "$lookup": {
-                    "from": "manutencoes",
-                    "localField": "manutencao_id",
-                    "foreignField": "_id",
-                    "as": "manutencao"
-                }
-            },
-            {
-                "$unwind": "$manutencao"
-            },
-            {
-                "$group": {
-                    "_id": "$veiculo.marca",
-                    "custo_total": {"$sum": "$manutencao.custo"}
-                }
-            },
-            {
-                "$sort": {"custo_total": -1}
-            }
-        ]
-        return await self.collection.aggregate(pipeline).to_list(length=1000)
+        custos = database.get_collection(CUSTOS_MARCA)
+        cursor = custos.find({}, {"custo_total": 1}).sort("custo_total", DESCENDING)
+        return await cursor.to_list(length=None)
 
+    @cache_analitico(CUSTOS_VEICULO)
     async def get_manutencao_mais_cara_por_veiculo(self) -> List[dict]:
-        pipeline = [
-            {
-                "$lookup": {
-                    "from": "manutencoes",
-                    "localField": "manutencao_id",
-                    "foreignField": "_id",
-                    "as": "manutencao"
-                }
-            },
-            {
-                "$unwind": "$manutencao"
-            },
-            {
-                "$lookup": {
-                    "from": "veiculos",
-                    "localField": "veiculo_id",
-                    "foreignField": "_id",
-                    "as": "veiculo"
-                }
-            },
-            {
-                "$unwind": "$veiculo"
-            },
-            {
-                "$sort": {"manutencao.custo": -1}
-            },
-            {
-                "$group": {
-                    "_id": "$veiculo._id",
-                    "modelo": {"$first": "$veiculo.modelo"},
-                    "marca": {"$first": "$veiculo.marca"},
-                    "tipo_manutencao": {"$first": "$manutencao.tipo_manutencao"},
-                    "custo": {"$first": "$manutencao.custo"},
-                    "observacao": {"$first": "$manutencao.observacao"}
-                }
-            },
-            {
-                "$sort": {"custo": -1}
-            }
-        ]
-
-        result = await self.collection.aggregate(pipeline).to_list(length=1000)
-        for i in result:
-            i["_id"] = str(i["_id"])
+        custos = database.get_collection(CUSTOS_VEICULO)
+        cursor = custos.find({}, {"modelo": 1, "marca": 1, "manutencao_mais_cara": 1}).sort("custo_maximo", DESCENDING)
+        result = []
+        async for custo in cursor:
+            manutencao = custo["manutencao_mais_cara"]
+            result.append({
+                "_id": str(custo["_id"]),
+                "modelo": custo["modelo"],
+                "marca": custo["marca"],
+                "tipo_manutencao": manutencao["tipo_manutencao"],
+                "custo": manutencao["custo"],
+                "observacao": manutencao["observacao"],
+            })
         return result
 
+    @cache_analitico(CUSTOS_VEICULO)
     async def get_veiculos_com_maior_custo_manutencao(self) -> List[dict]:
-        pipeline = [
-            {
-                "$lookup": {
-                    "from": "manutencoes",
-                    "localField": "manutencao_id",
-                    "foreignField": "_id",
-                    "as": "manutencao"
-                }
-            },
-            {
-                "$unwind": "$manutencao"
-            },
-            {
-                "$lookup": {
-                    "from": "veiculos",
-                    "localField": "veiculo_id",
-                    "foreignField": "_id",
-                    "as": "veiculo"
-                }
-            },
-            {
-                "$unwind": "$veiculo"
-            },
-            {
-                "$group": {
-                    "_id": "$veiculo._id",
-                    "modelo": {"$first": "$veiculo.modelo"},
-                    "marca": {"$first": "$veiculo.marca"},
-                    "custo_total": {"$sum": "$manutencao.custo"}
-                }
-            },
-            {
-                "$sort": {"custo_total": -1}
-            }
-        ]
-
-        result = await self.collection.aggregate(pipeline).to_list(length=1000)
+        custos = database.get_collection(CUSTOS_VEICULO)
+        cursor = custos.find({}, {"modelo": 1, "marca": 1, "custo_total": 1}).sort("custo_total", DESCENDING)
+        result = await cursor.to_list(length=None)
         for i in result:
             i["_id"] = str(i["_id"])
         return result
@@ -179,17 +110,59 @@ class VeiculoManutencaoRepository:
 
     async def update(self, veiculo_manutencao_id: str, veiculo_manutencao_data: dict) -> Optional[VeiculoManutencaoDTO]:
         try:
-            update_result = await self.collection.update_one(
+            for campo in ("veiculo_id", "manutencao_id"):
+                if campo in veiculo_manutencao_data:
+                    veiculo_manutencao_data[campo] = ObjectId(veiculo_manutencao_data[campo])
+            # O documento anterior indica o veículo que perdeu o vínculo, se veiculo_id mudou
+            anterior = await self.collection.find_one_and_update(
                 {"_id": ObjectId(veiculo_manutencao_id)},
-                {"$set": veiculo_manutencao_data}
+                {"$set": veiculo_manutencao_data},
+                return_document=ReturnDocument.BEFORE
             )
-            if update_result.modified_count > 0:
-                return await self.get_by_id(veiculo_manutencao_id)
-            return None
+            invalidar_documento(self.collection, ObjectId(veiculo_manutencao_id))
+            invalidar_analises("veiculo_manutencoes")
+            if anterior is None:
+                return None
+            await atualizar_custos_veiculos([anterior["veiculo_id"], veiculo_manutencao_data.get("veiculo_id")])
+            return await self.get_by_id(veiculo_manutencao_id)
         except Exception as e:
-            self.logger.error(f"Erro ao atualizar veículo_manutencao com ID {veiculo_manutencao_id}: {e}")
+            self.logger.error("Erro ao atualizar veículo_manutencao com ID %s: %s", veiculo_manutencao_id, e)
             return None
 
     async def delete(self, veiculo_manutencao_id: str) -> bool:
-        result = await self.collection.delete_one({"_id": ObjectId(veiculo_manutencao_id)})
-        return result.deleted_count > 0
\ No newline at end of file
+        removido = await self.collection.find_one_and_delete({"_id": ObjectId(veiculo_manutencao_id)}, {"veiculo_id": 1})
+        invalidar_documento(self.collection, ObjectId(veiculo_manutencao_id))
+        invalidar_analises("veiculo_manutencoes")
+        if removido is None:
+            return False
+        await atualizar_custos_veiculos([removido["veiculo_id"]])
+        return True
+
+    def consultas_principais(self, amostra: Optional[dict] = None) -> List[dict]:
+        amostra = amostra or {}
+        return [
+            {"nome": "VeiculoManutencaoRepository.veiculo_id", "filtro": {"veiculo_id": amostra.get("veiculo_id", ObjectId())}},
+            {"nome": "VeiculoManutencaoRepository.manutencao_id", "filtro": {"manutencao_id": amostra.get("manutencao_id", ObjectId())}},
+            {
+                "nome": "VeiculoManutencaoRepository.get_total_custo_manutencao_por_marca",
+                "colecao": CUSTOS_MARCA,
+                "filtro": {},
+                "projecao": {"custo_total": 1},
+                "ordenacao": [("custo_total", DESCENDING)]
+            },
+            {
+                "nome": "VeiculoManutencaoRepository.get_manutencao_mais_cara_por_veiculo",
+                "colecao": CUSTOS_VEICULO,
+                "filtro": {},
+                "projecao": {"modelo": 1, "marca": 1, "manutencao_mais_cara": 1},
+                "ordenacao": [("custo_maximo", DESCENDING)]
+            },
+            {
+                "nome": "VeiculoManutencaoRepository.get_veiculos_com_maior_custo_manutencao",
+                "colecao": CUSTOS_VEICULO,
+                "filtro": {},
+                "projecao": {"modelo": 1, "marca": 1, "custo_total": 1},
+                "ordenacao": [("custo_total", DESCENDING)]
+            },
+            {"nome": "VeiculoManutencaoRepository.get_quantidade_veiculos_manutencao", "filtro": {}, "varredura": True},
+        ]
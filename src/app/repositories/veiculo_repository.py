@@ -1,91 +1,136 @@
+import asyncio
 import logging
-from typing import Optional, List
+from datetime import datetime
+from typing import Any, Dict, Optional, List, Tuple
 
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
+from src.app.core.cache import buscar_documento, cache_analitico, cache_ttl, invalidar_analises, invalidar_documento
+from src.app.core.db.bulk import inserir_em_lote
+from src.app.core.db.coalescencia import inserir_um
 from src.app.core.db.database import database
+from src.app.core.db.derivados import CUSTOS_VEICULO, TIPOS_MANUTENCAO, atualizar_custos_veiculos, chaves_tipos_manutencao
+from src.app.core.db.instrumentation import instrumentar
+from src.app.core.db.pagination import contar_total, encode_cursor, keyset_filter, keyset_sort, next_cursor
+from src.app.core.disponibilidade import indice_disponibilidade, para_utc
+from src.app.core.texto import normalizar
 from src.app.dtos.veiculo_dto import VeiculoDTO
-from src.app.models.pagination_result import PaginationResult
+from src.app.models.pagination_result import PaginationResult, TotalMode
 from src.app.models.veiculo import Veiculo
 
+# Tamanho máximo de cada lista $in de manutencao_id enviada ao banco
+_LOTE_IDS = 1000
 
+# Limite de veículos devolvidos pela busca por tipo de manutenção
+_MAX_VEICULOS_POR_TIPO = 1000
+
+# Lotes de manutencao_id consultados ao mesmo tempo em veiculo_manutencoes
+_LOTES_SIMULTANEOS = 4
+
+# Veículos lidos por rodada na busca de disponíveis, e rodadas até desistir de completar a página
+_LOTE_DISPONIVEIS = 200
+_MAX_RODADAS_DISPONIVEIS = 50
+
+
+@instrumentar
 class VeiculoRepository:
+    indexes = [
+        IndexModel([("placa", ASCENDING)], name="placa", unique=True),
+        IndexModel(
+            [("marca", ASCENDING), ("modelo", ASCENDING), ("ano", ASCENDING), ("_id", ASCENDING)],
+            name="marca_modelo_ano_id"
+        ),
+    ]
+
+    write_concern = None
+
+    # Segundos que um documento lido por _id fica no cache (CACHE_TTL_VEICULOS sobrescreve)
+    cache_ttl = 60
+
     def __init__(self):
         self.logger = logging.getLogger("app_logger.repositories.veiculo_repository")
-        self.collection = database.get_collection("veiculos")
+        self.collection = database.get_collection("veiculos", self.write_concern)
 
     async def create(self, veiculo: VeiculoDTO) -> VeiculoDTO:
         try:
-            veiculo_dict = veiculo.model_dump(by_alias=True, exclude={"id"})
-            new_veiculo = await self.collection.insert_one(veiculo_dict)
-            veiculo_created = await self.collection.find_one({"_id": new_veiculo.inserted_id})
-
-            if not veiculo_created:
-                self.logger.error("Erro ao criar veículo: Veículo não encontrado após inserção.")
-                return None
+            veiculo_dict = self.to_document(veiculo)
+            veiculo_dict["_id"] = await inserir_um(self.collection, veiculo_dict)
+            invalidar_analises("veiculos")
 
-            saved = Veiculo(**veiculo_created)
+            saved = Veiculo(**veiculo_dict)
             return VeiculoDTO.from_model(saved)
         except Exception as e:
-            self.logger.error(f"Erro ao criar veículo: {e}")
+            self.logger.error("Erro ao criar veículo: %s", e)
             return None
 
-    async def get_all_no_pagination(self) -> List[VeiculoDTO]:
-        veiculos = await self.collection.find().to_list(length=1000)
-        result = [Veiculo(**veiculo) for veiculo in veiculos]
-        return [VeiculoDTO.from_model(r) for r in result]
+    async def create_many(self, documentos: List[dict]) -> List[Tuple[int, str]]:
+        falhas = await inserir_em_lote(self.collection, documentos)
+        invalidar_analises("veiculos")
+        return falhas
+
+    def to_document(self, veiculo: VeiculoDTO) -> dict:
+        return veiculo.model_dump(by_alias=True, exclude={"id"})
+
+    def cursor_exportacao(self):
+        return self.collection.find()
 
     async def get_by_id(self, veiculo_id: str) -> Optional[VeiculoDTO]:
+        veiculo = await self.get_documento_by_id(veiculo_id)
+        return VeiculoDTO.from_model(Veiculo(**veiculo)) if veiculo else None
+
+    async def get_documento_by_id(self, veiculo_id: str) -> Optional[dict]:
         try:
-            veiculo = await self.collection.find_one({"_id": ObjectId(veiculo_id)})
-            if not veiculo:
-                return None
-            return VeiculoDTO.from_model(Veiculo(**veiculo))
+            return await buscar_documento(self.collection, ObjectId(veiculo_id), cache_ttl("veiculos", self.cache_ttl))
         except Exception as e:
-            self.logger.error(f"Erro ao buscar veículo com ID {veiculo_id}: {e}")
+            self.logger.error("Erro ao buscar veículo com ID %s: %s", veiculo_id, e)
             return None
 
+    @cache_analitico("veiculos", "veiculo_manutencoes", "manutencoes", TIPOS_MANUTENCAO)
     async def get_veiculos_by_tipo_manutencao(self, tipo_manutencao: str) -> List[VeiculoDTO]:
-        pipeline = [
-            {
-                "$lookup": {
-                    "from": "veiculo_manutencoes",
-                    "localField": "_id",
-                    "foreignField": "veiculo_id",
-                    "as": "manutencoes"
-                }
-            },
-            {
-                "$unwind": "$manutencoes"
-            },
-            {
-                "$lookup": {
-                    "from": "manutencoes",
-                    "localField": "manutencoes.manutencao_id",
-                    "foreignField": "_id",
-                    "as": "manutencoes_detalhes"
-                }
-            },
-            {
-                "$unwind": "$manutencoes_detalhes"
-            },
-            {
-                "$match": {
-                    "manutencoes_detalhes.tipo_manutencao": {"$regex": tipo_manutencao, "$options": "i"}
-                }
-            },
-            {
-                "$group": {
-                    "_id": "$_id",
-                    "marca": {"$first": "$marca"},
-                    "modelo": {"$first": "$modelo"},
-                    "ano": {"$first": "$ano"},
-                    "placa": {"$first": "$placa"},
-                    "manutencoes": {"$push": "$manutencoes_detalhes"}
-                }
-            }
-        ]
-        veiculos = await self.collection.aggregate(pipeline).to_list(length=1000)
+        """Veículos com manutenções do tipo, partindo do lado seletivo.
+
+        Catálogo de tipos -> _id das manutenções (índice por chave) -> veiculo_id dos vínculos
+        (índice por manutencao_id) -> veículos, sem $lookup sobre a frota inteira. Os _id das
+        manutenções são lidos aos lotes, na ordem de _id, e a leitura para assim que há
+        _MAX_VEICULOS_POR_TIPO veículos distintos: tipos comuns não materializam todas as manutenções.
+        """
+        chaves = await chaves_tipos_manutencao(tipo_manutencao)
+        if not chaves:
+            return []
+
+        manutencoes = database.get_collection("manutencoes").find(
+            {"tipo_manutencao_chave": {"$in": chaves}}, {"_id": 1}
+        ).sort("_id", ASCENDING).batch_size(_LOTE_IDS)
+        vinculos = database.get_collection("veiculo_manutencoes")
+        encontrados = set()
+        rodada, lote = [], []
+
+        async def _consultar(lotes: List[List[ObjectId]]):
+            distintos = await asyncio.gather(*(
+                vinculos.distinct("veiculo_id", {"manutencao_id": {"$in": ids}}) for ids in lotes
+            ))
+            for veiculo_ids in distintos:
+                encontrados.update(veiculo_ids)
+
+        async for manutencao in manutencoes:
+            lote.append(manutencao["_id"])
+            if len(lote) == _LOTE_IDS:
+                rodada.append(lote)
+                lote = []
+            if len(rodada) == _LOTES_SIMULTANEOS:
+                await _consultar(rodada)
+                rodada = []
+                if len(encontrados) >= _MAX_VEICULOS_POR_TIPO:
+                    break
+        else:
+            await _consultar(rodada + ([lote] if lote else []))
+        await manutencoes.close()
+
+        veiculo_ids = sorted(encontrados)[:_MAX_VEICULOS_POR_TIPO]
+        if not veiculo_ids:
+            return []
+        veiculos = await self.collection.find({"_id": {"$in": veiculo_ids}}).sort("_id", ASCENDING).to_list(length=None)
         return [VeiculoDTO.from_model(Veiculo(**veiculo)) for veiculo in veiculos]
 
     async def get_quantidade_veiculos(self) -> int:
@@ -98,7 +143,26 @@ class VeiculoRepository:
         modelo: Optional[str] = None,
         ano: Optional[int] = None,
         page: int = 1,
-        limit: int = 10
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        total: TotalMode = TotalMode.EXACT,
+        total_cap: int = 1000
+    ) -> PaginationResult:
+        result = await self.get_all_documentos(tipo, marca, modelo, ano, page, limit, cursor, total, total_cap)
+        result.data = [VeiculoDTO.from_model(Veiculo(**document)) for document in result.data]
+        return result
+
+    async def get_all_documentos(
+        self,
+        tipo: Optional[str] = None,
+        marca: Optional[str] = None,
+        modelo: Optional[str] = None,
+        ano: Optional[int] = None,
+        page: int = 1,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        total: TotalMode = TotalMode.EXACT,
+        total_cap: int = 1000
     ) -> PaginationResult:
         query = {}
         if tipo:
@@ -110,62 +174,70 @@ class VeiculoRepository:
         if ano:
             query["ano"] = ano
 
-        total_items = await self.collection.count_documents(query)
-        number_of_pages = (total_items + limit - 1) // limit
+        resultado = self.collection.find(keyset_filter(query, "_id", cursor)).sort(keyset_sort("_id"))
+        if not cursor:
+            resultado = resultado.skip((page - 1) * limit)
 
-        cursor = self.collection.find(query).skip((page - 1) * limit).limit(limit)
-        veiculos = []
-        async for document in cursor:
-            veiculos.append(Veiculo(**document))
+        (total_items, capped), documentos = await asyncio.gather(
+            contar_total(self.collection, query, total, total_cap),
+            resultado.limit(limit).to_list(length=limit)
+        )
+        return PaginationResult.build(
+            page, limit, total_items, capped, documentos,
+            next_cursor=next_cursor(documentos, limit, "_id"),
+            total_mode=total
+        )
 
-        result = [VeiculoDTO.from_model(veiculo) for veiculo in veiculos]
+    async def get_disponiveis(
+        self,
+        inicio: datetime,
+        fim: datetime,
+        marca: Optional[str] = None,
+        modelo: Optional[str] = None,
+        ano: Optional[int] = None,
+        limit: int = 10,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Veículos sem contrato em [inicio, fim), em ordem de _id, e o cursor da próxima página.
 
-        return PaginationResult(
-            page=page,
-            limit=limit,
-            total_items=total_items,
-            number_of_pages=number_of_pages,
-            data=result
-        )
+        Os candidatos saem do índice marca_modelo_ano_id (ou do _id) em lotes, e a ocupação de cada
+        lote é respondida pelo índice de disponibilidade. O cursor aponta para o último veículo lido,
+        livre ou não, para que a próxima página não examine de novo os ocupados.
+        """
+        if para_utc(inicio) >= para_utc(fim):
+            raise ValueError("O início do período deve ser anterior ao fim")
+        query = {}
+        if marca:
+            query["marca"] = marca
+        if modelo:
+            query["modelo"] = modelo
+        if ano:
+            query["ano"] = ano
 
-    async def get_custo_medio_manutencoes_por_veiculo(self) -> List[dict]:
-        pipeline = [
-            {
-                "$lookup": {
-                    "from": "veiculo_manutencoes",
-                    "localField": "_id",
-                    "foreignField": "veiculo_id",
-                    "as": "manutencoes"
-                }
-            },
-            {
-                "$unwind": "$manutencoes"
-            },
-            {
-                "$lookup": {
-                    "from": "manutencoes",
-                    "localField": "manutencoes.manutencao_id",
-                    "foreignField": "_id",
-                    "as": "manutencoes_detalhes"
-                }
-            },
-            {
-                "$unwind": "$manutencoes_detalhes"
-            },
-            {
-                "$group": {
-                    "_id": "$_id",
-                    "modelo": {"$first": "$modelo"},
-                    "marca": {"$first": "$marca"},
-                    "custo_medio": {"$avg": "$manutencoes_detalhes.custo"}
-                }
-            },
-            {
-                "$sort": {"custo_medio": -1}
-            }
-        ]
+        disponiveis, ultimo = [], None
+        lote = max(limit, _LOTE_DISPONIVEIS)
+        for _ in range(_MAX_RODADAS_DISPONIVEIS):
+            candidatos = await self.collection.find(keyset_filter(query, "_id", cursor)).sort(keyset_sort("_id")).to_list(length=lote)
+            if not candidatos:
+                return disponiveis, None
+            ocupados = await indice_disponibilidade.ocupados(inicio, fim, [veiculo["_id"] for veiculo in candidatos])
+            for veiculo in candidatos:
+                ultimo = veiculo["_id"]
+                if veiculo["_id"] not in ocupados:
+                    disponiveis.append(veiculo)
+                    if len(disponiveis) == limit:
+                        return disponiveis, encode_cursor(None, ultimo)
+            if len(candidatos) < lote:
+                return disponiveis, None
+            cursor = encode_cursor(None, ultimo)
+        # Página incompleta por limite de rodadas: o cliente continua do último veículo examinado
+        return disponiveis, cursor
 
-        result = await self.collection.aggregate(pipeline).to_list(length=1000)
+    @cache_analitico(CUSTOS_VEICULO)
+    async def get_custo_medio_manutencoes_por_veiculo(self) -> List[dict]:
+        custos = database.get_collection(CUSTOS_VEICULO)
+        cursor = custos.find({}, {"modelo": 1, "marca": 1, "custo_medio": 1}).sort("custo_medio", DESCENDING)
+        result = await cursor.to_list(length=None)
         for veiculo in result:
             veiculo["_id"] = str(veiculo["_id"])
 
@@ -177,13 +249,69 @@ class VeiculoRepository:
                 {"_id": ObjectId(veiculo_id)},
                 {"$set": veiculo_data}
             )
+            invalidar_documento(self.collection, ObjectId(veiculo_id))
+            invalidar_analises("veiculos")
             if update_result.modified_count > 0:
+                await atualizar_custos_veiculos([veiculo_id])
                 return await self.get_by_id(veiculo_id)
             return None
         except Exception as e:
-            self.logger.error(f"Erro ao atualizar veículo com ID {veiculo_id}: {e}")
+            self.logger.error("Erro ao atualizar veículo com ID %s: %s", veiculo_id, e)
             return None
 
     async def delete(self, veiculo_id: str) -> bool:
         result = await self.collection.delete_one({"_id": ObjectId(veiculo_id)})
-        return result.deleted_count > 0
\ No newline at end of file
+        invalidar_documento(self.collection, ObjectId(veiculo_id))
+        invalidar_analises("veiculos")
+        if result.deleted_count == 0:
+            return False
+        await atualizar_custos_veiculos([veiculo_id])
+        return True
+
+    def consultas_principais(self, amostra: Optional[Dict[str, Any]] = None) -> List[dict]:
+        amostra = amostra or {}
+        marca, modelo, ano = amostra.get("marca", "Fiat"), amostra.get("modelo", "Uno"), amostra.get("ano", 2020)
+        return [
+            {"nome": "VeiculoRepository.get_all", "filtro": {}, "ordenacao": keyset_sort("_id"), "limite": 10},
+            {
+                "nome": "VeiculoRepository.get_all[cursor]",
+                "filtro": keyset_filter({}, "_id", encode_cursor(None, amostra.get("veiculo_id", ObjectId()))),
+                "ordenacao": keyset_sort("_id"),
+                "limite": 10
+            },
+            {"nome": "VeiculoRepository.get_all[marca]", "filtro": {"marca": marca}, "ordenacao": keyset_sort("_id"), "limite": 10},
+            {
+                "nome": "VeiculoRepository.get_all[marca,modelo,ano]",
+                "filtro": {"marca": marca, "modelo": modelo, "ano": ano},
+                "ordenacao": keyset_sort("_id"),
+                "limite": 10
+            },
+            {"nome": "VeiculoRepository.placa", "filtro": {"placa": amostra.get("placa", "ABC0000")}},
+            {
+                "nome": "VeiculoRepository.get_custo_medio_manutencoes_por_veiculo",
+                "colecao": CUSTOS_VEICULO,
+                "filtro": {},
+                "projecao": {"modelo": 1, "marca": 1, "custo_medio": 1},
+                "ordenacao": [("custo_medio", DESCENDING)]
+            },
+            {
+                "nome": "VeiculoRepository.get_veiculos_by_tipo_manutencao[catalogo]",
+                "colecao": TIPOS_MANUTENCAO,
+                "filtro": {"_id": {"$regex": normalizar(amostra.get("tipo_manutencao", "Revisão"))}},
+                "projecao": {"_id": 1},
+                "varredura": True
+            },
+            {
+                "nome": "VeiculoRepository.get_veiculos_by_tipo_manutencao[manutencoes]",
+                "colecao": "manutencoes",
+                "filtro": {"tipo_manutencao_chave": {"$in": [normalizar(amostra.get("tipo_manutencao", "Revisão"))]}},
+                "projecao": {"_id": 1}
+            },
+            {
+                "nome": "VeiculoRepository.get_veiculos_by_tipo_manutencao[vinculos]",
+                "colecao": "veiculo_manutencoes",
+                "filtro": {"manutencao_id": {"$in": [amostra.get("manutencao_id", ObjectId()), ObjectId()]}},
+                "projecao": {"_id": 0, "veiculo_id": 1}
+            },
+            {"nome": "VeiculoRepository.get_quantidade_veiculos", "filtro": {}, "varredura": True},
+        ]
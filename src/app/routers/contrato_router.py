@@ -1,29 +1,63 @@
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional, Set
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 
-from src.app.dtos.contrato_dto import ContratoDTO
-from src.app.models.pagination_result import PaginationResult
+from src.app.core.config import settings
+from src.app.core.disponibilidade import ConflitoDeReserva
+from src.app.core.exportacao import FormatoExportacao, exportar
+from src.app.core.ingestion import importar
+from src.app.core.latencia import RotaCronometrada
+from src.app.core.serializacao import RespostaBruta, projetar, responder_pagina
+from src.app.dtos.contrato_dto import ContratoDTO, ContratoExpandidoDTO
+from src.app.models.bulk_result import BulkResult
+from src.app.models.pagination_result import PaginationResult, TotalMode
 from src.app.repositories.contrato_repository import ContratoRepository
+from src.app.routers.params import cursor_query, expand_query
 
 contrato_router = APIRouter()
 contrato_router.prefix = "/api/contratos"
 contrato_router.tags = ["Contratos"]
+contrato_router.route_class = RotaCronometrada
 
 def get_contrato_repository() -> ContratoRepository:
     return ContratoRepository()
 
+expand_contrato = expand_query(ContratoRepository.relacoes)
+
+CAMPOS_CONTRATO = list(ContratoDTO.model_fields)
+
 @contrato_router.post("/", response_model=ContratoDTO, status_code=201)
 async def create_contract(contract: ContratoDTO, contrato_repository: ContratoRepository = Depends(get_contrato_repository)):
-    created_contract = await contrato_repository.create(contract)
+    try:
+        created_contract = await contrato_repository.create(contract)
+    except ConflitoDeReserva as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if not created_contract:
         raise HTTPException(status_code=500, detail="Error creating contract")
     return created_contract
 
+@contrato_router.post("/bulk", response_model=BulkResult)
+async def create_contracts_bulk(
+        request: Request,
+        batch_size: int = Query(settings.MONGO_BULK_BATCH_SIZE, ge=1, le=10000),
+        contrato_repository: ContratoRepository = Depends(get_contrato_repository)
+):
+    return await importar(request, ContratoDTO, contrato_repository.to_document, contrato_repository.create_many, batch_size)
+
 @contrato_router.get("/all-no-pagination", response_model=list[ContratoDTO])
 async def get_all_contracts_no_pagination(contrato_repository: ContratoRepository = Depends(get_contrato_repository)):
-    return await contrato_repository.get_all_no_pagination()
+    return exportar(contrato_repository.cursor_exportacao(), ContratoDTO, FormatoExportacao.JSON,
+                    settings.MONGO_EXPORT_BATCH_SIZE, "ContratoRepository.cursor_exportacao")
+
+@contrato_router.get("/export")
+async def export_contracts(
+        formato: FormatoExportacao = FormatoExportacao.NDJSON,
+        batch_size: int = Query(settings.MONGO_EXPORT_BATCH_SIZE, ge=1, le=10000),
+        contrato_repository: ContratoRepository = Depends(get_contrato_repository)
+):
+    return exportar(contrato_repository.cursor_exportacao(), ContratoDTO, formato,
+                    batch_size, "ContratoRepository.cursor_exportacao", nome_arquivo="contratos")
 
 @contrato_router.get("/")
 async def get_all_contracts(
@@ -31,14 +65,25 @@ async def get_all_contracts(
         data_final: Optional[datetime] = None,
         page: int = 1,
         limit: int = 10,
+        cursor: Optional[str] = Depends(cursor_query),
+        total: TotalMode = TotalMode.EXACT,
+        total_cap: int = Query(1000, ge=1, le=1_000_000),
+        expand: Set[str] = Depends(expand_contrato),
         contrato_repository: ContratoRepository = Depends(get_contrato_repository)
 ) -> PaginationResult:
-    return await contrato_repository.get_all(data_inicial, data_final, page, limit)
+    result = await contrato_repository.get_all_documentos(data_inicial, data_final, page, limit, cursor, total, total_cap)
+    result.data = await contrato_repository.expandir([projetar(documento, ContratoDTO) for documento in result.data], expand)
+    return responder_pagina(result, ContratoExpandidoDTO, CAMPOS_CONTRATO + sorted(expand))
 
-@contrato_router.get("/by-user/{user_id}", response_model=list[ContratoDTO])
-async def get_contracts_by_user(user_id: str, contrato_repository: ContratoRepository = Depends(get_contrato_repository)):
-    contracts = await contrato_repository.get_contratos_by_usuario_id(user_id)
-    return contracts
+@contrato_router.get("/by-user/{user_id}", response_model=list[ContratoExpandidoDTO], response_model_exclude_unset=True)
+async def get_contracts_by_user(
+        user_id: str,
+        expand: Set[str] = Depends(expand_contrato),
+        contrato_repository: ContratoRepository = Depends(get_contrato_repository)
+):
+    documentos = await contrato_repository.get_documentos_by_usuario_id(user_id)
+    contracts = [projetar(documento, ContratoDTO) for documento in documentos]
+    return RespostaBruta(await contrato_repository.expandir(contracts, expand))
 
 @contrato_router.get("/search")
 async def search_contracts(
@@ -46,9 +91,15 @@ async def search_contracts(
         nome_usuario: Optional[str] = None,
         page: int = 1,
         limit: int = 10,
+        cursor: Optional[str] = Depends(cursor_query),
+        total: TotalMode = TotalMode.EXACT,
+        total_cap: int = Query(1000, ge=1, le=1_000_000),
+        expand: Set[str] = Depends(expand_contrato),
         contrato_repository: ContratoRepository = Depends(get_contrato_repository)
 ) -> PaginationResult:
-    return await contrato_repository.search(placa, nome_usuario, page, limit)
+    result = await contrato_repository.search(placa, nome_usuario, page, limit, cursor, total, total_cap)
+    result.data = await contrato_repository.expandir(result.data, expand)
+    return result
 
 @contrato_router.get("/by-vehicle/{marca}")
 async def get_contracts_by_vehicle(marca: str, pago: Optional[bool] = None, contrato_repository: ContratoRepository = Depends(get_contrato_repository)):
@@ -60,20 +111,41 @@ async def get_contracts_by_payment_month(month: datetime, usuario_id: Optional[s
     contracts = await contrato_repository.get_contratos_by_pagamento_vencimento_month_and_usuario_id(month, usuario_id)
     return contracts
 
+@contrato_router.get("/by-payment-months", response_model=Dict[str, List[ContratoDTO]])
+async def get_contracts_by_payment_months(
+        months: List[str] = Query(..., description="Meses no formato AAAA-MM (até 24)"),
+        usuario_id: Optional[str] = None,
+        contrato_repository: ContratoRepository = Depends(get_contrato_repository)
+):
+    if len(months) > 24:
+        raise HTTPException(status_code=400, detail="At most 24 months per request")
+    try:
+        meses = tuple(sorted({datetime.strptime(month, "%Y-%m") for month in months}))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Months must use the YYYY-MM format")
+    return await contrato_repository.get_contratos_by_pagamento_vencimento_months(meses, usuario_id)
+
 @contrato_router.get("/count")
 async def count_contracts(contrato_repository: ContratoRepository = Depends(get_contrato_repository)):
     return await contrato_repository.get_quantidade_contratos()
 
-@contrato_router.get("/{contract_id}", response_model=ContratoDTO)
-async def get_contract_by_id(contract_id: str, contrato_repository: ContratoRepository = Depends(get_contrato_repository)):
-    contract = await contrato_repository.get_by_id(contract_id)
+@contrato_router.get("/{contract_id}", response_model=ContratoExpandidoDTO, response_model_exclude_unset=True)
+async def get_contract_by_id(
+        contract_id: str,
+        expand: Set[str] = Depends(expand_contrato),
+        contrato_repository: ContratoRepository = Depends(get_contrato_repository)
+):
+    contract = await contrato_repository.get_documento_by_id(contract_id)
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
-    return contract
+    return RespostaBruta((await contrato_repository.expandir([projetar(contract, ContratoDTO)], expand))[0])
 
 @contrato_router.put("/{contract_id}", response_model=ContratoDTO)
 async def update_contract(contract_id: str, contract: ContratoDTO, contrato_repository: ContratoRepository = Depends(get_contrato_repository)):
-    updated_contract = await contrato_repository.update(contract_id, contract)
+    try:
+        updated_contract = await contrato_repository.update(contract_id, contract)
+    except ConflitoDeReserva as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if not updated_contract:
         raise HTTPException(status_code=404, detail="Contract not found or invalid ID")
     return updated_contract
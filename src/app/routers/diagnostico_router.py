@@ -0,0 +1,67 @@
+from fastapi import APIRouter
+
+from src.app.core.cache import document_cache, result_cache
+from src.app.core.config import settings
+from src.app.core.db.coalescencia import estatisticas_coalescencia
+from src.app.core.db.indexes import verificar_planos
+from src.app.core.disponibilidade import indice_disponibilidade
+from src.app.core.db.pool_monitor import pool_metrics
+from src.app.core.latencia import latencia_rotas
+from src.app.core.logger import estatisticas_logging
+from src.app.core.startup import REPOSITORIOS
+
+diagnostico_router = APIRouter()
+diagnostico_router.prefix = "/api/diagnostico"
+diagnostico_router.tags = ["Diagnóstico"]
+
+
+@diagnostico_router.get("/pool")
+async def obter_metricas_pool(reset_picos: bool = False):
+    metricas = pool_metrics.snapshot()
+    metricas["max_pool_size"] = settings.MONGO_MAX_POOL_SIZE
+    metricas["min_pool_size"] = settings.MONGO_MIN_POOL_SIZE
+    metricas["utilizacao"] = round(metricas["checked_out"] / settings.MONGO_MAX_POOL_SIZE, 4) if settings.MONGO_MAX_POOL_SIZE else None
+    if reset_picos:
+        pool_metrics.reset_peaks()
+    return metricas
+
+
+@diagnostico_router.get("/planos")
+async def verificar_planos_consultas():
+    repositorios = [repositorio() for repositorio in REPOSITORIOS]
+    return await verificar_planos(repositorios)
+
+
+@diagnostico_router.get("/cache")
+async def obter_metricas_cache(limpar: bool = False):
+    metricas = document_cache.snapshot()
+    metricas["analises"] = result_cache.snapshot()
+    if limpar:
+        document_cache.limpar()
+        result_cache.limpar()
+    return metricas
+
+
+@diagnostico_router.get("/logging")
+async def obter_metricas_logging():
+    return estatisticas_logging()
+
+
+@diagnostico_router.get("/rotas")
+async def obter_latencia_rotas(reset: bool = False):
+    metricas = latencia_rotas.snapshot()
+    if reset:
+        latencia_rotas.reset()
+    return metricas
+
+
+@diagnostico_router.get("/disponibilidade")
+async def obter_estado_disponibilidade(recarregar: bool = False):
+    if recarregar:
+        await indice_disponibilidade.carregar()
+    return indice_disponibilidade.snapshot()
+
+
+@diagnostico_router.get("/coalescencia")
+async def obter_metricas_coalescencia():
+    return estatisticas_coalescencia()
@@ -1,17 +1,26 @@
 from typing import Optional, List
 from datetime import datetime
 
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from pydantic import ValidationError
 
+from src.app.core.config import settings
+from src.app.core.exportacao import FormatoExportacao, exportar
+from src.app.core.db.pagination import next_cursor
+from src.app.core.ingestion import importar
+from src.app.core.latencia import RotaCronometrada
+from src.app.core.serializacao import responder_documento, responder_documentos
+from src.app.models.bulk_result import BulkResult
 from src.app.models.manutencao import Manutencao
 from src.app.repositories.manutencao_repository import ManutencaoRepository
 from src.app.dtos.manutencao_dto import ManutencaoDTO
+from src.app.routers.params import cursor_query
 
 
 manutencao_router = APIRouter()
 manutencao_router.prefix = "/api/manutencoes"
 manutencao_router.tags = ["Manutenções"]
+manutencao_router.route_class = RotaCronometrada
 
 
 def get_manutencao_repository() -> ManutencaoRepository:
@@ -32,6 +41,31 @@ async def criar_manutencao(manutencao_dto: ManutencaoDTO, manutencao_repo: Manut
         raise HTTPException(status_code=422, detail=e.errors())
 
 
+@manutencao_router.post("/bulk", response_model=BulkResult)
+async def criar_manutencoes_em_lote(
+    request: Request,
+    batch_size: int = Query(settings.MONGO_BULK_BATCH_SIZE, ge=1, le=10000),
+    manutencao_repo: ManutencaoRepository = Depends(get_manutencao_repository)
+):
+    return await importar(
+        request,
+        ManutencaoDTO,
+        lambda manutencao_dto: manutencao_repo.to_document(manutencao_dto.to_model()),
+        manutencao_repo.create_many,
+        batch_size
+    )
+
+
+@manutencao_router.get("/export")
+async def exportar_manutencoes(
+    formato: FormatoExportacao = FormatoExportacao.NDJSON,
+    batch_size: int = Query(settings.MONGO_EXPORT_BATCH_SIZE, ge=1, le=10000),
+    manutencao_repo: ManutencaoRepository = Depends(get_manutencao_repository)
+):
+    return exportar(manutencao_repo.cursor_exportacao(), ManutencaoDTO, formato,
+                    batch_size, "ManutencaoRepository.cursor_exportacao", nome_arquivo="manutencoes")
+
+
 @manutencao_router.get("/", response_model=List[ManutencaoDTO])
 async def listar_manutencoes(
     data_inicial: Optional[datetime] = Query(None),
@@ -39,10 +73,12 @@ async def listar_manutencoes(
     tipo_manutencao: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Depends(cursor_query),
     manutencao_repo: ManutencaoRepository = Depends(get_manutencao_repository)
 ):
-    manutencoes = await manutencao_repo.get_all(data_inicial=data_inicial, data_final=data_final, tipo_manutencao=tipo_manutencao, page=skip // limit + 1, limit=limit)
-    return [ManutencaoDTO.from_model(manutencao) for manutencao in manutencoes]
+    manutencoes = await manutencao_repo.get_all_documentos(data_inicial=data_inicial, data_final=data_final, tipo_manutencao=tipo_manutencao, page=skip // limit + 1, limit=limit, cursor=cursor)
+    proximo = next_cursor(manutencoes, limit, "data")
+    return responder_documentos(manutencoes, ManutencaoDTO, {"X-Next-Cursor": proximo} if proximo else None)
 
 
 @manutencao_router.get("/{manutencao_id}", response_model=ManutencaoDTO)
@@ -50,10 +86,10 @@ async def buscar_manutencao_por_id(
     manutencao_id: str,
     manutencao_repo: ManutencaoRepository = Depends(get_manutencao_repository)
 ):
-    manutencao = await manutencao_repo.get_by_id(manutencao_id)
+    manutencao = await manutencao_repo.get_documento_by_id(manutencao_id)
     if not manutencao:
         raise HTTPException(status_code=404, detail="Manutenção não encontrada")
-    return ManutencaoDTO.from_model(manutencao)
+    return responder_documento(manutencao, ManutencaoDTO)
 
 
 @manutencao_router.put("/{manutencao_id}", response_model=ManutencaoDTO)
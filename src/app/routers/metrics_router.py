@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.app.core.cache import document_cache
+from src.app.core.db.instrumentation import command_metrics
+from src.app.core.db.pool_monitor import pool_metrics
+from src.app.core.latencia import latencia_rotas
+
+metrics_router = APIRouter()
+metrics_router.tags = ["Diagnóstico"]
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def obter_metricas():
+    corpo = command_metrics.prometheus() + pool_metrics.prometheus() + document_cache.prometheus() + latencia_rotas.prometheus()
+    return PlainTextResponse(corpo, media_type=PROMETHEUS_CONTENT_TYPE)
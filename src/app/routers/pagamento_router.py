@@ -1,16 +1,25 @@
 from datetime import datetime
 from typing import Any, Dict, Optional, List
 
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from pydantic import ValidationError
 
+from src.app.core.config import settings
+from src.app.core.exportacao import FormatoExportacao, exportar
+from src.app.core.db.pagination import next_cursor
+from src.app.core.ingestion import importar
+from src.app.core.latencia import RotaCronometrada
+from src.app.core.serializacao import responder_documento, responder_documentos
+from src.app.models.bulk_result import BulkResult
 from src.app.models.pagamento import Pagamento
 from src.app.repositories.pagamento_repository import PagamentoRepository
 from src.app.dtos.pagamento_dto import PagamentoDTO
+from src.app.routers.params import cursor_query
 
 pagamento_router = APIRouter()
 pagamento_router.prefix = "/api/pagamentos"
 pagamento_router.tags = ["Pagamentos"]
+pagamento_router.route_class = RotaCronometrada
 
 def get_pagamento_repository() -> PagamentoRepository:
     return PagamentoRepository()
@@ -28,6 +37,29 @@ async def criar_pagamento(pagamento_dto: PagamentoDTO, pagamento_repo: Pagamento
     except ValidationError as e:
         raise HTTPException(status_code=422, detail=e.errors())
 
+@pagamento_router.post("/bulk", response_model=BulkResult)
+async def criar_pagamentos_em_lote(
+    request: Request,
+    batch_size: int = Query(settings.MONGO_BULK_BATCH_SIZE, ge=1, le=10000),
+    pagamento_repo: PagamentoRepository = Depends(get_pagamento_repository)
+):
+    return await importar(
+        request,
+        PagamentoDTO,
+        lambda pagamento_dto: pagamento_repo.to_document(pagamento_dto.to_model()),
+        pagamento_repo.create_many,
+        batch_size
+    )
+
+@pagamento_router.get("/export")
+async def exportar_pagamentos(
+    formato: FormatoExportacao = FormatoExportacao.NDJSON,
+    batch_size: int = Query(settings.MONGO_EXPORT_BATCH_SIZE, ge=1, le=10000),
+    pagamento_repo: PagamentoRepository = Depends(get_pagamento_repository)
+):
+    return exportar(pagamento_repo.cursor_exportacao(), PagamentoDTO, formato,
+                    batch_size, "PagamentoRepository.cursor_exportacao", nome_arquivo="pagamentos")
+
 @pagamento_router.get("/", response_model=List[PagamentoDTO])
 async def listar_pagamentos(
     data_inicial: Optional[datetime] = Query(None),
@@ -35,20 +67,22 @@ async def listar_pagamentos(
     pago: Optional[bool] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Depends(cursor_query),
     pagamento_repo: PagamentoRepository = Depends(get_pagamento_repository)
 ):
-    pagamentos = await pagamento_repo.get_all(data_inicial=data_inicial, data_final=data_final, pago=pago, page=skip // limit + 1, limit=limit)
-    return [PagamentoDTO.from_model(pagamento) for pagamento in pagamentos]
+    pagamentos = await pagamento_repo.get_all_documentos(data_inicial=data_inicial, data_final=data_final, pago=pago, page=skip // limit + 1, limit=limit, cursor=cursor)
+    proximo = next_cursor(pagamentos, limit, "vencimento")
+    return responder_documentos(pagamentos, PagamentoDTO, {"X-Next-Cursor": proximo} if proximo else None)
 
 @pagamento_router.get("/{pagamento_id}", response_model=PagamentoDTO)
 async def buscar_pagamento_por_id(
     pagamento_id: str,
     pagamento_repo: PagamentoRepository = Depends(get_pagamento_repository)
 ):
-    pagamento = await pagamento_repo.get_by_id(pagamento_id)
+    pagamento = await pagamento_repo.get_documento_by_id(pagamento_id)
     if not pagamento:
         raise HTTPException(status_code=404, detail="Pagamento não encontrado")
-    return PagamentoDTO.from_model(pagamento)
+    return responder_documento(pagamento, PagamentoDTO)
 
 @pagamento_router.put("/{pagamento_id}", response_model=PagamentoDTO)
 async def atualizar_pagamento(
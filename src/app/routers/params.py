@@ -0,0 +1,30 @@
+from typing import Iterable, Optional, Set
+
+from fastapi import HTTPException, Query
+
+from src.app.core.db.pagination import decode_cursor
+
+
+def cursor_query(cursor: Optional[str] = Query(None, description="Cursor opaco devolvido em next_cursor")) -> Optional[str]:
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return cursor
+
+
+def expand_query(permitidas: Iterable[str]):
+    """Dependência que lê ?expand=a,b e recusa relações fora de `permitidas`."""
+    permitidas = tuple(permitidas)
+
+    def dependencia(
+            expand: Optional[str] = Query(None, description=f"Relações a embutir, separadas por vírgula: {','.join(permitidas)}")
+    ) -> Set[str]:
+        pedidas = {relacao.strip() for relacao in (expand or "").split(",") if relacao.strip()}
+        invalidas = pedidas.difference(permitidas)
+        if invalidas:
+            raise HTTPException(status_code=400, detail=f"Invalid expand: {', '.join(sorted(invalidas))}")
+        return pedidas
+
+    return dependencia
@@ -1,15 +1,24 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from typing import List, Optional
 
+from src.app.core.config import settings
+from src.app.core.exportacao import FormatoExportacao, exportar
+from src.app.core.db.pagination import next_cursor
+from src.app.core.ingestion import importar
+from src.app.core.latencia import RotaCronometrada
+from src.app.core.serializacao import responder_documento, responder_documentos
+from src.app.models.bulk_result import BulkResult
 from src.app.models.usuario import Usuario
 from src.app.repositories.usuario_repository import UsuarioRepository
 from src.app.dtos.usuario_dto import UsuarioDTO
+from src.app.routers.params import cursor_query
 from pydantic import ValidationError
 
 
 usuario_router = APIRouter()
 usuario_router.prefix = "/api/usuarios"
 usuario_router.tags = ["Usuários"]
+usuario_router.route_class = RotaCronometrada
 
 
 def get_usuario_repository() -> UsuarioRepository:
@@ -30,14 +39,51 @@ async def criar_usuario(usuario_dto: UsuarioDTO, usuario_repo: UsuarioRepository
         raise HTTPException(status_code=422, detail=e.errors())
 
 
+@usuario_router.post("/bulk", response_model=BulkResult)
+async def criar_usuarios_em_lote(
+    request: Request,
+    batch_size: int = Query(settings.MONGO_BULK_BATCH_SIZE, ge=1, le=10000),
+    usuario_repo: UsuarioRepository = Depends(get_usuario_repository)
+):
+    return await importar(
+        request,
+        UsuarioDTO,
+        lambda usuario_dto: usuario_repo.to_document(usuario_dto.to_model()),
+        usuario_repo.create_many,
+        batch_size
+    )
+
+
+@usuario_router.get("/export")
+async def exportar_usuarios(
+    formato: FormatoExportacao = FormatoExportacao.NDJSON,
+    batch_size: int = Query(settings.MONGO_EXPORT_BATCH_SIZE, ge=1, le=10000),
+    usuario_repo: UsuarioRepository = Depends(get_usuario_repository)
+):
+    return exportar(usuario_repo.cursor_exportacao(), UsuarioDTO, formato,
+                    batch_size, "UsuarioRepository.cursor_exportacao", nome_arquivo="usuarios")
+
+
 @usuario_router.get("/", response_model=List[UsuarioDTO])
 async def listar_usuarios(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Depends(cursor_query),
     usuario_repo: UsuarioRepository = Depends(get_usuario_repository)
 ):
-    usuarios = await usuario_repo.listar_usuarios(skip=skip, limit=limit)
-    return [UsuarioDTO.from_model(usuario) for usuario in usuarios]
+    usuarios = await usuario_repo.listar_documentos(skip=skip, limit=limit, cursor=cursor)
+    proximo = next_cursor(usuarios, limit, "_id")
+    return responder_documentos(usuarios, UsuarioDTO, {"X-Next-Cursor": proximo} if proximo else None)
+
+
+@usuario_router.get("/autocomplete", response_model=List[UsuarioDTO])
+async def autocompletar_usuarios(
+    prefixo: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    usuario_repo: UsuarioRepository = Depends(get_usuario_repository)
+):
+    usuarios = await usuario_repo.autocompletar(prefixo, limit)
+    return responder_documentos(usuarios, UsuarioDTO)
 
 
 @usuario_router.get("/{usuario_id}", response_model=UsuarioDTO)
@@ -45,10 +91,10 @@ async def buscar_usuario_por_id(
     usuario_id: str,
     usuario_repo: UsuarioRepository = Depends(get_usuario_repository)
 ):
-    usuario = await usuario_repo.buscar_usuario_por_id(usuario_id)
+    usuario = await usuario_repo.buscar_documento_por_id(usuario_id)
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
-    return UsuarioDTO.from_model(usuario)
+    return responder_documento(usuario, UsuarioDTO)
 
 
 @usuario_router.put("/{usuario_id}", response_model=UsuarioDTO)
@@ -77,8 +123,12 @@ async def deletar_usuario(usuario_id: str, usuario_repo: UsuarioRepository = Dep
 
 
 @usuario_router.get("/buscar/{nome}", response_model=List[UsuarioDTO])
-async def buscar_usuario_por_nome(nome: str, usuario_repo: UsuarioRepository = Depends(get_usuario_repository)):
-    usuarios = await usuario_repo.buscar_usuario_por_nome(nome)
+async def buscar_usuario_por_nome(
+    nome: str,
+    limit: int = Query(100, ge=1, le=1000),
+    usuario_repo: UsuarioRepository = Depends(get_usuario_repository)
+):
+    usuarios = await usuario_repo.buscar_usuario_por_nome(nome, limit)
     return [UsuarioDTO.from_model(usuario) for usuario in usuarios]
 
 
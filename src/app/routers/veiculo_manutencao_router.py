@@ -1,15 +1,22 @@
 from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 
+from src.app.core.config import settings
+from src.app.core.exportacao import FormatoExportacao, exportar
+from src.app.core.ingestion import importar
+from src.app.core.latencia import RotaCronometrada
+from src.app.core.serializacao import responder_documento
 from src.app.dtos.veiculo_manutencao_dto import VeiculoManutencaoDTO
+from src.app.models.bulk_result import BulkResult
 from src.app.models.veiculo_manutencao import VeiculoManutencao
 from src.app.repositories.veiculo_mutencao_repository import VeiculoManutencaoRepository
 
 veiculo_manutencao_router = APIRouter()
 veiculo_manutencao_router.prefix = "/api/veiculo-manutencoes"
 veiculo_manutencao_router.tags = ["Veículo Manutenções"]
+veiculo_manutencao_router.route_class = RotaCronometrada
 
 def get_veiculo_manutencao_repository() -> VeiculoManutencaoRepository:
     return VeiculoManutencaoRepository()
@@ -21,9 +28,33 @@ async def create_veiculo_manutencao(veiculo_manutencao: VeiculoManutencaoDTO, ve
         raise HTTPException(status_code=500, detail="Erro ao criar veículo_manutencao")
     return created_veiculo_manutencao
 
+@veiculo_manutencao_router.post("/bulk", response_model=BulkResult)
+async def create_veiculo_manutencoes_bulk(
+    request: Request,
+    batch_size: int = Query(settings.MONGO_BULK_BATCH_SIZE, ge=1, le=10000),
+    veiculo_manutencao_repository: VeiculoManutencaoRepository = Depends(get_veiculo_manutencao_repository)
+):
+    return await importar(
+        request,
+        VeiculoManutencaoDTO,
+        veiculo_manutencao_repository.to_document,
+        veiculo_manutencao_repository.create_many,
+        batch_size
+    )
+
 @veiculo_manutencao_router.get("/", response_model=list[VeiculoManutencaoDTO])
 async def get_all_veiculo_manutencoes(veiculo_manutencao_repository: VeiculoManutencaoRepository = Depends(get_veiculo_manutencao_repository)):
-    return await veiculo_manutencao_repository.get_all()
+    return exportar(veiculo_manutencao_repository.cursor_exportacao(), VeiculoManutencaoDTO,
+                    FormatoExportacao.JSON, settings.MONGO_EXPORT_BATCH_SIZE, "VeiculoManutencaoRepository.cursor_exportacao")
+
+@veiculo_manutencao_router.get("/export")
+async def export_veiculo_manutencoes(
+    formato: FormatoExportacao = FormatoExportacao.NDJSON,
+    batch_size: int = Query(settings.MONGO_EXPORT_BATCH_SIZE, ge=1, le=10000),
+    veiculo_manutencao_repository: VeiculoManutencaoRepository = Depends(get_veiculo_manutencao_repository)
+):
+    return exportar(veiculo_manutencao_repository.cursor_exportacao(), VeiculoManutencaoDTO, formato,
+                    batch_size, "VeiculoManutencaoRepository.cursor_exportacao", nome_arquivo="veiculo_manutencoes")
 
 @veiculo_manutencao_router.get("/total-custo-por-marca", response_model=list[dict])
 async def get_total_custo_manutencao_por_marca(veiculo_manutencao_repository: VeiculoManutencaoRepository = Depends(get_veiculo_manutencao_repository)):
@@ -43,10 +74,10 @@ async def count_veiculo_manutencoes(veiculo_manutencao_repository: VeiculoManute
 
 @veiculo_manutencao_router.get("/{veiculo_manutencao_id}", response_model=VeiculoManutencaoDTO)
 async def get_veiculo_manutencao_by_id(veiculo_manutencao_id: str, veiculo_manutencao_repository: VeiculoManutencaoRepository = Depends(get_veiculo_manutencao_repository)):
-    veiculo_manutencao = await veiculo_manutencao_repository.get_by_id(veiculo_manutencao_id)
+    veiculo_manutencao = await veiculo_manutencao_repository.get_documento_by_id(veiculo_manutencao_id)
     if not veiculo_manutencao:
         raise HTTPException(status_code=404, detail="Veículo_manutencao não encontrado")
-    return veiculo_manutencao
+    return responder_documento(veiculo_manutencao, VeiculoManutencaoDTO)
 
 @veiculo_manutencao_router.put("/{veiculo_manutencao_id}", response_model=VeiculoManutencaoDTO)
 async def update_veiculo_manutencao(veiculo_manutencao_id: str, veiculo_manutencao_data: dict, veiculo_manutencao_repository: VeiculoManutencaoRepository = Depends(get_veiculo_manutencao_repository)):
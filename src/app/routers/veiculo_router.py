@@ -1,15 +1,23 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 
+from src.app.core.config import settings
+from src.app.core.exportacao import FormatoExportacao, exportar
+from src.app.core.latencia import RotaCronometrada
+from src.app.core.serializacao import responder_documento, responder_documentos, responder_pagina
+from src.app.core.ingestion import importar
 from src.app.dtos.veiculo_dto import VeiculoDTO
-from src.app.models.pagination_result import PaginationResult
+from src.app.models.bulk_result import BulkResult
+from src.app.models.pagination_result import PaginationResult, TotalMode
 from src.app.repositories.veiculo_repository import VeiculoRepository
+from src.app.routers.params import cursor_query
 
 veiculo_router = APIRouter()
 veiculo_router.prefix = "/api/veiculos"
 veiculo_router.tags = ["Veículos"]
+veiculo_router.route_class = RotaCronometrada
 
 def get_veiculo_repository() -> VeiculoRepository:
     return VeiculoRepository()
@@ -21,9 +29,27 @@ async def create_veiculo(veiculo: VeiculoDTO, veiculo_repository: VeiculoReposit
         raise HTTPException(status_code=500, detail="Erro ao criar veículo")
     return created_veiculo
 
+@veiculo_router.post("/bulk", response_model=BulkResult)
+async def create_veiculos_bulk(
+    request: Request,
+    batch_size: int = Query(settings.MONGO_BULK_BATCH_SIZE, ge=1, le=10000),
+    veiculo_repository: VeiculoRepository = Depends(get_veiculo_repository)
+):
+    return await importar(request, VeiculoDTO, veiculo_repository.to_document, veiculo_repository.create_many, batch_size)
+
 @veiculo_router.get("/all-no-pagination", response_model=list[VeiculoDTO])
 async def get_all_veiculos_no_pagination(veiculo_repository: VeiculoRepository = Depends(get_veiculo_repository)):
-    return await veiculo_repository.get_all_no_pagination()
+    return exportar(veiculo_repository.cursor_exportacao(), VeiculoDTO, FormatoExportacao.JSON,
+                    settings.MONGO_EXPORT_BATCH_SIZE, "VeiculoRepository.cursor_exportacao")
+
+@veiculo_router.get("/export")
+async def export_veiculos(
+    formato: FormatoExportacao = FormatoExportacao.NDJSON,
+    batch_size: int = Query(settings.MONGO_EXPORT_BATCH_SIZE, ge=1, le=10000),
+    veiculo_repository: VeiculoRepository = Depends(get_veiculo_repository)
+):
+    return exportar(veiculo_repository.cursor_exportacao(), VeiculoDTO, formato,
+                    batch_size, "VeiculoRepository.cursor_exportacao", nome_arquivo="veiculos")
 
 @veiculo_router.get("/")
 async def get_all_veiculos(
@@ -33,13 +59,37 @@ async def get_all_veiculos(
     ano: Optional[int] = None,
     page: int = 1,
     limit: int = 10,
+    cursor: Optional[str] = Depends(cursor_query),
+    total: TotalMode = TotalMode.EXACT,
+    total_cap: int = Query(1000, ge=1, le=1_000_000),
     veiculo_repository: VeiculoRepository = Depends(get_veiculo_repository)
 ) -> PaginationResult:
-    return await veiculo_repository.get_all(tipo, marca, modelo, ano, page, limit)
+    result = await veiculo_repository.get_all_documentos(tipo, marca, modelo, ano, page, limit, cursor, total, total_cap)
+    return responder_pagina(result, VeiculoDTO)
+
+@veiculo_router.get("/disponiveis", response_model=List[VeiculoDTO])
+async def get_veiculos_disponiveis(
+    inicio: datetime,
+    fim: datetime,
+    marca: Optional[str] = None,
+    modelo: Optional[str] = None,
+    ano: Optional[int] = None,
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Depends(cursor_query),
+    veiculo_repository: VeiculoRepository = Depends(get_veiculo_repository)
+):
+    try:
+        veiculos, proximo = await veiculo_repository.get_disponiveis(inicio, fim, marca, modelo, ano, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return responder_documentos(veiculos, VeiculoDTO, {"X-Next-Cursor": proximo} if proximo else None)
 
 @veiculo_router.get("/by-tipo-manutencao/{tipo_manutencao}", response_model=list[VeiculoDTO])
 async def get_veiculos_by_tipo_manutencao(tipo_manutencao: str, veiculo_repository: VeiculoRepository = Depends(get_veiculo_repository)):
-    return await veiculo_repository.get_veiculos_by_tipo_manutencao(tipo_manutencao)
+    try:
+        return await veiculo_repository.get_veiculos_by_tipo_manutencao(tipo_manutencao)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @veiculo_router.get("/count")
 async def count_veiculos(veiculo_repository: VeiculoRepository = Depends(get_veiculo_repository)):
@@ -51,10 +101,10 @@ async def get_custo_medio_manutencoes_por_veiculo(veiculo_repository: VeiculoRep
 
 @veiculo_router.get("/{veiculo_id}", response_model=VeiculoDTO)
 async def get_veiculo_by_id(veiculo_id: str, veiculo_repository: VeiculoRepository = Depends(get_veiculo_repository)):
-    veiculo = await veiculo_repository.get_by_id(veiculo_id)
+    veiculo = await veiculo_repository.get_documento_by_id(veiculo_id)
     if not veiculo:
         raise HTTPException(status_code=404, detail="Veículo não encontrado")
-    return veiculo
+    return responder_documento(veiculo, VeiculoDTO)
 
 @veiculo_router.put("/{veiculo_id}", response_model=VeiculoDTO)
 async def update_veiculo(veiculo_id: str, veiculo_data: dict, veiculo_repository: VeiculoRepository = Depends(get_veiculo_repository)):